@@ -23,10 +23,13 @@ from app.services.document_service import process_document_advanced
 from app.services.csv_logger import csv_logger
 from app.services.advanced_logger import advanced_logger
 from app.utils.helpers import image_to_base64
-from app.core.cache import REDIS_AVAILABLE, cache
+from app.core.cache import REDIS_AVAILABLE, cache, query_embedding_cache
 from app.utils.logging import logger
-from app.core.llm_provider import OptimizedLLMProvider, PROVIDER_CONFIGS
-from app.core.prompt_templates import build_rag_prompt
+from app.core.llm_provider import PROVIDER_CONFIGS
+from app.core.http_pool import http_pool
+from app.core.llm_scheduler import scheduler_stats
+from app.core.inference_server import inference_server_stats
+from app.core.llm_router import llm_router
 from app.core.metrics import metrics_collector
 from app.core.health_check import health_checker
 
@@ -171,7 +174,11 @@ async def get_performance_metrics():
         rag_stats = {
             "total_documents": multimodal_rag_system.collection.count() if multimodal_rag_system and hasattr(multimodal_rag_system, 'collection') else 0,
             "embedding_model_loaded": hasattr(multimodal_rag_system, 'embeddings') if multimodal_rag_system else False,
-            "reranker_loaded": hasattr(multimodal_rag_system, 'reranker') if multimodal_rag_system else False
+            "reranker_loaded": hasattr(multimodal_rag_system, 'reranker') if multimodal_rag_system else False,
+            "inference_backends": {
+                "embeddings": multimodal_rag_system.embeddings.backend,
+                "reranker": multimodal_rag_system.reranker.backend,
+            } if multimodal_rag_system else {}
         }
         
         return {
@@ -186,6 +193,14 @@ async def get_performance_metrics():
                 "disk_total_gb": round(disk.total / (1024**3), 2)
             },
             "cache": cache_stats,
+            "memory_cache": cache.memory_cache.stats(),
+            "query_embedding_cache": query_embedding_cache.stats(),
+            "llm_http_pool": http_pool.stats(),
+            "llm_schedulers": scheduler_stats(),
+            "llm_router": llm_router.stats(),
+            "semantic_cache": multimodal_rag_system.semantic_cache.stats() if multimodal_rag_system and multimodal_rag_system.semantic_cache else {},
+            "rerank_batching": multimodal_rag_system.reranker.service.stats() if multimodal_rag_system else {},
+            "inference_server": inference_server_stats(),
             "rag": rag_stats,
             "api": {
                 "redis_available": REDIS_AVAILABLE,
@@ -539,48 +554,31 @@ async def ask_question_stream_ultra(question_request: QuestionRequest, request:
                     )
                     return
 
-            # Enhancement et recherche (si pas de réponse prédéfinie)
-            llm_provider = OptimizedLLMProvider(question_request.provider)
-            enhanced_queries = await multimodal_rag_system.query_enhancer.enhance_query(question_request.question, llm_provider)
-
-            # Métadonnées initiales
-            initial_metadata = {
-                "id": query_id,
-                "provider": question_request.provider.value,
-                "enhanced_queries": enhanced_queries,
-                "timestamp": datetime.now().isoformat()
-            }
-            yield f"data: {json.dumps({'metadata': initial_metadata, 'type': 'init'})}\n\n"
-
-            # Recherche hybride
-            all_results = []
-            for query_variant in enhanced_queries:
-                results = await multimodal_rag_system.hybrid_search.search(query_variant, n_results=15)
-                all_results.extend(results)
-
-            if not all_results:
-                yield f"data: {json.dumps({'content': 'Aucun document pertinent trouvé.', 'type': 'final'})}\n\n"
-                return
-
-            # Re-ranking
-            ranked_results = multimodal_rag_system.reranker.rerank(question_request.question, all_results, top_k=question_request.top_k)
-
-            # Préparation contexte
-            context_parts = [result.content for result in ranked_results]
-            context = "\n\n".join(context_parts)
-
-            # Prompt optimisé (aligné New Deal si activé)
-            optimized_prompt = build_rag_prompt(context, question_request.question)
-
-            # Streaming de la génération
-            provider = OptimizedLLMProvider(question_request.provider)
-            
-            # Collecte des chunks pour le CSV
-            async for chunk in provider.generate_stream(optimized_prompt):
-                if chunk:
-                    response_chunks.append(chunk)
-                    final_response += chunk
-                    yield f"data: {json.dumps({'content': chunk, 'type': 'chunk'})}\n\n"
+            # Enhancement, recherche, re-ranking et génération (flux partagé entre questions identiques)
+            all_results, ranked_results = [], []
+            events = multimodal_rag_system.stream_query_events(
+                question_request.question, question_request.provider, question_request.top_k
+            )
+            async for event_type, payload in events:
+                if event_type == "init":
+                    # Métadonnées initiales
+                    initial_metadata = {
+                        "id": query_id,
+                        "provider": question_request.provider.value,
+                        "enhanced_queries": payload,
+                        "timestamp": datetime.now().isoformat()
+                    }
+                    yield f"data: {json.dumps({'metadata': initial_metadata, 'type': 'init'})}\n\n"
+                elif event_type == "empty":
+                    yield f"data: {json.dumps({'content': 'Aucun document pertinent trouvé.', 'type': 'final'})}\n\n"
+                    return
+                elif event_type == "context":
+                    all_results, ranked_results = payload
+                elif event_type == "chunk":
+                    # Collecte des chunks pour le CSV
+                    response_chunks.append(payload)
+                    final_response += payload
+                    yield f"data: {json.dumps({'content': payload, 'type': 'chunk'})}\n\n"
             
             # Données pour CSV
             sources = [result.content[:100] + "..." for result in ranked_results]
@@ -686,13 +684,8 @@ async def ask_question_stream_ultra(question_request: QuestionRequest, request:
 async def clear_cache():
     """Vider tous les caches"""
     try:
-        # Vider le cache local
-        cache.memory_cache.clear()
-
-        # Vider Redis si disponible
-        if REDIS_AVAILABLE:
-            from app.core.cache import redis_client
-            redis_client.flushdb()
+        # Vider le cache local, Redis et les caches locaux des autres workers
+        cache.clear()
 
         return {
             "status": "success",
@@ -1116,17 +1109,24 @@ async def delete_document_advanced(document_id: str):
         # Suppression de ChromaDB
         multimodal_rag_system.collection.delete(where={"document_id": document_id})
 
-        # Reconstruction index BM25
+        # Mise à jour incrémentale de l'index BM25
+        await asyncio.get_event_loop().run_in_executor(
+            multimodal_rag_system.executor,
+            multimodal_rag_system.remove_document_chunks,
+            document_id
+        )
+
+        # Invalidation des seules réponses et classements en cache citant ce document
         await asyncio.get_event_loop().run_in_executor(
             multimodal_rag_system.executor,
-            multimodal_rag_system.hybrid_search.rebuild_index
+            lambda: cache.document_changed(document_id, added=False)
         )
 
         return {
             "message": f"Document '{document_id}' supprimé avec succès",
             "actions": [
                 "Suppression chunks ChromaDB",
-                "Reconstruction index BM25",
+                "Mise à jour index BM25",
                 "Nettoyage cache"
             ]
         }
@@ -1,12 +1,21 @@
 import redis
 import hashlib
+import json
 import pickle
+import struct
 import threading
-from typing import Optional, Any
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Any, List
 from functools import lru_cache
 import os
+import uuid
+
+import numpy as np
 
 from app.core.config import settings
+from app.core.memory_tier import SegmentedMemoryTier
+from app.core.metrics import metrics_collector
 from app.utils.logging import logger
 
 # Configuration Redis optimisée
@@ -23,76 +32,421 @@ try:
         max_connections=20  # Pool de connexions
     )
     redis_client.ping()
+    # Connexion binaire dédiée aux vecteurs (pas de décodage texte des payloads)
+    redis_binary_client = redis.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        db=0,
+        decode_responses=False,
+        socket_connect_timeout=settings.CACHE_REDIS_TIMEOUT,
+        socket_timeout=settings.CACHE_REDIS_TIMEOUT,
+        health_check_interval=30,
+        max_connections=20
+    )
     REDIS_AVAILABLE = True
     logger.info("Redis connecté avec succès")
 except Exception as e:
     REDIS_AVAILABLE = False
+    redis_binary_client = None
     logger.warning(f"Redis non disponible: {e}")
 
 
+# Sérialisation binaire des vecteurs: en-tête (magic, type, dimension, échelle) + octets little-endian
+_VECTOR_HEADER = struct.Struct("<3sBIf")
+_VECTOR_MAGIC = b"VEC"
+_VECTOR_DTYPES = {"float32": (1, "<f4"), "float16": (2, "<f2"), "int8": (3, "i1")}
+_VECTOR_CODES = {code: (name, np_dtype) for name, (code, np_dtype) in _VECTOR_DTYPES.items()}
+
+
+def pack_vector(vector: np.ndarray, dtype: str = "float32") -> bytes:
+    """Vecteur -> octets (int8: quantification symétrique avec échelle dans l'en-tête)"""
+    code, np_dtype = _VECTOR_DTYPES[dtype]
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    scale = 1.0
+    if dtype == "int8":
+        scale = float(np.abs(vector).max()) / 127 or 1.0
+        vector = np.round(vector / scale)
+    return _VECTOR_HEADER.pack(_VECTOR_MAGIC, code, vector.size, scale) + vector.astype(np_dtype).tobytes()
+
+
+def unpack_vector(payload: bytes) -> Optional[np.ndarray]:
+    """Octets -> vecteur float32, ou None si le payload n'est pas un vecteur valide"""
+    if len(payload) < _VECTOR_HEADER.size:
+        return None
+    magic, code, dim, scale = _VECTOR_HEADER.unpack_from(payload)
+    if magic != _VECTOR_MAGIC or code not in _VECTOR_CODES:
+        return None
+    np_dtype = _VECTOR_CODES[code][1]
+    # Payload tronqué ou étranger: un miss, pas une erreur de tout le lot MGET
+    if len(payload) != _VECTOR_HEADER.size + dim * np.dtype(np_dtype).itemsize:
+        return None
+    vector = np.frombuffer(payload, dtype=np_dtype, count=dim, offset=_VECTOR_HEADER.size)
+    vector = vector.astype(np.float32)
+    return vector * scale if code == _VECTOR_DTYPES["int8"][0] else vector
+
+
+# Canal pub/sub d'invalidation des niveaux mémoire (un message par vidage, tous workers)
+INVALIDATION_CHANNEL = "rag:cache:invalidate"
+
+# Génération de la collection: incrémentée à chaque ajout de document, elle fait partie
+# des clés des types dépendant du corpus entier (une réponse peut changer avec un nouveau document)
+GENERATION_KEY = "rag:collection:generation"
+GENERATION_SCOPED_TYPES = ("full_response",)
+
+
+def normalize_question(text: str) -> str:
+    """Forme canonique d'une question (casse, espaces, forme Unicode)"""
+    return " ".join(unicodedata.normalize("NFKC", text).lower().split())
+
+
+def document_tag(document_id: str) -> str:
+    """Tag de dépendance d'une entrée de cache envers un document"""
+    return f"doc:{document_id}"
+
+
+def document_tags(metadatas: List[dict]) -> List[str]:
+    """Tags des documents cités par une liste de métadonnées de chunks"""
+    return sorted({document_tag(m["document_id"]) for m in metadatas if m and m.get("document_id")})
+
+
 # Système de cache multi-niveaux
 class MultiLayerCache:
     def __init__(self):
-        self.memory_cache = {}
-        self.memory_cache_lock = threading.Lock()
-        self.max_memory_items = settings.CACHE_MEMORY_MAX_ITEMS
+        # Niveau mémoire segmenté par type de cache (LRU, TTL, budget en octets)
+        self.memory_cache = SegmentedMemoryTier()
+        # Identifiant du worker: ses propres messages d'invalidation sont ignorés
+        self.instance_id = uuid.uuid4().hex
+        self._pubsub = None
+        self._listener = None
+        # Caches dérivés (ex: cache sémantique) vidés avec le niveau local
+        self._invalidation_hooks = []
+        self.generation = self._read_generation()
+
+    @staticmethod
+    def _read_generation() -> int:
+        if not REDIS_AVAILABLE:
+            return 0
+        try:
+            return int(redis_client.get(GENERATION_KEY) or 0)
+        except Exception as e:
+            logger.error(f"Erreur lecture génération collection: {e}")
+            return 0
 
     def _get_cache_key(self, key: str, prefix: str = "") -> str:
-        return f"{prefix}:{hashlib.md5(key.encode()).hexdigest()}"
+        digest = hashlib.md5(key.encode()).hexdigest()
+        if prefix in GENERATION_SCOPED_TYPES:
+            return f"{prefix}:g{self.generation}:{digest}"
+        return f"{prefix}:{digest}"
+
+    @staticmethod
+    def _loads(payload: str) -> Any:
+        return pickle.loads(payload.encode('latin1'))
+
+    @staticmethod
+    def _dumps(value: Any) -> str:
+        return pickle.dumps(value).decode('latin1')
+
+    def _fetch(self, keys: List[str], cache_type: str, client, decode) -> List[Optional[Any]]:
+        """Lecture groupée: mémoire (un seul verrou) puis un seul MGET Redis pour les absents"""
+        cache_keys = [self._get_cache_key(key, cache_type) for key in keys]
+        values = self.memory_cache.get_many(cache_keys, cache_type)
+        memory_hits = sum(value is not None for value in values)
+
+        redis_hits = 0
+        missing = [i for i, value in enumerate(values) if value is None]
+        if missing and REDIS_AVAILABLE:
+            backfill_keys, backfill_values = [], []
+            try:
+                payloads = client.mget([cache_keys[i] for i in missing])
+                for i, payload in zip(missing, payloads):
+                    if payload:
+                        values[i] = decode(payload)
+                        if values[i] is not None:
+                            backfill_keys.append(cache_keys[i])
+                            backfill_values.append(values[i])
+            except Exception as e:
+                logger.error(f"Erreur Redis mget: {e}")
+
+            # Un hit Redis alimente le niveau local (TTL local court, cohérence via pub/sub)
+            if backfill_keys:
+                redis_hits = len(backfill_keys)
+                local_ttl = min(self._default_ttl(cache_type), settings.CACHE_LOCAL_TTL)
+                self.memory_cache.set_many(backfill_keys, backfill_values, local_ttl, cache_type)
+
+        misses = len(values) - memory_hits - redis_hits
+        if memory_hits:
+            metrics_collector.record_cache_hit(True, "memory")
+        if redis_hits:
+            metrics_collector.record_cache_hit(True, "redis")
+        if misses:
+            metrics_collector.record_cache_hit(False, cache_type)
+        logger.debug(f"Cache {cache_type}: {memory_hits} hits mémoire, {redis_hits} hits Redis, {misses} miss")
+        return values
+
+    def _store(self, keys: List[str], values: List[Any], ttl: int, cache_type: str, client, encode,
+               tags: Optional[List[List[str]]] = None):
+        """Écriture groupée: un seul pipeline Redis et un seul verrou mémoire"""
+        cache_keys = [self._get_cache_key(key, cache_type) for key in keys]
+        entry_tags = [frozenset(entry) for entry in tags] if tags else None
+
+        if REDIS_AVAILABLE:
+            try:
+                pipe = client.pipeline(transaction=False)
+                for cache_key, value in zip(cache_keys, values):
+                    pipe.setex(cache_key, ttl, encode(value))
+                # Index inverse tag -> clés, pour l'invalidation ciblée; le TTL d'un tag n'est
+                # jamais raccourci (il doit survivre à la plus durable de ses entrées, Redis >= 7)
+                for tag in sorted(set().union(*entry_tags)) if entry_tags else []:
+                    tagged = [key for key, tag_set in zip(cache_keys, entry_tags) if tag in tag_set]
+                    pipe.sadd(f"tag:{tag}", *tagged)
+                    pipe.expire(f"tag:{tag}", ttl, nx=True)
+                    pipe.expire(f"tag:{tag}", ttl, gt=True)
+                pipe.execute()
+            except Exception as e:
+                logger.error(f"Erreur Redis set: {e}")
+
+        evictions = self.memory_cache.set_many(cache_keys, values, ttl, cache_type, entry_tags)
+        if evictions:
+            metrics_collector.increment_counter("cache_memory_evictions", evictions, labels={"cache_type": cache_type})
+
+    def _default_ttl(self, cache_type: str) -> int:
+        return settings.CACHE_EMBEDDINGS_TTL if "embeddings" in cache_type else settings.CACHE_DEFAULT_TTL
 
     def get(self, key: str, cache_type: str = "general") -> Optional[Any]:
-        cache_key = self._get_cache_key(key, cache_type)
+        return self.get_many([key], cache_type)[0]
+
+    def set(self, key: str, value: Any, ttl: int = None, cache_type: str = "general", tags: List[str] = None):
+        self.set_many([key], [value], ttl, cache_type, [tags] if tags else None)
+
+    def get_many(self, keys: List[str], cache_type: str = "general") -> List[Optional[Any]]:
+        """Lecture groupée de valeurs (None pour les absentes)"""
+        return self._fetch(keys, cache_type, redis_client if REDIS_AVAILABLE else None, self._loads)
+
+    def set_many(self, keys: List[str], values: List[Any], ttl: int = None, cache_type: str = "general",
+                 tags: Optional[List[List[str]]] = None):
+        """Écriture groupée de valeurs (pipeline Redis); `tags` liste les documents dont dépend chaque entrée"""
+        ttl = ttl or self._default_ttl(cache_type)
+        self._store(keys, values, ttl, cache_type, redis_client if REDIS_AVAILABLE else None, self._dumps, tags)
+
+    def get_vectors(self, keys: List[str], cache_type: str = "embeddings") -> List[Optional[np.ndarray]]:
+        """Lecture groupée de vecteurs (payloads binaires, MGET sur la connexion binaire)"""
+        return self._fetch(keys, cache_type, redis_binary_client, unpack_vector)
+
+    def set_vectors(self, keys: List[str], vectors: List[np.ndarray], ttl: int = None,
+                    cache_type: str = "embeddings", dtype: str = None):
+        """Écriture groupée de vecteurs (octets bruts, pipeline Redis)"""
+        ttl = ttl or self._default_ttl(cache_type)
+        dtype = dtype or settings.EMBEDDING_CACHE_DTYPE
+        self._store(keys, vectors, ttl, cache_type, redis_binary_client,
+                    lambda vector: pack_vector(vector, dtype))
+
+    def _publish(self, message: dict):
+        """Diffusion d'une invalidation aux autres workers"""
+        if not REDIS_AVAILABLE:
+            return
+        try:
+            redis_client.publish(INVALIDATION_CHANNEL, json.dumps({**message, "origin": self.instance_id}))
+        except Exception as e:
+            logger.error(f"Erreur publication invalidation cache: {e}")
+
+    def add_invalidation_hook(self, hook):
+        """Enregistre un rappel hook(cache_types, tags) appelé à chaque invalidation (None, None = tout)"""
+        self._invalidation_hooks.append(hook)
+
+    def _clear_local(self, cache_types: Optional[List[str]] = None, tags: Optional[List[str]] = None):
+        if tags is not None:
+            self.memory_cache.delete_tagged(tags)
+        elif cache_types is None:
+            self.memory_cache.clear()
+            query_embedding_cache.clear()
+        else:
+            self.memory_cache.clear_types(cache_types)
+        for hook in self._invalidation_hooks:
+            try:
+                hook(cache_types, tags)
+            except Exception as e:
+                logger.error(f"Erreur invalidation cache dérivé: {e}")
 
-        # Essayer Redis d'abord
+    def clear(self):
+        """Vidage complet: niveau local, Redis, puis niveaux locaux des autres workers"""
+        self._clear_local()
         if REDIS_AVAILABLE:
             try:
-                result = redis_client.get(cache_key)
-                if result:
-                    logger.info(f"Cache hit Redis: {cache_key}")
-                    # Enregistrer métrique de cache hit
-                    from app.core.metrics import metrics_collector
-                    metrics_collector.record_cache_hit(True, "redis")
-                    return pickle.loads(result.encode('latin1'))
+                redis_client.flushdb()
             except Exception as e:
-                logger.error(f"Erreur Redis get: {e}")
-
-        # Fallback sur cache mémoire
-        with self.memory_cache_lock:
-            if cache_key in self.memory_cache:
-                logger.info(f"Cache hit mémoire: {cache_key}")
-                # Enregistrer métrique de cache hit
-                from app.core.metrics import metrics_collector
-                metrics_collector.record_cache_hit(True, "memory")
-                return self.memory_cache[cache_key]
-
-        # Enregistrer cache miss
-        from app.core.metrics import metrics_collector
-        metrics_collector.record_cache_hit(False, cache_type)
-        return None
+                logger.error(f"Erreur Redis flushdb: {e}")
+        self._publish({"action": "clear"})
 
-    def set(self, key: str, value: Any, ttl: int = None, cache_type: str = "general"):
-        if ttl is None:
-            ttl = settings.CACHE_EMBEDDINGS_TTL if cache_type == "embeddings" else settings.CACHE_DEFAULT_TTL
-        cache_key = self._get_cache_key(key, cache_type)
+    def invalidate_tags(self, tags: List[str]):
+        """Invalidation des seules entrées dépendant des documents donnés (embeddings préservés)"""
+        self._clear_local([], tags)
+        if REDIS_AVAILABLE:
+            try:
+                pipe = redis_client.pipeline(transaction=False)
+                for tag in tags:
+                    pipe.smembers(f"tag:{tag}")
+                dependent = set().union(*pipe.execute()) if tags else set()
+                stale = list(dependent) + [f"tag:{tag}" for tag in tags]
+                for start in range(0, len(stale), 1000):
+                    redis_client.unlink(*stale[start:start + 1000])
+                logger.info(f"Cache: {len(dependent)} entrées invalidées pour {tags}")
+            except Exception as e:
+                logger.error(f"Erreur Redis invalidation tags {tags}: {e}")
+        self._publish({"action": "tags", "tags": tags})
 
-        # Redis
+    def bump_generation(self):
+        """Nouvelle génération de la collection: les réponses du corpus précédent deviennent inaccessibles"""
         if REDIS_AVAILABLE:
             try:
-                serialized = pickle.dumps(value).decode('latin1')
-                redis_client.setex(cache_key, ttl, serialized)
+                self.generation = int(redis_client.incr(GENERATION_KEY))
             except Exception as e:
-                logger.error(f"Erreur Redis set: {e}")
+                logger.error(f"Erreur incrément génération collection: {e}")
+                self.generation += 1
+        else:
+            self.generation += 1
+        self._clear_local(list(GENERATION_SCOPED_TYPES))
+        self._publish({"action": "generation", "generation": self.generation})
+
+    def document_changed(self, document_id: str, added: bool = True):
+        """Invalidation après ajout/remplacement (added) ou suppression d'un document"""
+        self.invalidate_tags([document_tag(document_id)])
+        if added:
+            self.bump_generation()
 
-        # Cache mémoire
-        with self.memory_cache_lock:
-            if len(self.memory_cache) >= self.max_memory_items:
-                # Supprimer les entrées les plus anciennes
-                oldest_keys = list(self.memory_cache.keys())[:100]
-                for old_key in oldest_keys:
-                    del self.memory_cache[old_key]
+    def _on_invalidation(self, message: dict):
+        try:
+            payload = json.loads(message["data"])
+            if payload.get("origin") == self.instance_id:
+                return
+            if payload.get("action") == "clear":
+                self._clear_local()
+            elif payload.get("action") == "tags":
+                self._clear_local([], payload.get("tags", []))
+            elif payload.get("action") == "generation":
+                self.generation = max(self.generation, int(payload.get("generation", 0)))
+                self._clear_local(list(GENERATION_SCOPED_TYPES))
+            logger.info(f"Invalidation du cache local reçue: {payload.get('action')}")
+        except Exception as e:
+            logger.error(f"Erreur traitement invalidation cache: {e}")
 
-            self.memory_cache[cache_key] = value
+    def start_invalidation_listener(self):
+        """Abonnement au canal d'invalidation (thread en arrière-plan)"""
+        if not REDIS_AVAILABLE or self._listener is not None:
+            return
+        try:
+            self._pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(**{INVALIDATION_CHANNEL: self._on_invalidation})
+            self._listener = self._pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+            logger.info("Écoute des invalidations de cache démarrée")
+        except Exception as e:
+            logger.error(f"Erreur abonnement invalidation cache: {e}")
+
+    def stop_invalidation_listener(self):
+        if self._listener is None:
+            return
+        try:
+            self._listener.stop()
+            self._pubsub.close()
+        except Exception as e:
+            logger.error(f"Erreur arrêt écoute invalidation cache: {e}")
+        self._listener = None
+        self._pubsub = None
 
 
 # Cache global
 cache = MultiLayerCache()
+
+
+# Cache des embeddings de requêtes (partagé entre workers via Redis)
+class QueryEmbeddingCache:
+    """LRU local devant un niveau Redis optionnel.
+
+    Les clés sont construites sur le texte normalisé (casse, espaces, forme
+    Unicode) et l'identifiant du modèle; les vecteurs sont stockés compacts
+    (float16 ou int8 avec échelle) puis restitués en float32.
+    """
+
+    def __init__(self, max_items: int = None, dtype: str = None, ttl: int = None):
+        self.max_items = settings.QUERY_EMBEDDING_CACHE_SIZE if max_items is None else max_items
+        self.dtype = dtype or settings.QUERY_EMBEDDING_CACHE_DTYPE
+        self.ttl = ttl or settings.CACHE_EMBEDDINGS_TTL
+        self._items: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits_memory = 0
+        self.hits_redis = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Forme canonique d'une requête (les variantes triviales partagent une entrée)"""
+        return normalize_question(text)
+
+    def _key(self, text: str, namespace: str) -> str:
+        digest = hashlib.blake2b(self.normalize(text).encode("utf-8"), digest_size=16).hexdigest()
+        return f"qemb:{namespace}:{digest}"
+
+    def _remember(self, key: str, payload: bytes):
+        with self._lock:
+            self._items[key] = payload
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def get_many(self, texts: List[str], namespace: str) -> List[Optional[np.ndarray]]:
+        """Vecteurs en cache (None pour les absents), mémoire puis Redis"""
+        keys = [self._key(text, namespace) for text in texts]
+        payloads: List[Optional[bytes]] = [None] * len(keys)
+        with self._lock:
+            for i, key in enumerate(keys):
+                payload = self._items.get(key)
+                if payload is not None:
+                    self._items.move_to_end(key)
+                    payloads[i] = payload
+            self.hits_memory += sum(p is not None for p in payloads)
+
+        missing = [i for i, payload in enumerate(payloads) if payload is None]
+        if missing and REDIS_AVAILABLE:
+            try:
+                values = redis_binary_client.mget([keys[i] for i in missing])
+                for i, value in zip(missing, values):
+                    if value:
+                        payloads[i] = value
+                        self._remember(keys[i], value)
+                        self.hits_redis += 1
+            except Exception as e:
+                logger.error(f"Erreur Redis get embeddings requêtes: {e}")
+
+        self.misses += sum(p is None for p in payloads)
+        return [unpack_vector(payload) if payload is not None else None for payload in payloads]
+
+    def set_many(self, texts: List[str], vectors: List[np.ndarray], namespace: str):
+        """Enregistrement des vecteurs en mémoire et dans Redis"""
+        entries = {self._key(text, namespace): pack_vector(vector, self.dtype) for text, vector in zip(texts, vectors)}
+        for key, payload in entries.items():
+            self._remember(key, payload)
+
+        if REDIS_AVAILABLE:
+            try:
+                pipe = redis_binary_client.pipeline(transaction=False)
+                for key, payload in entries.items():
+                    pipe.setex(key, self.ttl, payload)
+                pipe.execute()
+            except Exception as e:
+                logger.error(f"Erreur Redis set embeddings requêtes: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits_memory + self.hits_redis + self.misses
+        return {
+            "items": len(self._items),
+            "hits_memory": self.hits_memory,
+            "hits_redis": self.hits_redis,
+            "misses": self.misses,
+            "hit_rate": (self.hits_memory + self.hits_redis) / lookups if lookups else 0.0,
+        }
+
+
+query_embedding_cache = QueryEmbeddingCache()
@@ -36,20 +36,104 @@ class Settings(BaseSettings):
     # Optimisation LLM
     ENABLE_PREDEFINED_QA: bool = os.getenv("ENABLE_PREDEFINED_QA", "true").lower() == "true"
     ENABLE_QUERY_ENHANCEMENT: bool = os.getenv("ENABLE_QUERY_ENHANCEMENT", "true").lower() == "true"
+    # "llm" (variantes générées par le LLM), "local" (synonymes + voisins d'embeddings, sans appel réseau),
+    # "adaptive" (local, puis LLM seulement si la confiance de la première recherche est faible)
+    # ou "speculative" (recherche de la question pendant l'appel LLM, annulé si la confiance suffit);
+    # la confiance repose sur la fusion RRF: avec SEARCH_FUSION=legacy, le LLM est toujours sollicité
+    QUERY_ENHANCEMENT_MODE: str = os.getenv("QUERY_ENHANCEMENT_MODE", "llm")
+    QUERY_ENHANCEMENT_BUDGET_MS: float = float(os.getenv("QUERY_ENHANCEMENT_BUDGET_MS", 1500))  # Mode speculative
+    QUERY_EXPANSION_MIN_CONFIDENCE: float = float(os.getenv("QUERY_EXPANSION_MIN_CONFIDENCE", 0.34))
+    QUERY_EXPANSION_VOCAB_SIZE: int = int(os.getenv("QUERY_EXPANSION_VOCAB_SIZE", 5000))  # Mots du corpus embarqués
+    QUERY_EXPANSION_NEIGHBOURS: int = int(os.getenv("QUERY_EXPANSION_NEIGHBOURS", 3))
+    QUERY_EXPANSION_MIN_SIMILARITY: float = float(os.getenv("QUERY_EXPANSION_MIN_SIMILARITY", 0.5))
+    QUERY_EXPANSION_VOCAB_DEBOUNCE: float = float(os.getenv("QUERY_EXPANSION_VOCAB_DEBOUNCE", 5))  # Secondes: uploads regroupés
     # Alignement du prompt avec le New Deal (activé par défaut)
     ENABLE_NEW_DEAL_PROMPT: bool = os.getenv("ENABLE_NEW_DEAL_PROMPT", "true").lower() == "true"
     
     # Optimisation Cache
     CACHE_DEFAULT_TTL: int = int(os.getenv("CACHE_DEFAULT_TTL", 7200))  # 2 heures au lieu de 1h
-    CACHE_MEMORY_MAX_ITEMS: int = int(os.getenv("CACHE_MEMORY_MAX_ITEMS", 2000))  # Doublé
+    CACHE_MEMORY_MAX_ITEMS: int = int(os.getenv("CACHE_MEMORY_MAX_ITEMS", 2000))  # Par type de cache
+    CACHE_LOCAL_TTL: int = int(os.getenv("CACHE_LOCAL_TTL", 600))  # TTL local des entrées recopiées depuis Redis
+    CACHE_MEMORY_MAX_BYTES: int = int(os.getenv("CACHE_MEMORY_MAX_BYTES", 256 * 1024 * 1024))  # Budget du niveau mémoire
+    # Part du budget mémoire par type de cache (les types absents partagent "general")
+    CACHE_MEMORY_QUOTAS: str = os.getenv(
+        "CACHE_MEMORY_QUOTAS",
+        "full_response:0.2,rerank:0.1,query_enhancement:0.05,embeddings:0.4,multimodal_embeddings:0.15,general:0.1"
+    )
     CACHE_REDIS_TIMEOUT: int = int(os.getenv("CACHE_REDIS_TIMEOUT", 10))  # Timeout plus long
     CACHE_EMBEDDINGS_TTL: int = int(os.getenv("CACHE_EMBEDDINGS_TTL", 14400))  # 4h pour embeddings
+    EMBEDDING_CACHE_DTYPE: str = os.getenv("EMBEDDING_CACHE_DTYPE", "float32")  # Vecteurs de documents: "float32" ou "float16"
+    QUERY_EMBEDDING_CACHE_SIZE: int = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", 5000))  # Requêtes en mémoire locale
+    QUERY_EMBEDDING_CACHE_DTYPE: str = os.getenv("QUERY_EMBEDDING_CACHE_DTYPE", "float16")  # "float16" ou "int8"
+    
+    # Clients HTTP partagés des providers LLM (keep-alive, HTTP/2 si h2 est installé)
+    LLM_HTTP2: bool = os.getenv("LLM_HTTP2", "true").lower() == "true"
+    LLM_HTTP_MAX_CONNECTIONS: int = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", 50))  # Par provider
+    LLM_HTTP_MAX_KEEPALIVE: int = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", 20))
+    LLM_HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", 60))
+    LLM_HTTP_TIMEOUT: float = float(os.getenv("LLM_HTTP_TIMEOUT", 60))
+    LLM_HTTP_CONNECT_TIMEOUT: float = float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT", 10))
+
+    # Ordonnancement des appels LLM par provider ("provider:valeur", 0 = illimité)
+    LLM_MAX_CONCURRENCY: str = os.getenv("LLM_MAX_CONCURRENCY", "mistral:8,openai:16,anthropic:8,deepseek:8,groq:4")
+    LLM_RPM_LIMITS: str = os.getenv("LLM_RPM_LIMITS", "mistral:300,openai:500,anthropic:50,deepseek:300,groq:30")
+    LLM_TPM_LIMITS: str = os.getenv("LLM_TPM_LIMITS", "mistral:500000,openai:300000,anthropic:50000,deepseek:0,groq:6000")
+    LLM_QUEUE_MAX: int = int(os.getenv("LLM_QUEUE_MAX", 100))  # Requêtes en attente par provider
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", 3))  # Nouveaux essais sur 429/503
+    LLM_BACKOFF_BASE: float = float(os.getenv("LLM_BACKOFF_BASE", 1.0))
+    LLM_BACKOFF_MAX: float = float(os.getenv("LLM_BACKOFF_MAX", 30.0))
+
+    # Routage multi-provider: "fixed" (provider demandé) ou "latency" (bascule selon latence/erreurs)
+    LLM_ROUTING_MODE: str = os.getenv("LLM_ROUTING_MODE", "fixed")
+    LLM_HEDGING: bool = os.getenv("LLM_HEDGING", "false").lower() == "true"  # Requête de couverture au-delà du p95
+    LLM_HEDGE_DEFAULT_DELAY: float = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", 8.0))  # Tant que le p95 est inconnu
+    LLM_HEDGE_MIN_DELAY: float = float(os.getenv("LLM_HEDGE_MIN_DELAY", 0.5))
+    LLM_ROUTER_WINDOW: int = int(os.getenv("LLM_ROUTER_WINDOW", 200))  # Appels suivis par provider
+    LLM_ROUTER_MIN_SAMPLES: int = int(os.getenv("LLM_ROUTER_MIN_SAMPLES", 5))
+    LLM_ROUTER_MAX_ERROR_RATE: float = float(os.getenv("LLM_ROUTER_MAX_ERROR_RATE", 0.5))
+    LLM_ROUTER_FAILURE_THRESHOLD: int = int(os.getenv("LLM_ROUTER_FAILURE_THRESHOLD", 3))  # Échecs consécutifs
+    LLM_ROUTER_COOLDOWN: float = float(os.getenv("LLM_ROUTER_COOLDOWN", 30.0))  # Mise à l'écart (secondes)
+    LLM_ROUTER_MAX_ATTEMPTS: int = int(os.getenv("LLM_ROUTER_MAX_ATTEMPTS", 3))  # Providers essayés par appel
+
+    # Regroupement des questions identiques en cours de traitement (single-flight)
+    ENABLE_SINGLE_FLIGHT: bool = os.getenv("ENABLE_SINGLE_FLIGHT", "true").lower() == "true"
+
+    # Cache sémantique des réponses (similarité cosinus des questions), désactivé tant que le seuil
+    # n'est pas calibré sur des questions françaises (modèle d'embeddings anglais)
+    ENABLE_SEMANTIC_CACHE: bool = os.getenv("ENABLE_SEMANTIC_CACHE", "false").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.92))
+    SEMANTIC_CACHE_TTL: int = int(os.getenv("SEMANTIC_CACHE_TTL", 1800))
+    SEMANTIC_CACHE_MAX_ENTRIES: int = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 2000))  # Par provider et top_k
     
     # Optimisation Recherche Hybride
     SEARCH_ALPHA: float = float(os.getenv("SEARCH_ALPHA", 0.75))  # Favorise légèrement la recherche dense
-    SEARCH_TOP_K: int = int(os.getenv("SEARCH_TOP_K", 15))  # Plus de résultats pour le reranking
+    SEARCH_TOP_K: int = int(os.getenv("SEARCH_TOP_K", 10))  # Candidats envoyés au reranking par variante
     SEARCH_DENSE_TOP_K: int = int(os.getenv("SEARCH_DENSE_TOP_K", 10))
     SEARCH_SPARSE_TOP_K: int = int(os.getenv("SEARCH_SPARSE_TOP_K", 8))
+    # Fusion dense/sparse: "rrf" (reciprocal rank fusion), "linear" (min-max) ou "legacy"
+    SEARCH_FUSION: str = os.getenv("SEARCH_FUSION", "rrf")
+    SEARCH_RRF_K: int = int(os.getenv("SEARCH_RRF_K", 60))
+    SEARCH_MAX_WORKERS: int = int(os.getenv("SEARCH_MAX_WORKERS", 4))  # Threads dense/sparse hors event loop
+
+    # Re-ranking par micro-batches (paires de requêtes concurrentes, thread dédié)
+    ENABLE_RERANK_BATCHING: bool = os.getenv("ENABLE_RERANK_BATCHING", "true").lower() == "true"
+    RERANK_BATCH_MAX_PAIRS: int = int(os.getenv("RERANK_BATCH_MAX_PAIRS", 64))
+    RERANK_BATCH_MAX_WAIT_MS: float = float(os.getenv("RERANK_BATCH_MAX_WAIT_MS", 5))
+    RERANK_SCORE_CACHE_TTL: int = int(os.getenv("RERANK_SCORE_CACHE_TTL", 86400))  # Scores (question, chunk)
+    # Cascade: cosinus dense, cross-encoder léger optionnel, puis L-12 sur la tête ambiguë seulement
+    ENABLE_RERANK_CASCADE: bool = os.getenv("ENABLE_RERANK_CASCADE", "false").lower() == "true"
+    RERANK_CASCADE_MARGIN: float = float(os.getenv("RERANK_CASCADE_MARGIN", 0.08))  # Écart de cosinus
+    RERANK_CASCADE_MAX_HEAD: int = int(os.getenv("RERANK_CASCADE_MAX_HEAD", 8))  # Candidats max pour le L-12
+    RERANK_CASCADE_MIDDLE_MODEL: str = os.getenv("RERANK_CASCADE_MIDDLE_MODEL", "")  # ex: cross-encoder/ms-marco-MiniLM-L-6-v2
+    RERANK_CASCADE_MIDDLE_MARGIN: float = float(os.getenv("RERANK_CASCADE_MIDDLE_MARGIN", 2.0))  # Écart de logits
+
+    # Analyse du texte pour BM25: "french" (accents, mots vides, racinisation) ou "simple"
+    SPARSE_ANALYZER: str = os.getenv("SPARSE_ANALYZER", "french")
+    SPARSE_ANALYZER_CACHE_SIZE: int = int(os.getenv("SPARSE_ANALYZER_CACHE_SIZE", 20000))  # Chunks analysés en cache
+
+    # Index sparse persisté (chargé au démarrage au lieu d'être reconstruit)
+    SPARSE_INDEX_PERSIST: bool = os.getenv("SPARSE_INDEX_PERSIST", "true").lower() == "true"
+    SPARSE_INDEX_PATH: str = os.getenv("SPARSE_INDEX_PATH", os.path.join(CHROMA_DB_PATH, "sparse_index"))
     
     # Optimisation ChromaDB
     CHROMA_BATCH_SIZE: int = int(os.getenv("CHROMA_BATCH_SIZE", 100))  # Traitement par batch
@@ -62,6 +146,27 @@ class Settings(BaseSettings):
     QUANTIZATION_BITS: int = int(os.getenv("QUANTIZATION_BITS", 8))  # 8-bit quantization par défaut
     EMBEDDING_COMPRESSION_RATIO: float = float(os.getenv("EMBEDDING_COMPRESSION_RATIO", 0.5))  # 50% compression
 
+    # Backend d'inférence des embeddings et cross-encoders: "torch" (fp32) ou "onnx" (int8 dynamique, onnxruntime)
+    INFERENCE_BACKEND: str = os.getenv("INFERENCE_BACKEND", "torch")
+    ONNX_MODELS_DIR: str = os.getenv("ONNX_MODELS_DIR", "./.cache/onnx")  # Modèles exportés et quantifiés
+    ONNX_QUANTIZATION_CONFIG: str = os.getenv("ONNX_QUANTIZATION_CONFIG", "avx2")  # "arm64", "avx2", "avx512" ou "avx512_vnni"
+    ONNX_INTRA_OP_THREADS: int = int(os.getenv("ONNX_INTRA_OP_THREADS", os.cpu_count() or 1))
+    ONNX_MIN_COSINE: float = float(os.getenv("ONNX_MIN_COSINE", 0.98))  # Dérive tolérée des embeddings int8
+    ONNX_MIN_CORRELATION: float = float(os.getenv("ONNX_MIN_CORRELATION", 0.98))  # Dérive tolérée des scores int8
+
+    # Serveur d'inférence: un seul processus détient les modèles texte, les workers uvicorn l'appellent (socket Unix)
+    INFERENCE_SERVER_ENABLED: bool = os.getenv("INFERENCE_SERVER_ENABLED", "false").lower() == "true"
+    INFERENCE_SERVER_ADDRESS: str = os.getenv("INFERENCE_SERVER_ADDRESS", "/tmp/rag-inference.sock")
+    INFERENCE_SERVER_AUTHKEY: str = os.getenv("INFERENCE_SERVER_AUTHKEY", "")
+    INFERENCE_SERVER_AUTOSTART: bool = os.getenv("INFERENCE_SERVER_AUTOSTART", "true").lower() == "true"  # Lancé par le premier worker
+    INFERENCE_SERVER_TIMEOUT: float = float(os.getenv("INFERENCE_SERVER_TIMEOUT", 30))  # Secondes par requête
+    INFERENCE_SERVER_CONNECT_TIMEOUT: float = float(os.getenv("INFERENCE_SERVER_CONNECT_TIMEOUT", 180))  # Démarrage du serveur
+    INFERENCE_SERVER_LOAD_TIMEOUT: float = float(os.getenv("INFERENCE_SERVER_LOAD_TIMEOUT", 1800))  # Premier chargement (export ONNX compris)
+    INFERENCE_SERVER_IDLE_TIMEOUT: float = float(os.getenv("INFERENCE_SERVER_IDLE_TIMEOUT", 300))  # Arrêt sans worker connecté (0: jamais)
+    INFERENCE_SERVER_RETRY_INTERVAL: float = float(os.getenv("INFERENCE_SERVER_RETRY_INTERVAL", 30))  # Échec rapide après une attente vaine du serveur
+    INFERENCE_BATCH_MAX_ITEMS: int = int(os.getenv("INFERENCE_BATCH_MAX_ITEMS", 64))  # Textes ou paires par passe
+    INFERENCE_BATCH_MAX_WAIT_MS: float = float(os.getenv("INFERENCE_BATCH_MAX_WAIT_MS", 5))
+
     # Tokens
     IPINFO_TOKEN: str = os.getenv("IPINFO_TOKEN", "")
 
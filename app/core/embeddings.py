@@ -1,12 +1,11 @@
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from typing import List, Union, Optional
-from functools import lru_cache
 import hashlib
 import time
 
-from app.core.cache import cache
+from app.core.cache import cache, query_embedding_cache
 from app.core.config import settings
+from app.core.onnx_backend import load_sentence_transformer
 from app.utils.logging import logger
 
 
@@ -15,12 +14,12 @@ class AdvancedEmbeddings:
     def __init__(self):
         try:
             # Modèle principal optimisé
-            self.primary_model = SentenceTransformer(
+            self.primary_model, self.backend = load_sentence_transformer(
                 'all-mpnet-base-v2',
-                device='cpu',
                 cache_folder='./.cache/sentence_transformers'
             )
-            logger.info("Modèle principal all-mpnet-base-v2 chargé")
+            self.model_name = 'all-mpnet-base-v2'
+            logger.info(f"Modèle principal all-mpnet-base-v2 chargé ({self.backend})")
 
             # Modèle multilingue en lazy loading (chargé seulement si nécessaire)
             self.multilingual_model = None
@@ -29,15 +28,15 @@ class AdvancedEmbeddings:
         except Exception as e:
             logger.error(f"Erreur chargement modèles: {e}")
             # Fallback sur un modèle plus léger
-            self.primary_model = SentenceTransformer('all-MiniLM-L6-v2')
+            self.primary_model, self.backend = load_sentence_transformer('all-MiniLM-L6-v2')
+            self.model_name = 'all-MiniLM-L6-v2'
 
     def _load_multilingual_if_needed(self):
         """Chargement lazy du modèle multilingue"""
         if not self._multilingual_loaded:
             try:
-                self.multilingual_model = SentenceTransformer(
+                self.multilingual_model, _ = load_sentence_transformer(
                     'paraphrase-multilingual-mpnet-base-v2',
-                    device='cpu',
                     cache_folder='./.cache/sentence_transformers'
                 )
                 self._multilingual_loaded = True
@@ -46,52 +45,63 @@ class AdvancedEmbeddings:
                 logger.error(f"Erreur chargement modèle multilingue: {e}")
                 self.multilingual_model = None
 
-    @lru_cache(maxsize=5000)
+    def _query_cache_namespace(self) -> str:
+        """Espace de clés du cache de requêtes: modèle, backend et transformation appliquée"""
+        namespace = self.model_name if self.backend == "torch" else f"{self.model_name}:{self.backend}"
+        if settings.ENABLE_EMBEDDING_QUANTIZATION:
+            return f"{namespace}:q{settings.QUANTIZATION_BITS}:{settings.EMBEDDING_COMPRESSION_RATIO}"
+        return namespace
+
     def embed_query(self, text: str) -> np.ndarray:
-        """Cache des embeddings de requêtes avec LRU"""
+        """Embedding d'une requête (cache partagé des embeddings de requêtes)"""
+        return self.embed_queries([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[np.ndarray]:
+        """Embedding de plusieurs requêtes en un seul batch (variantes d'une même question)"""
         start_time = time.time()
-        embedding = self.primary_model.encode([text])[0]
-        
-        # Appliquer la quantization si activée
-        quantized = False
-        if settings.ENABLE_EMBEDDING_QUANTIZATION:
-            embedding = self._quantize_embeddings([embedding])[0]
-            quantized = True
-        
-        # Enregistrer les métriques de performance
+        namespace = self._query_cache_namespace()
+        embeddings = query_embedding_cache.get_many(texts, namespace)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+
+        # Seules les requêtes absentes du cache passent par le modèle
+        quantized = settings.ENABLE_EMBEDDING_QUANTIZATION
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            new_embeddings = list(self.primary_model.encode(missing_texts))
+
+            # Même transformation que embed_documents pour rester comparable aux vecteurs indexés
+            if quantized:
+                new_embeddings = self._quantize_embeddings(new_embeddings)
+
+            query_embedding_cache.set_many(missing_texts, new_embeddings, namespace)
+            for i, embedding in zip(missing, new_embeddings):
+                embeddings[i] = embedding
+
         duration = time.time() - start_time
         from app.core.metrics import metrics_collector
         metrics_collector.record_embedding_performance("query", duration, quantized)
-        
-        return embedding
+        metrics_collector.record_cache_hit(not missing, "query_embeddings")
+
+        return embeddings
 
     def embed_documents(self, texts: List[str], use_cache: bool = True) -> List[np.ndarray]:
         """Embedding de documents avec cache intelligent"""
         start_time = time.time()
-        embeddings = []
-        uncached_texts = []
-        uncached_indices = []
-
-        for i, text in enumerate(texts):
-            if use_cache:
-                cached = cache.get(text, "embeddings")
-                if cached is not None:
-                    embeddings.append(cached)
-                    continue
-
-            uncached_texts.append(text)
-            uncached_indices.append(i)
-            embeddings.append(None)  # Placeholder
+        if use_cache:
+            embeddings = cache.get_vectors(texts, "embeddings")
+        else:
+            embeddings = [None] * len(texts)
+        uncached_indices = [i for i, embedding in enumerate(embeddings) if embedding is None]
 
         # Traitement par batch des textes non cachés
-        if uncached_texts:
-            new_embeddings = self.primary_model.encode(uncached_texts)
+        if uncached_indices:
+            uncached_texts = [texts[i] for i in uncached_indices]
+            new_embeddings = list(self.primary_model.encode(uncached_texts))
 
             for idx, embedding in zip(uncached_indices, new_embeddings):
                 embeddings[idx] = embedding
-                if use_cache:
-                    cache.set(uncached_texts[uncached_indices.index(idx)],
-                              embedding, cache_type="embeddings")
+            if use_cache:
+                cache.set_vectors(uncached_texts, new_embeddings, cache_type="embeddings")
 
         # Appliquer la quantization si activée
         quantized = False
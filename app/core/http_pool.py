@@ -0,0 +1,99 @@
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.core.config import settings
+from app.utils.logging import logger
+
+# HTTP/2 nécessite le paquet h2 (httpx[http2]); repli sur HTTP/1.1 keep-alive sinon
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+# Pool de clients HTTP partagés par les providers LLM
+class HTTPClientPool:
+    """Un `httpx.AsyncClient` par origine (schéma + hôte), réutilisé par tous les appels:
+    connexions keep-alive et multiplexage HTTP/2 au lieu d'un handshake TCP/TLS par appel."""
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._lock = threading.Lock()
+        self.requests = defaultdict(int)
+        self.new_connections = defaultdict(int)
+
+    @staticmethod
+    def _origin(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def _create_client(self, origin: str) -> httpx.AsyncClient:
+        http2 = settings.LLM_HTTP2 and HTTP2_AVAILABLE
+        logger.info(f"Client HTTP partagé créé pour {origin} (HTTP/2: {http2})")
+        return httpx.AsyncClient(
+            base_url=origin,
+            http2=http2,
+            timeout=httpx.Timeout(settings.LLM_HTTP_TIMEOUT, connect=settings.LLM_HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=settings.LLM_HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+
+    def get(self, url: str) -> httpx.AsyncClient:
+        """Client partagé pour l'origine de `url` (créé à la demande)"""
+        origin = self._origin(url)
+        client = self._clients.get(origin)
+        if client is None or client.is_closed:
+            with self._lock:
+                client = self._clients.get(origin)
+                if client is None or client.is_closed:
+                    client = self._clients[origin] = self._create_client(origin)
+        return client
+
+    def extensions(self, url: str) -> dict:
+        """Extensions httpx d'une requête: trace httpcore pour compter les nouvelles connexions"""
+        origin = self._origin(url)
+        self.requests[origin] += 1
+
+        async def trace(event_name: str, info: dict):
+            if event_name == "connection.connect_tcp.complete":
+                self.new_connections[origin] += 1
+
+        return {"trace": trace}
+
+    def start(self, urls: Iterable[str]):
+        """Ouverture des clients au démarrage (un par origine distincte)"""
+        for url in urls:
+            self.get(url)
+
+    async def close(self):
+        """Fermeture des connexions (arrêt du serveur)"""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.error(f"Erreur fermeture client HTTP: {e}")
+
+    def stats(self) -> dict:
+        origins = {}
+        for origin, requests in self.requests.items():
+            connections = self.new_connections[origin]
+            origins[origin] = {
+                "requests": requests,
+                "new_connections": connections,
+                "connection_reuse_rate": round(1 - connections / requests, 4) if requests else 0.0,
+            }
+        return {"http2": settings.LLM_HTTP2 and HTTP2_AVAILABLE, "open_clients": len(self._clients), "origins": origins}
+
+
+http_pool = HTTPClientPool()
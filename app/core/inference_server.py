@@ -0,0 +1,314 @@
+import fcntl
+import os
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import AuthenticationError, Client, Listener
+from typing import Callable, Optional, Tuple
+
+from app.core.config import settings
+from app.core.rerank_service import RerankService
+from app.utils.logging import logger, setup_logging
+
+# Méthode d'inférence de chaque type de modèle
+METHODS = {"sentence_transformer": "encode", "cross_encoder": "predict"}
+# Options laissées au serveur (taille des passes) plutôt qu'au client
+BATCH_OPTIONS = ("batch_size", "show_progress_bar")
+
+
+def _authkey() -> Optional[bytes]:
+    return settings.INFERENCE_SERVER_AUTHKEY.encode() if settings.INFERENCE_SERVER_AUTHKEY else None
+
+
+# Serveur d'inférence: un processus détient les modèles, les workers lui envoient leurs requêtes
+class InferenceServer:
+    """Chaque connexion (un thread client d'un worker) est servie par un thread; les
+    requêtes de toutes les connexions vers un même modèle sont regroupées en
+    micro-batches par un RerankService dédié."""
+
+    def __init__(self, address: str = None, authkey: Optional[bytes] = None, loader: Callable = None):
+        self.address = address or settings.INFERENCE_SERVER_ADDRESS
+        self.authkey = authkey
+        self.loader = loader
+        self._models = {}
+        self._lock = threading.Lock()
+        # Compteurs incrémentés par les threads de connexion
+        self._stats_lock = threading.Lock()
+        self._listener = None
+        self._stopped = threading.Event()
+        # Connexions ouvertes: chaque worker vivant garde les siennes
+        self.active = 0
+        self._idle_since = time.monotonic()
+        self.connections = 0
+        self.requests = 0
+
+    def _model(self, kind: str, name: str, kwargs: dict) -> tuple:
+        """(modèle, backend, batcher), chargés à la première demande"""
+        key = (kind, name, tuple(sorted(kwargs.items())))
+        if key in self._models:
+            return self._models[key]
+        with self._lock:
+            if key not in self._models:
+                if self.loader is None:
+                    from app.core.onnx_backend import load_local
+                    self.loader = load_local
+                model, backend = self.loader(kind, name, **kwargs)
+                batcher = RerankService(
+                    getattr(model, METHODS[kind]), settings.INFERENCE_BATCH_MAX_ITEMS,
+                    settings.INFERENCE_BATCH_MAX_WAIT_MS, name=f"inference-{name.split('/')[-1]}"
+                )
+                self._models[key] = (model, backend, batcher)
+                logger.info(f"Serveur d'inférence: {name} chargé ({backend})")
+            return self._models[key]
+
+    def _execute(self, op: str, kind: str, name: str, kwargs: dict, payload, options: dict):
+        if op == "ping":
+            return True
+        if op == "stats":
+            return self.stats()
+        model, backend, batcher = self._model(kind, name, kwargs)
+        if op == "load":
+            return backend
+        with self._stats_lock:
+            self.requests += 1
+        if options:
+            # Options d'encodage particulières: passe dédiée, hors micro-batch
+            return getattr(model, METHODS[kind])(payload, **options)
+        return batcher.score_sync(payload)
+
+    def _handle(self, conn):
+        with self._stats_lock:
+            self.active += 1
+        try:
+            self._serve_connection(conn)
+        finally:
+            with self._stats_lock:
+                self.active -= 1
+                self._idle_since = time.monotonic()
+
+    def _serve_connection(self, conn):
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    response = ("ok", self._execute(*request))
+                except Exception as e:
+                    logger.error(f"Erreur serveur d'inférence ({request[0]} {request[2]}): {e}")
+                    response = ("error", f"{type(e).__name__}: {e}")
+                try:
+                    conn.send(response)
+                except OSError:
+                    return
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        self._listener = Listener(self.address, family="AF_UNIX", authkey=self.authkey)
+        os.chmod(self.address, 0o600)
+        logger.info(f"Serveur d'inférence à l'écoute sur {self.address}")
+        try:
+            while True:
+                try:
+                    conn = self._listener.accept()
+                except (AuthenticationError, EOFError) as e:
+                    logger.warning(f"Connexion refusée par le serveur d'inférence: {e}")
+                    continue
+                except OSError:
+                    return
+                self.connections += 1
+                threading.Thread(target=self._handle, args=(conn,), name="inference-connection", daemon=True).start()
+        finally:
+            self._stopped.set()
+
+    def wait_idle(self, idle_timeout: float):
+        """Bloque jusqu'à la fin de l'écoute, ou jusqu'à idle_timeout secondes sans aucune connexion (0: jamais)"""
+        while not self._stopped.wait(min(idle_timeout, 5) if idle_timeout else None):
+            with self._stats_lock:
+                idle_for = time.monotonic() - self._idle_since if self.active == 0 else 0
+            if idle_for >= idle_timeout:
+                logger.info(f"Serveur d'inférence sans connexion depuis {idle_for:.0f}s, arrêt")
+                return
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.close()
+        for _, _, batcher in self._models.values():
+            batcher.stop()
+
+    def stats(self) -> dict:
+        return {
+            "active_connections": self.active,
+            "connections": self.connections,
+            "requests": self.requests,
+            "models": {f"{kind}:{name}": {"backend": backend, **batcher.stats()}
+                       for (kind, name, _), (_, backend, batcher) in self._models.items()},
+        }
+
+
+# Client d'un worker: une connexion par thread
+class InferenceClient:
+    def __init__(self, address: str = None, authkey: Optional[bytes] = None, timeout: float = None):
+        self.address = address or settings.INFERENCE_SERVER_ADDRESS
+        self.authkey = authkey
+        self.timeout = timeout or settings.INFERENCE_SERVER_TIMEOUT
+        self._local = threading.local()
+        self._wait_again_at = 0.0
+        self.failures = 0
+        self.timeouts = 0
+
+    def _close(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def request(self, op: str, kind: str = None, name: str = None, kwargs: dict = None, payload=None,
+                options: dict = None, timeout: float = None):
+        """Requête au serveur; ConnectionError s'il est injoignable, TimeoutError s'il ne répond pas à temps"""
+        timeout = timeout or self.timeout
+        try:
+            conn = getattr(self._local, "conn", None)
+            if conn is None:
+                conn = self._local.conn = Client(self.address, family="AF_UNIX", authkey=self.authkey)
+            conn.send((op, kind, name, kwargs or {}, payload, options or {}))
+            ready = conn.poll(timeout)
+            if ready:
+                status, result = conn.recv()
+        except (OSError, EOFError, AuthenticationError) as e:
+            self._close()
+            self.failures += 1
+            raise ConnectionError(f"serveur d'inférence injoignable ({e})") from e
+        if not ready:
+            # Connexion abandonnée: la réponse tardive ne doit pas être lue par la requête suivante
+            self._close()
+            self.timeouts += 1
+            raise TimeoutError(f"serveur d'inférence: pas de réponse en {timeout}s")
+        if status == "error":
+            raise RuntimeError(result)
+        return result
+
+    def wait_ready(self, timeout: float, autostart: bool = False) -> bool:
+        """Attend que le serveur réponde, en le démarrant au besoin"""
+        if time.monotonic() < self._wait_again_at:
+            return False
+        deadline = time.monotonic() + timeout
+        spawned = False
+        while True:
+            try:
+                return self.request("ping", timeout=1)
+            except (ConnectionError, TimeoutError):
+                pass
+            if autostart and not spawned:
+                spawn_server()
+                spawned = True
+            if time.monotonic() >= deadline:
+                # Pas de nouvelle attente complète pour les modèles suivants
+                self._wait_again_at = time.monotonic() + settings.INFERENCE_SERVER_RETRY_INTERVAL
+                return False
+            time.sleep(0.5)
+
+
+# Modèle distant: même interface que SentenceTransformer.encode / CrossEncoder.predict
+class RemoteModel:
+    """Aucun modèle n'est chargé dans le worker: une requête lente échoue (TimeoutError), une
+    connexion perdue est retentée une fois après redémarrage éventuel du serveur."""
+
+    def __init__(self, client: InferenceClient, kind: str, name: str, kwargs: dict):
+        self.client = client
+        self.kind = kind
+        self.name = name
+        self.kwargs = kwargs
+
+    def _run(self, payload, options: dict):
+        options = {key: value for key, value in options.items() if key not in BATCH_OPTIONS}
+        try:
+            return self.client.request("run", self.kind, self.name, self.kwargs, payload, options)
+        except ConnectionError as e:
+            logger.warning(f"{self.name}: {e}, nouvelle tentative")
+            if not self.client.wait_ready(settings.INFERENCE_SERVER_TIMEOUT, settings.INFERENCE_SERVER_AUTOSTART):
+                raise
+            return self.client.request("run", self.kind, self.name, self.kwargs, payload, options)
+
+    def encode(self, sentences, **options):
+        if isinstance(sentences, str):
+            return self._run([sentences], options)[0]
+        return self._run(list(sentences), options)
+
+    def predict(self, pairs, **options):
+        return self._run([tuple(pair) for pair in pairs], options)
+
+
+_client: Optional[InferenceClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> InferenceClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = InferenceClient(authkey=_authkey())
+        return _client
+
+
+def spawn_server():
+    """Lance le serveur détaché du worker; les lancements concurrents des autres workers s'arrêtent seuls.
+
+    Le serveur est partagé: il survit au recyclage du worker qui l'a lancé et s'arrête de
+    lui-même sans aucune connexion de worker (INFERENCE_SERVER_IDLE_TIMEOUT).
+    """
+    logger.info("Démarrage du serveur d'inférence partagé")
+    subprocess.Popen([sys.executable, "-m", "app.core.inference_server"], start_new_session=True)
+
+
+def remote_model(kind: str, name: str, kwargs: dict) -> Tuple[object, str]:
+    """Modèle servi par le serveur d'inférence et son backend. Jamais de copie locale: un serveur
+    injoignable ou un chargement en échec fait échouer le démarrage du worker."""
+    client = get_client()
+    if not client.wait_ready(settings.INFERENCE_SERVER_CONNECT_TIMEOUT, settings.INFERENCE_SERVER_AUTOSTART):
+        raise RuntimeError(f"{name}: serveur d'inférence injoignable sur {client.address}")
+    # Premier chargement éventuellement long (téléchargement, export ONNX): le worker attend le serveur
+    try:
+        backend = client.request("load", kind, name, kwargs, timeout=settings.INFERENCE_SERVER_LOAD_TIMEOUT)
+    except (ConnectionError, TimeoutError, RuntimeError) as e:
+        raise RuntimeError(f"{name}: échec du chargement sur le serveur d'inférence ({e})") from e
+    logger.info(f"{name}: servi par le serveur d'inférence ({backend})")
+    return RemoteModel(client, kind, name, kwargs), backend
+
+
+def inference_server_stats() -> dict:
+    if not settings.INFERENCE_SERVER_ENABLED:
+        return {"enabled": False}
+    client = get_client()
+    try:
+        counters = {"client_failures": client.failures, "client_timeouts": client.timeouts}
+        return {"enabled": True, **counters, **client.request("stats", timeout=2)}
+    except (ConnectionError, TimeoutError, RuntimeError) as e:
+        return {"enabled": True, **counters, "error": str(e)}
+
+
+def main():
+    setup_logging()
+    # Un seul serveur par adresse: le verrou est tenu pendant toute la vie du processus
+    lock = open(f"{settings.INFERENCE_SERVER_ADDRESS}.lock", "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        logger.info("Serveur d'inférence déjà démarré")
+        return
+    server = InferenceServer(authkey=_authkey())
+    threading.Thread(target=server.serve_forever, name="inference-accept", daemon=True).start()
+    try:
+        server.wait_idle(settings.INFERENCE_SERVER_IDLE_TIMEOUT)
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-import httpx
+import asyncio
 import json
 from typing import Dict, Any, AsyncGenerator
 from enum import Enum
@@ -7,6 +7,8 @@ from fastapi import HTTPException
 
 from app.models.enums import Provider
 from app.core.config import settings
+from app.core.http_pool import http_pool
+from app.core.llm_scheduler import RETRYABLE_STATUS, SchedulerQueueFull, get_scheduler, parse_retry_after
 from app.utils.logging import logger
 
 # Configuration des providers
@@ -61,7 +63,9 @@ class OptimizedLLMProvider:
         self.provider = provider
         self.config = PROVIDER_CONFIGS[provider]
         self.api_key = API_KEYS[provider]
-        self.client = None
+        # Client partagé du processus (connexions réutilisées entre appels)
+        self.client = http_pool.get(self.config["base_url"])
+        self.scheduler = get_scheduler(provider.value)
 
     def get_headers(self) -> Dict[str, str]:
         headers = {"Content-Type": "application/json"}
@@ -107,6 +111,12 @@ class OptimizedLLMProvider:
         else:
             return response_data["choices"][0]["message"]["content"]
 
+    @staticmethod
+    def estimate_tokens(prompt: str, data: Dict[str, Any]) -> int:
+        """Estimation des tokens consommés (prompt ~4 caractères/token + sortie maximale)"""
+        max_output = data.get("max_tokens") or data.get("max_completion_tokens") or 512
+        return len(prompt) // 4 + max_output
+
     async def generate_response(self, prompt: str, **kwargs) -> str:
         if not self.api_key:
             raise ValueError(f"Clé API manquante pour {self.provider}")
@@ -114,21 +124,29 @@ class OptimizedLLMProvider:
         headers = self.get_headers()
         data = self.format_messages(prompt, **kwargs)
 
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                self.config["base_url"],
-                headers=headers,
-                json=data
+        # Envoi sous contrôle du scheduler (concurrence, débit, nouveaux essais sur 429/503)
+        try:
+            response = await self.scheduler.run(
+                lambda: self.client.post(
+                    self.config["base_url"],
+                    headers=headers,
+                    json=data,
+                    timeout=60.0,
+                    extensions=http_pool.extensions(self.config["base_url"])
+                ),
+                self.estimate_tokens(prompt, data)
             )
+        except SchedulerQueueFull as e:
+            raise HTTPException(status_code=503, detail=str(e))
 
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Erreur API {self.provider}: {response.text}"
-                )
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=f"Erreur API {self.provider}: {response.text}"
+            )
 
-            response_data = response.json()
-            return self.extract_response(response_data)
+        response_data = response.json()
+        return self.extract_response(response_data)
 
     async def generate_stream(self, prompt: str) -> AsyncGenerator[str, None]:
         """Génère une réponse en streaming."""
@@ -138,35 +156,56 @@ class OptimizedLLMProvider:
         headers = self.get_headers()
         data = self.format_messages(prompt)
         data["stream"] = True
-
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            async with client.stream(
-                    'POST',
-                    self.config["base_url"],
-                    headers=headers,
-                    json=data
-            ) as response:
-                if response.status_code != 200:
-                    raise HTTPException(
-                        status_code=response.status_code,
-                        detail=f"Erreur API {self.provider}: {response.text}"
-                    )
-
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data_str = line[6:]
-                        if data_str.strip() == "[DONE]":
-                            break
-
-                        try:
-                            data_json = json.loads(data_str)
-                            if self.provider == Provider.ANTHROPIC:
-                                if data_json.get("type") == "content_block_delta":
-                                    yield data_json["delta"]["text"]
-                            else:
-                                if "choices" in data_json and len(data_json["choices"]) > 0:
-                                    delta = data_json["choices"][0].get("delta", {})
-                                    if "content" in delta:
-                                        yield delta["content"]
-                        except json.JSONDecodeError:
-                            continue
+        estimated_tokens = self.estimate_tokens(prompt, data)
+
+        # Les nouveaux essais ne concernent que la réponse initiale (avant le premier token)
+        for attempt in range(self.scheduler.max_retries + 1):
+            retry_after, saturated = None, False
+            try:
+                async with self.scheduler.slot(estimated_tokens):
+                    async with self.client.stream(
+                            'POST',
+                            self.config["base_url"],
+                            headers=headers,
+                            json=data,
+                            timeout=120.0,
+                            extensions=http_pool.extensions(self.config["base_url"])
+                    ) as response:
+                        if response.status_code in RETRYABLE_STATUS and attempt < self.scheduler.max_retries:
+                            saturated, retry_after = True, parse_retry_after(response.headers)
+                        elif response.status_code != 200:
+                            await response.aread()
+                            raise HTTPException(
+                                status_code=response.status_code,
+                                detail=f"Erreur API {self.provider}: {response.text}"
+                            )
+                        else:
+                            async for token in self._iter_stream_tokens(response):
+                                yield token
+            except SchedulerQueueFull as e:
+                raise HTTPException(status_code=503, detail=str(e))
+
+            if not saturated:
+                return
+            await asyncio.sleep(self.scheduler.backoff_delay(attempt, retry_after))
+
+    async def _iter_stream_tokens(self, response) -> AsyncGenerator[str, None]:
+        """Tokens d'une réponse SSE du provider"""
+        async for line in response.aiter_lines():
+            if line.startswith("data: "):
+                data_str = line[6:]
+                if data_str.strip() == "[DONE]":
+                    break
+
+                try:
+                    data_json = json.loads(data_str)
+                    if self.provider == Provider.ANTHROPIC:
+                        if data_json.get("type") == "content_block_delta":
+                            yield data_json["delta"]["text"]
+                    else:
+                        if "choices" in data_json and len(data_json["choices"]) > 0:
+                            delta = data_json["choices"][0].get("delta", {})
+                            if "content" in delta:
+                                yield delta["content"]
+                except json.JSONDecodeError:
+                    continue
@@ -0,0 +1,224 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.llm_provider import API_KEYS, OptimizedLLMProvider
+from app.core.metrics import metrics_collector
+from app.models.enums import Provider
+from app.utils.logging import logger
+
+
+# Santé d'un provider sur une fenêtre glissante
+class ProviderHealth:
+    """Latences (réponses complètes et premier token du streaming) et issues des derniers
+    appels; mise à l'écart temporaire après plusieurs échecs consécutifs."""
+
+    def __init__(self, window: int = None):
+        window = window or settings.LLM_ROUTER_WINDOW
+        self.latencies = deque(maxlen=window)
+        self.first_token_latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+
+    def record_success(self, latency: float, first_token: bool = False):
+        (self.first_token_latencies if first_token else self.latencies).append(latency)
+        self.outcomes.append(True)
+        self.consecutive_failures = 0
+
+    def record_failure(self):
+        self.outcomes.append(False)
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= settings.LLM_ROUTER_FAILURE_THRESHOLD:
+            self.cooldown_until = time.monotonic() + settings.LLM_ROUTER_COOLDOWN
+
+    def percentile(self, q: float, first_token: bool = False) -> Optional[float]:
+        samples = self.first_token_latencies if first_token else self.latencies
+        if len(samples) < settings.LLM_ROUTER_MIN_SAMPLES:
+            return None
+        return float(np.percentile(samples, q))
+
+    @property
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def is_healthy(self, now: float) -> bool:
+        if now < self.cooldown_until:
+            return False
+        return len(self.outcomes) < settings.LLM_ROUTER_MIN_SAMPLES or self.error_rate <= settings.LLM_ROUTER_MAX_ERROR_RATE
+
+    def score(self) -> float:
+        """Coût estimé d'un appel: p50 (latence par défaut si inconnue) pénalisé par le taux d'erreur"""
+        p50 = self.percentile(50)
+        return (p50 if p50 is not None else settings.LLM_HEDGE_DEFAULT_DELAY) * (1 + 4 * self.error_rate)
+
+    def stats(self) -> dict:
+        p50, p95 = self.percentile(50), self.percentile(95)
+        ttft = self.percentile(50, first_token=True)
+        return {
+            "samples": len(self.outcomes),
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "first_token_p50_ms": round(ttft * 1000, 1) if ttft is not None else None,
+            "error_rate": round(self.error_rate, 4),
+            "healthy": self.is_healthy(time.monotonic()),
+        }
+
+
+# Routage des appels LLM selon la latence et le taux d'erreur des providers
+class LLMRouter:
+    def __init__(self):
+        self.health: Dict[Provider, ProviderHealth] = {provider: ProviderHealth() for provider in Provider}
+        self.failovers = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def candidates(self, preferred: Provider) -> List[Provider]:
+        """Ordre d'essai: provider demandé s'il est sain, puis les autres par coût croissant.
+
+        Les providers sans clé API sont ignorés; les providers écartés passent en dernier."""
+        now = time.monotonic()
+        configured = [provider for provider in Provider if API_KEYS.get(provider)]
+        if preferred not in configured:
+            configured.insert(0, preferred)
+        healthy = [provider for provider in configured if self.health[provider].is_healthy(now)]
+        unhealthy = [provider for provider in configured if provider not in healthy]
+
+        ordered = sorted(healthy, key=lambda provider: (provider != preferred, self.health[provider].score()))
+        ordered += sorted(unhealthy, key=lambda provider: self.health[provider].cooldown_until)
+        return ordered[:max(1, settings.LLM_ROUTER_MAX_ATTEMPTS)]
+
+    def hedge_delay(self, provider: Provider) -> float:
+        """Attente avant la requête de couverture: p95 observé du provider"""
+        p95 = self.health[provider].percentile(95)
+        delay = p95 if p95 is not None else settings.LLM_HEDGE_DEFAULT_DELAY
+        return max(delay, settings.LLM_HEDGE_MIN_DELAY)
+
+    def stats(self) -> dict:
+        return {
+            "mode": settings.LLM_ROUTING_MODE,
+            "hedging": settings.LLM_HEDGING,
+            "failovers": self.failovers,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "providers": {provider.value: health.stats() for provider, health in self.health.items()},
+        }
+
+
+llm_router = LLMRouter()
+
+
+# Provider LLM routé (même interface qu'OptimizedLLMProvider)
+class RoutedLLMProvider:
+    """Bascule automatiquement sur le provider suivant en cas d'erreur et, si la couverture
+    est activée, lance une seconde requête quand la première dépasse son p95: la plus
+    rapide l'emporte et l'autre est annulée. `provider` indique le dernier provider servi."""
+
+    def __init__(self, preferred: Provider, router: LLMRouter = None,
+                 provider_factory: Callable[[Provider], Any] = OptimizedLLMProvider):
+        self.provider = preferred
+        self.preferred = preferred
+        self.router = router or llm_router
+        self.provider_factory = provider_factory
+
+    async def _call(self, provider: Provider, prompt: str, kwargs: Dict[str, Any]) -> str:
+        health = self.router.health[provider]
+        start = time.monotonic()
+        try:
+            result = await self.provider_factory(provider).generate_response(prompt, **kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            health.record_failure()
+            metrics_collector.increment_counter("llm_router_errors", labels={"provider": provider.value})
+            raise
+        health.record_success(time.monotonic() - start)
+        return result
+
+    async def generate_response(self, prompt: str, **kwargs) -> str:
+        candidates = self.router.candidates(self.preferred)
+        pending: Dict[asyncio.Future, Provider] = {}
+        next_index = 0
+        hedged = False
+        last_error: Optional[Exception] = None
+
+        def launch():
+            nonlocal next_index
+            provider = candidates[next_index]
+            next_index += 1
+            pending[asyncio.ensure_future(self._call(provider, prompt, kwargs))] = provider
+            return provider
+
+        primary = launch()
+        primary_started = time.monotonic()
+        try:
+            while pending:
+                timeout = None
+                if settings.LLM_HEDGING and not hedged and next_index < len(candidates):
+                    timeout = max(0.0, self.router.hedge_delay(primary) - (time.monotonic() - primary_started))
+
+                done, _ = await asyncio.wait(list(pending), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    self.router.hedges += 1
+                    metrics_collector.increment_counter("llm_router_hedges", labels={"provider": primary.value})
+                    hedge = launch()
+                    logger.info(f"Requête de couverture vers {hedge.value} ({primary.value} au-delà de son p95)")
+                    continue
+
+                for task in done:
+                    provider = pending.pop(task)
+                    if task.exception() is None:
+                        if hedged and provider != primary:
+                            self.router.hedge_wins += 1
+                        self.provider = provider
+                        return task.result()
+                    last_error = task.exception()
+                    logger.warning(f"Échec du provider {provider.value}: {last_error}")
+
+                if not pending and next_index < len(candidates):
+                    self.router.failovers += 1
+                    metrics_collector.increment_counter("llm_router_failovers")
+                    primary, primary_started = launch(), time.monotonic()
+                    logger.info(f"Bascule vers le provider {primary.value}")
+        finally:
+            # Le perdant est annulé: sa connexion est libérée et son créneau du scheduler rendu
+            for task in pending:
+                task.cancel()
+        raise last_error
+
+    async def generate_stream(self, prompt: str) -> AsyncGenerator[str, None]:
+        """Streaming avec bascule tant qu'aucun token n'a été transmis (pas de couverture)"""
+        candidates = self.router.candidates(self.preferred)
+        for index, provider in enumerate(candidates):
+            health = self.router.health[provider]
+            start = time.monotonic()
+            started = False
+            try:
+                async for token in self.provider_factory(provider).generate_stream(prompt):
+                    if not started:
+                        started = True
+                        health.record_success(time.monotonic() - start, first_token=True)
+                        self.provider = provider
+                    yield token
+                return
+            except Exception as e:
+                if started:
+                    raise
+                health.record_failure()
+                if index == len(candidates) - 1:
+                    raise
+                self.router.failovers += 1
+                metrics_collector.increment_counter("llm_router_failovers")
+                logger.warning(f"Échec du streaming {provider.value}, bascule: {e}")
+
+
+def get_llm_provider(provider: Provider):
+    """Provider demandé seul (mode "fixed") ou routé selon la latence (mode "latency")"""
+    if settings.LLM_ROUTING_MODE == "latency":
+        return RoutedLLMProvider(provider)
+    return OptimizedLLMProvider(provider)
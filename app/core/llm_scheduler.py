@@ -0,0 +1,181 @@
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import metrics_collector
+from app.utils.logging import logger
+
+# Statuts signalant une saturation du provider (nouvel essai après attente)
+RETRYABLE_STATUS = (429, 503)
+
+
+class SchedulerQueueFull(Exception):
+    """File d'attente du provider pleine: la requête est refusée immédiatement"""
+
+
+def parse_limits(spec: str) -> Dict[str, int]:
+    """Limites par provider: "mistral:120,openai:500" -> {provider: limite}"""
+    limits = {}
+    for item in spec.split(","):
+        if ":" in item:
+            name, value = item.split(":", 1)
+            limits[name.strip()] = int(value)
+    return limits
+
+
+def parse_retry_after(headers: httpx.Headers) -> Optional[float]:
+    """Délai demandé par le provider (Retry-After en secondes ou date HTTP, retry-after-ms)"""
+    if "retry-after-ms" in headers:
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+# Seau à jetons (débit par minute)
+class TokenBucket:
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1.0):
+        """Attend que `amount` jetons soient disponibles (illimité si per_minute <= 0)"""
+        if self.per_minute <= 0:
+            return
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.per_minute / 60)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) * 60 / self.per_minute)
+
+
+# Ordonnanceur des appels d'un provider
+class ProviderScheduler:
+    """Concurrence bornée (sémaphore), débit RPM/TPM (seaux à jetons), file d'attente
+    bornée et pause commune après un 429/503 (Retry-After, sinon backoff exponentiel)."""
+
+    def __init__(self, name: str, max_concurrency: int, rpm: int = 0, tpm: int = 0,
+                 max_queue: int = None, max_retries: int = None):
+        self.name = name
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_concurrency = max_concurrency
+        self.requests_bucket = TokenBucket(rpm)
+        self.tokens_bucket = TokenBucket(tpm)
+        self.max_queue = settings.LLM_QUEUE_MAX if max_queue is None else max_queue
+        self.max_retries = settings.LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.blocked_until = 0.0
+        self.waiting = 0
+        self.active = 0
+        self.rejected = 0
+        self.retries = 0
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int = 0):
+        """Admission d'une requête: file bornée, pause éventuelle, sémaphore puis débit"""
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            metrics_collector.increment_counter("llm_scheduler_rejected", labels={"provider": self.name})
+            raise SchedulerQueueFull(f"File d'attente {self.name} pleine ({self.waiting} requêtes)")
+
+        start = time.monotonic()
+        self.waiting += 1
+        metrics_collector.set_gauge("llm_queue_depth", self.waiting, labels={"provider": self.name})
+        try:
+            await self._semaphore.acquire()
+            try:
+                pause = self.blocked_until - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                await self.requests_bucket.acquire(1)
+                await self.tokens_bucket.acquire(estimated_tokens)
+            except BaseException:
+                self._semaphore.release()
+                raise
+        finally:
+            self.waiting -= 1
+            metrics_collector.set_gauge("llm_queue_depth", self.waiting, labels={"provider": self.name})
+
+        metrics_collector.record_timer("llm_queue_wait", time.monotonic() - start, labels={"provider": self.name})
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[float]) -> float:
+        """Délai avant nouvel essai; appliqué à toutes les requêtes du provider"""
+        if retry_after is not None:
+            delay = retry_after
+        else:
+            delay = settings.LLM_BACKOFF_BASE * (2 ** attempt) * (1 + random.random() * 0.25)
+        delay = min(delay, settings.LLM_BACKOFF_MAX)
+        self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+        self.retries += 1
+        metrics_collector.increment_counter("llm_scheduler_retries", labels={"provider": self.name})
+        logger.warning(f"Provider {self.name} saturé, nouvel essai dans {delay:.1f}s (essai {attempt + 1})")
+        return delay
+
+    async def run(self, send: Callable[[], Awaitable[httpx.Response]], estimated_tokens: int = 0) -> httpx.Response:
+        """Exécute `send` sous contrôle du scheduler, avec nouveaux essais sur 429/503"""
+        for attempt in range(self.max_retries + 1):
+            async with self.slot(estimated_tokens):
+                response = await send()
+            if response.status_code not in RETRYABLE_STATUS or attempt == self.max_retries:
+                return response
+            await asyncio.sleep(self.backoff_delay(attempt, parse_retry_after(response.headers)))
+        return response
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "retries": self.retries,
+            "paused_for_s": round(max(0.0, self.blocked_until - time.monotonic()), 2),
+        }
+
+
+# Ordonnanceurs par provider (créés à la demande)
+_schedulers: Dict[str, ProviderScheduler] = {}
+
+
+def get_scheduler(provider: str) -> ProviderScheduler:
+    scheduler = _schedulers.get(provider)
+    if scheduler is None:
+        scheduler = _schedulers[provider] = ProviderScheduler(
+            provider,
+            max_concurrency=parse_limits(settings.LLM_MAX_CONCURRENCY).get(provider, 8),
+            rpm=parse_limits(settings.LLM_RPM_LIMITS).get(provider, 0),
+            tpm=parse_limits(settings.LLM_TPM_LIMITS).get(provider, 0),
+        )
+    return scheduler
+
+
+def scheduler_stats() -> Dict[str, dict]:
+    return {name: scheduler.stats() for name, scheduler in _schedulers.items()}
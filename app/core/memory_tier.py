@@ -0,0 +1,220 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+
+def parse_quotas(spec: str) -> Dict[str, float]:
+    """Quotas par type de cache: "full_response:0.2,embeddings:0.4" -> {type: part du budget}"""
+    quotas = {}
+    for item in spec.split(","):
+        if ":" in item:
+            name, share = item.split(":", 1)
+            quotas[name.strip()] = float(share)
+    return quotas
+
+
+def estimate_size(value: Any) -> int:
+    """Taille approximative d'une valeur en octets"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes + 112
+    if isinstance(value, (bytes, bytearray)):
+        return len(value) + 33
+    if isinstance(value, str):
+        return len(value) + 49
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 1024
+
+
+# Segment LRU (probation + protégé) d'un type de cache
+class _Segment:
+    """SLRU: une entrée entre en probation et n'est protégée qu'au second accès,
+    ce qui empêche un afflux d'entrées vues une seule fois de chasser les plus utiles."""
+
+    PROTECTED_SHARE = 0.8
+
+    def __init__(self, max_bytes: int, max_items: int):
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        # clé -> (valeur, expiration monotone, taille, tags de dépendance)
+        self.probation: "OrderedDict[str, Tuple[Any, float, int, frozenset]]" = OrderedDict()
+        self.protected: "OrderedDict[str, Tuple[Any, float, int, frozenset]]" = OrderedDict()
+        self.bytes = 0
+        self.protected_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self.probation) + len(self.protected)
+
+    def _pop(self, key: str) -> Optional[Tuple[Any, float, int, frozenset]]:
+        entry = self.probation.pop(key, None)
+        if entry is None:
+            entry = self.protected.pop(key, None)
+            if entry is not None:
+                self.protected_bytes -= entry[2]
+        if entry is not None:
+            self.bytes -= entry[2]
+        return entry
+
+    def get(self, key: str, now: float) -> Optional[Any]:
+        entry = self.protected.get(key)
+        if entry is not None:
+            if entry[1] <= now:
+                self._pop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.protected.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        entry = self.probation.pop(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[1] <= now:
+            self.bytes -= entry[2]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        # Second accès: promotion dans la zone protégée
+        self.protected[key] = entry
+        self.protected_bytes += entry[2]
+        while self.protected_bytes > self.max_bytes * self.PROTECTED_SHARE and len(self.protected) > 1:
+            demoted_key, demoted = self.protected.popitem(last=False)
+            self.protected_bytes -= demoted[2]
+            self.probation[demoted_key] = demoted
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key: str, value: Any, expires_at: float, size: int, tags: frozenset = frozenset()):
+        self._pop(key)
+        if size > self.max_bytes:
+            return
+        self.probation[key] = (value, expires_at, size, tags)
+        self.bytes += size
+        while self.bytes > self.max_bytes or len(self) > self.max_items:
+            self._evict_one()
+
+    def _evict_one(self):
+        """Éviction O(1): LRU de la probation d'abord, puis LRU de la zone protégée"""
+        if self.probation:
+            _, entry = self.probation.popitem(last=False)
+        else:
+            _, entry = self.protected.popitem(last=False)
+            self.protected_bytes -= entry[2]
+        self.bytes -= entry[2]
+        self.evictions += 1
+
+    def delete(self, key: str) -> bool:
+        return self._pop(key) is not None
+
+    def delete_tagged(self, tags: frozenset) -> int:
+        """Suppression des entrées portant un des tags (parcours du segment, rare)"""
+        keys = [key for entries in (self.probation, self.protected)
+                for key, entry in entries.items() if entry[3] & tags]
+        for key in keys:
+            self._pop(key)
+        return len(keys)
+
+    def clear(self):
+        self.probation.clear()
+        self.protected.clear()
+        self.bytes = 0
+        self.protected_bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "items": len(self),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+# Niveau mémoire du cache multi-niveaux: un segment LRU par type de cache
+class SegmentedMemoryTier:
+    """Budget mémoire en octets réparti par `cache_type` (quotas), TTL vérifié à la
+    lecture. Les types sans quota partagent le segment "general"."""
+
+    DEFAULT_SEGMENT = "general"
+
+    def __init__(self, max_bytes: int = None, quotas: Dict[str, float] = None, max_items: int = None):
+        max_bytes = max_bytes or settings.CACHE_MEMORY_MAX_BYTES
+        quotas = dict(quotas or parse_quotas(settings.CACHE_MEMORY_QUOTAS))
+        quotas.setdefault(self.DEFAULT_SEGMENT, 0.1)
+        max_items = max_items or settings.CACHE_MEMORY_MAX_ITEMS
+        total_share = sum(quotas.values())
+        self.segments = {
+            name: _Segment(int(max_bytes * share / total_share), max_items)
+            for name, share in quotas.items()
+        }
+        self._lock = threading.Lock()
+
+    def _segment(self, cache_type: str) -> _Segment:
+        segment = self.segments.get(cache_type)
+        return segment if segment is not None else self.segments[self.DEFAULT_SEGMENT]
+
+    def get_many(self, keys: List[str], cache_type: str) -> List[Optional[Any]]:
+        now = time.monotonic()
+        with self._lock:
+            segment = self._segment(cache_type)
+            return [segment.get(key, now) for key in keys]
+
+    def set_many(self, keys: List[str], values: List[Any], ttl: int, cache_type: str,
+                 tags: Optional[List[frozenset]] = None) -> int:
+        """Insertion groupée; retourne le nombre d'évictions provoquées"""
+        sizes = [estimate_size(value) for value in values]
+        tags = tags or [frozenset()] * len(keys)
+        expires_at = time.monotonic() + ttl
+        with self._lock:
+            segment = self._segment(cache_type)
+            evictions = segment.evictions
+            for key, value, size, entry_tags in zip(keys, values, sizes, tags):
+                segment.set(key, value, expires_at, size, entry_tags)
+            return segment.evictions - evictions
+
+    def delete(self, key: str, cache_type: str) -> bool:
+        with self._lock:
+            return self._segment(cache_type).delete(key)
+
+    def clear(self):
+        with self._lock:
+            for segment in self.segments.values():
+                segment.clear()
+
+    def delete_tagged(self, tags: List[str]) -> int:
+        """Suppression, tous segments confondus, des entrées dépendant d'un des tags"""
+        tags = frozenset(tags)
+        with self._lock:
+            return sum(segment.delete_tagged(tags) for segment in self.segments.values())
+
+    def clear_types(self, cache_types: List[str]):
+        """Vidage des segments des types donnés (un type sans quota vide le segment partagé)"""
+        with self._lock:
+            for cache_type in cache_types:
+                self._segment(cache_type).clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(segment) for segment in self.segments.values())
+
+    def stats(self) -> Dict[str, dict]:
+        with self._lock:
+            return {name: segment.stats() for name, segment in self.segments.items()}
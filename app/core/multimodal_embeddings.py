@@ -1,10 +1,10 @@
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from typing import List, Optional, Union
 from PIL import Image
 
 from app.core.multimodal_models import MultimodalModels
 from app.core.config import settings
+from app.core.onnx_backend import load_sentence_transformer
 from app.utils.logging import logger
 from app.core.cache import cache
 
@@ -15,16 +15,15 @@ class MultimodalEmbeddings:
     def __init__(self):
         # Modèle d'embeddings textuels multimodaux
         try:
-            self.text_model = SentenceTransformer(
+            self.text_model, _ = load_sentence_transformer(
                 settings.MULTIMODAL_MODELS["text_embedding"],
-                device='cpu',
                 cache_folder='./.cache/sentence_transformers'
             )
             logger.info(f"Modèle d'embeddings multimodaux chargé: {settings.MULTIMODAL_MODELS['text_embedding']}")
         except Exception as e:
             logger.error(f"Erreur chargement modèle embeddings multimodaux: {e}")
             # Fallback sur un modèle standard
-            self.text_model = SentenceTransformer('all-mpnet-base-v2')
+            self.text_model, _ = load_sentence_transformer('all-mpnet-base-v2')
         
         # Modèles multimodaux (CLIP, BLIP, OCR)
         self.multimodal_models = MultimodalModels()
@@ -55,30 +54,21 @@ class MultimodalEmbeddings:
     
     def embed_documents_multimodal(self, texts: List[str], use_cache: bool = True) -> List[np.ndarray]:
         """Embedding de documents avec cache intelligent"""
-        embeddings = []
-        uncached_texts = []
-        uncached_indices = []
-        
-        for i, text in enumerate(texts):
-            if use_cache:
-                cached = cache.get(text, "multimodal_embeddings")
-                if cached is not None:
-                    embeddings.append(cached)
-                    continue
-            
-            uncached_texts.append(text)
-            uncached_indices.append(i)
-            embeddings.append(None)  # Placeholder
+        if use_cache:
+            embeddings = cache.get_vectors(texts, "multimodal_embeddings")
+        else:
+            embeddings = [None] * len(texts)
+        uncached_indices = [i for i, embedding in enumerate(embeddings) if embedding is None]
         
         # Traitement par batch des textes non cachés
-        if uncached_texts:
-            new_embeddings = self.text_model.encode(uncached_texts)
+        if uncached_indices:
+            uncached_texts = [texts[i] for i in uncached_indices]
+            new_embeddings = list(self.text_model.encode(uncached_texts))
             
             for idx, embedding in zip(uncached_indices, new_embeddings):
                 embeddings[idx] = embedding
-                if use_cache:
-                    cache.set(uncached_texts[uncached_indices.index(idx)],
-                              embedding, cache_type="multimodal_embeddings")
+            if use_cache:
+                cache.set_vectors(uncached_texts, new_embeddings, cache_type="multimodal_embeddings")
         
         return embeddings
     
@@ -0,0 +1,137 @@
+import json
+import os
+from typing import Callable, List, Tuple
+
+import numpy as np
+from sentence_transformers import CrossEncoder, SentenceTransformer
+
+from app.core.config import settings
+from app.utils.logging import logger
+
+# Backend ONNX optionnel: onnxruntime et optimum (sentence-transformers[onnx]); repli sur PyTorch sinon
+try:
+    import onnxruntime
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+# Textes de contrôle de la dérive int8 (domaine de la base documentaire)
+PROBE_TEXTS = [
+    "Qu'est-ce que le New Deal Technologique ?",
+    "Le New Deal Technologique est la stratégie numérique nationale du Sénégal.",
+    "Quels sont les axes de la souveraineté numérique ?",
+    "Le programme prévoit des investissements dans les data centers et la fibre optique.",
+    "Comment les startups peuvent-elles bénéficier du financement public ?",
+    "La formation aux compétences numériques cible les jeunes et les femmes.",
+    "Quel est le calendrier de mise en œuvre de la stratégie ?",
+    "La cybersécurité et la protection des données personnelles sont renforcées.",
+]
+
+
+def _session_options():
+    """Options onnxruntime: threads intra-op réglés, graphe entièrement optimisé"""
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = settings.ONNX_INTRA_OP_THREADS
+    options.inter_op_num_threads = 1
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return options
+
+
+def embedding_drift(reference: SentenceTransformer, candidate: SentenceTransformer,
+                    texts: List[str] = PROBE_TEXTS) -> dict:
+    """Cosinus entre embeddings fp32 et quantifiés des mêmes textes"""
+    expected = reference.encode(texts, normalize_embeddings=True)
+    actual = candidate.encode(texts, normalize_embeddings=True)
+    cosines = np.sum(expected * actual, axis=1)
+    return {"min_cosine": float(cosines.min()), "mean_cosine": float(cosines.mean())}
+
+
+def score_drift(reference: CrossEncoder, candidate: CrossEncoder, texts: List[str] = PROBE_TEXTS) -> dict:
+    """Écart entre scores fp32 et quantifiés des paires (question, passage)"""
+    pairs = [(query, passage) for query in texts[::2] for passage in texts[1::2]]
+    expected = np.asarray(reference.predict(pairs), dtype=np.float64)
+    actual = np.asarray(candidate.predict(pairs), dtype=np.float64)
+    return {
+        "max_abs_diff": float(np.abs(expected - actual).max()),
+        "correlation": float(np.corrcoef(expected, actual)[0, 1]),
+    }
+
+
+def drift_passed(report: dict) -> bool:
+    """Dérive mesurée dans les tolérances courantes (seuils relus à chaque chargement, jamais mis en cache)"""
+    thresholds = {"min_cosine": settings.ONNX_MIN_COSINE, "correlation": settings.ONNX_MIN_CORRELATION}
+    checks = [report[metric] >= minimum for metric, minimum in thresholds.items() if metric in report]
+    return bool(checks) and all(checks)
+
+
+def _load_quantized(model_class, name: str, drift_check: Callable, **kwargs) -> Tuple[object, dict]:
+    """Export ONNX et quantification int8 dynamique au premier chargement, mesures de dérive mises en cache"""
+    target = os.path.join(settings.ONNX_MODELS_DIR, name.replace("/", "__"))
+    config = settings.ONNX_QUANTIZATION_CONFIG
+    file_name = f"onnx/model_qint8_{config}.onnx"
+    report_path = os.path.join(target, f"drift_qint8_{config}.json")
+
+    if not os.path.exists(os.path.join(target, file_name)):
+        logger.info(f"Export ONNX int8 ({config}) de {name} vers {target}")
+        exported = model_class(name, backend="onnx", device="cpu", **kwargs)
+        exported.save_pretrained(target)
+        export_dynamic_quantized_onnx_model(exported, config, target)
+
+    model = model_class(target, backend="onnx", device="cpu",
+                        model_kwargs={"file_name": file_name, "provider": "CPUExecutionProvider",
+                                      "session_options": _session_options()})
+
+    if os.path.exists(report_path):
+        with open(report_path) as f:
+            return model, json.load(f)
+    report = drift_check(model_class(name, device="cpu", **kwargs), model)
+    with open(report_path, "w") as f:
+        json.dump(report, f)
+    return model, report
+
+
+def _load(model_class, name: str, drift_check: Callable, **kwargs) -> Tuple[object, str]:
+    """Modèle ONNX int8 si demandé et fidèle au fp32, sinon PyTorch; retourne (modèle, backend)"""
+    if settings.INFERENCE_BACKEND == "onnx":
+        if not ONNX_AVAILABLE:
+            logger.warning("INFERENCE_BACKEND=onnx mais onnxruntime/optimum absents: repli sur PyTorch")
+        else:
+            try:
+                model, report = _load_quantized(model_class, name, drift_check, **kwargs)
+                if drift_passed(report):
+                    logger.info(f"{name}: backend ONNX int8 ({report})")
+                    return model, "onnx-int8"
+                logger.error(f"{name}: dérive int8 hors tolérance ({report}), repli sur PyTorch")
+            except Exception as e:
+                logger.error(f"{name}: échec du backend ONNX ({e}), repli sur PyTorch")
+    return model_class(name, device="cpu", **kwargs), "torch"
+
+
+# Types de modèles chargeables: classe et contrôle de dérive associé
+LOADERS = {
+    "sentence_transformer": (SentenceTransformer, embedding_drift),
+    "cross_encoder": (CrossEncoder, score_drift),
+}
+
+
+def load_local(kind: str, name: str, **kwargs) -> Tuple[object, str]:
+    """Chargement dans le processus courant (workers sans serveur d'inférence, serveur lui-même)"""
+    model_class, drift_check = LOADERS[kind]
+    return _load(model_class, name, drift_check, **kwargs)
+
+
+def _load_shared(kind: str, name: str, **kwargs) -> Tuple[object, str]:
+    """Modèle du serveur d'inférence partagé par les workers si activé, local sinon"""
+    if settings.INFERENCE_SERVER_ENABLED:
+        from app.core.inference_server import remote_model
+        return remote_model(kind, name, kwargs)
+    return load_local(kind, name, **kwargs)
+
+
+def load_sentence_transformer(name: str, **kwargs) -> Tuple[SentenceTransformer, str]:
+    return _load_shared("sentence_transformer", name, **kwargs)
+
+
+def load_cross_encoder(name: str, **kwargs) -> Tuple[CrossEncoder, str]:
+    return _load_shared("cross_encoder", name, **kwargs)
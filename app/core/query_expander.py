@@ -0,0 +1,145 @@
+import re
+import threading
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.text_analyzer import FRENCH_STOPWORDS, fold_accents
+from app.utils.logging import logger
+
+_WORD_RE = re.compile(r"[^\W\d_]{4,}")
+
+
+# Expansion locale des requêtes (sans appel LLM)
+class LocalQueryExpander:
+    """Variantes construites à partir des tables de synonymes du domaine et des termes
+    du vocabulaire indexé les plus proches de la question dans l'espace d'embeddings.
+
+    Retourne au plus 3 requêtes (originale comprise), comme `QueryEnhancer`.
+    """
+
+    def __init__(self, synonyms: Dict[str, List[str]], neighbours: int = None, min_similarity: float = None):
+        self.neighbours = settings.QUERY_EXPANSION_NEIGHBOURS if neighbours is None else neighbours
+        self.min_similarity = settings.QUERY_EXPANSION_MIN_SIMILARITY if min_similarity is None else min_similarity
+
+        # Expression (sans accents) -> alternatives, terme canonique en premier
+        self.alternatives: Dict[str, List[str]] = {}
+        for canonical, variants in synonyms.items():
+            group = [canonical] + list(variants)
+            for phrase in group:
+                alternatives = self.alternatives.setdefault(fold_accents(phrase.lower()), [])
+                for other in group:
+                    if fold_accents(other.lower()) != fold_accents(phrase.lower()) and other not in alternatives:
+                        alternatives.append(other)
+
+        # Une seule regex, expressions les plus longues d'abord (correspondance la plus longue)
+        forms = set()
+        for canonical, variants in synonyms.items():
+            for phrase in [canonical, *variants]:
+                forms.update((phrase.lower(), fold_accents(phrase.lower())))
+        pattern = "|".join(re.escape(form) for form in sorted(forms, key=len, reverse=True))
+        self._phrase_re = re.compile(rf"(?<!\w)(?:{pattern})(?!\w)") if pattern else None
+
+        # Vocabulaire indexé: mots de surface et embeddings normalisés
+        self.vocabulary: List[str] = []
+        self.vocabulary_vectors: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        # Fréquences des mots du corpus et embeddings des mots du top-N, tenus à jour par document
+        self._counts: Counter = Counter()
+        self._word_vectors: Dict[str, np.ndarray] = {}
+        self._update_lock = threading.Lock()
+
+    @staticmethod
+    def _words(contents: Iterable[Optional[str]]) -> Counter:
+        counts = Counter()
+        for content in contents:
+            if content:
+                counts.update(word for word in _WORD_RE.findall(content.lower())
+                              if fold_accents(word) not in FRENCH_STOPWORDS)
+        return counts
+
+    def _refresh(self, embed: Callable[[List[str]], List[np.ndarray]], size: int):
+        """Top-N courant; seuls les mots entrés dans le top-N sont embarqués"""
+        words = [word for word, _ in self._counts.most_common(size)]
+        new_words = [word for word in words if word not in self._word_vectors]
+        if new_words:
+            vectors = np.asarray(embed(new_words), dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors /= np.where(norms > 0, norms, 1.0)
+            self._word_vectors.update(zip(new_words, vectors))
+        self._word_vectors = {word: self._word_vectors[word] for word in words}
+        with self._lock:
+            self.vocabulary = words
+            self.vocabulary_vectors = np.stack([self._word_vectors[word] for word in words]) if words else None
+        return len(new_words)
+
+    def build_vocabulary(self, contents: Iterable[Optional[str]],
+                         embed: Callable[[List[str]], List[np.ndarray]], size: int = None):
+        """Comptage complet du corpus (démarrage) et embeddings des mots les plus fréquents"""
+        with self._update_lock:
+            self._counts = self._words(contents)
+            embedded = self._refresh(embed, size or settings.QUERY_EXPANSION_VOCAB_SIZE)
+        logger.info(f"Vocabulaire d'expansion construit: {len(self.vocabulary)} termes ({embedded} embarqués)")
+
+    def update_vocabulary(self, added: Iterable[Optional[str]], removed: Iterable[Optional[str]],
+                          embed: Callable[[List[str]], List[np.ndarray]], size: int = None):
+        """Mise à jour incrémentale: comptage des seuls chunks ajoutés ou retirés"""
+        with self._update_lock:
+            self._counts.update(self._words(added))
+            for word, count in self._words(removed).items():
+                remaining = self._counts[word] - count
+                if remaining > 0:
+                    self._counts[word] = remaining
+                else:
+                    self._counts.pop(word, None)
+            embedded = self._refresh(embed, size or settings.QUERY_EXPANSION_VOCAB_SIZE)
+        logger.debug(f"Vocabulaire d'expansion mis à jour: {len(self.vocabulary)} termes ({embedded} embarqués)")
+
+    def neighbour_terms(self, query_embedding: np.ndarray, exclude: Iterable[str] = ()) -> List[str]:
+        """Termes du corpus les plus proches de la question (au-dessus du seuil de similarité)"""
+        with self._lock:
+            words, vectors = self.vocabulary, self.vocabulary_vectors
+        if vectors is None or self.neighbours <= 0:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if query.shape[0] != vectors.shape[1]:
+            return []
+        norm = np.linalg.norm(query)
+        similarities = vectors @ (query / norm if norm else query)
+
+        excluded = {fold_accents(word.lower()) for word in exclude}
+        count = min(len(words), self.neighbours + len(excluded))
+        best = np.argpartition(-similarities, count - 1)[:count]
+        terms = []
+        for index in best[np.argsort(-similarities[best])]:
+            if similarities[index] < self.min_similarity or len(terms) >= self.neighbours:
+                break
+            if fold_accents(words[index]) not in excluded:
+                terms.append(words[index])
+        return terms
+
+    def expand(self, query: str, query_embedding: Optional[np.ndarray] = None) -> List[str]:
+        """Requête originale, substitution des synonymes, puis requête enrichie (synonymes et voisins)"""
+        lowered = query.lower()
+        matches = list(self._phrase_re.finditer(lowered)) if self._phrase_re else []
+
+        substituted, added = lowered, []
+        for match in reversed(matches):
+            alternatives = self.alternatives.get(fold_accents(match.group()), [])
+            if not alternatives:
+                continue
+            substituted = substituted[:match.start()] + alternatives[0] + substituted[match.end():]
+            added.extend(alternative for alternative in alternatives[:2] if alternative not in lowered)
+
+        query_words = _WORD_RE.findall(lowered)
+        if query_embedding is not None:
+            added.extend(self.neighbour_terms(query_embedding, exclude=query_words + added))
+
+        variants = [query]
+        if substituted != lowered:
+            variants.append(substituted)
+        if added:
+            variants.append(f"{query} {' '.join(dict.fromkeys(added))}")
+        return variants[:3]
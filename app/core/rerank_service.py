@@ -0,0 +1,137 @@
+import asyncio
+import concurrent.futures
+import queue
+import threading
+import time
+from typing import Callable, List, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import metrics_collector
+from app.utils.logging import logger
+
+
+# Scoring cross-encoder par micro-batches, hors de l'event loop
+class RerankService:
+    """Les paires (requête, passage) des requêtes concurrentes sont regroupées en
+    micro-batches (taille maximale, attente maximale en ms) et évaluées par un thread
+    dédié: une seule passe du modèle sert plusieurs utilisateurs et l'event loop
+    reste disponible pendant l'inférence."""
+
+    def __init__(self, predict: Callable[[List[Tuple[str, str]]], Sequence[float]],
+                 max_batch_pairs: int = None, max_wait_ms: float = None, name: str = "rerank"):
+        self.predict = predict
+        self.max_batch_pairs = max_batch_pairs or settings.RERANK_BATCH_MAX_PAIRS
+        self.max_wait = (settings.RERANK_BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000
+        self.name = name
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.pairs = 0
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name=f"{self.name}-batcher", daemon=True)
+                    self._thread.start()
+
+    async def score(self, pairs: List[Tuple[str, str]]) -> np.ndarray:
+        """Scores des paires, calculés dans le prochain micro-batch"""
+        if not pairs:
+            return np.zeros(0, dtype=np.float32)
+        self._ensure_worker()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.put((pairs, future, loop))
+        return await future
+
+    def score_sync(self, pairs: List) -> np.ndarray:
+        """Version bloquante de score (threads de connexion du serveur d'inférence)"""
+        if not pairs:
+            return np.zeros(0, dtype=np.float32)
+        self._ensure_worker()
+        future = concurrent.futures.Future()
+        self._queue.put((pairs, future, None))
+        return future.result()
+
+    def _collect(self, first) -> list:
+        """Premier élément puis ceux arrivés avant la fin de l'attente ou le remplissage du batch"""
+        batch = [first]
+        size = len(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_pairs:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            # Les requêtes annulées entre-temps ne sont pas évaluées
+            batch = [item for item in batch if not item[1].cancelled()]
+            if not batch:
+                continue
+
+            all_pairs = [pair for pairs, _, _ in batch for pair in pairs]
+            start = time.monotonic()
+            try:
+                scores = np.asarray(self.predict(all_pairs), dtype=np.float32)
+                error = None
+            except Exception as e:
+                logger.error(f"Erreur micro-batch {self.name}: {e}")
+                scores, error = None, e
+
+            self.requests += len(batch)
+            self.batches += 1
+            self.pairs += len(all_pairs)
+            metrics_collector.record_histogram(f"{self.name}_batch_pairs", len(all_pairs))
+            metrics_collector.record_timer(f"{self.name}_batch_inference", time.monotonic() - start)
+
+            offset = 0
+            for pairs, future, loop in batch:
+                args = (future, scores[offset:offset + len(pairs)], None) if error is None else (future, None, error)
+                if loop is None:
+                    self._resolve(*args)
+                else:
+                    loop.call_soon_threadsafe(self._resolve, *args)
+                offset += len(pairs)
+
+    @staticmethod
+    def _resolve(future, scores, error):
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(scores)
+
+    def stop(self):
+        """Arrêt du thread après les batches en attente"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "pairs": self.pairs,
+            "avg_pairs_per_batch": round(self.pairs / self.batches, 2) if self.batches else 0.0,
+            "avg_requests_per_batch": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
@@ -1,8 +1,15 @@
-from sentence_transformers import CrossEncoder
-from typing import List
+from typing import List, Optional, Tuple
 from dataclasses import dataclass
+import asyncio
+import hashlib
 
-from app.core.cache import cache
+import numpy as np
+
+from app.core.cache import cache, document_tags, normalize_question
+from app.core.config import settings
+from app.core.metrics import metrics_collector
+from app.core.onnx_backend import load_cross_encoder
+from app.core.rerank_service import RerankService
 from app.utils.logging import logger
 
 
@@ -12,66 +19,190 @@ class RankedResult:
     score: float
     metadata: dict
     original_rank: int
+    # Étage ayant produit le score: "cross_encoder" (L-12), "dense", "middle" ou "retrieval" (repli).
+    # Les échelles diffèrent: seuls des résultats d'un même étage sont comparables.
+    stage: str = "cross_encoder"
+
+
+def ambiguous_head(scores: np.ndarray, top_k: int, margin: float, max_head: int) -> Optional[np.ndarray]:
+    """Indices (score décroissant) à départager par l'étage suivant de la cascade.
+
+    None si l'écart entre le k-ième et le (k+1)-ième score atteint `margin`: le top-k
+    est déjà séparé du reste et l'étage suivant est inutile.
+    """
+    order = np.argsort(-scores, kind="stable")
+    if len(order) <= top_k or scores[order[top_k - 1]] - scores[order[top_k]] >= margin:
+        return None
+    # Tête ambiguë: tous les candidats à moins de `margin` du k-ième (au moins k+1)
+    size = int(np.sum(scores >= scores[order[top_k - 1]] - margin))
+    return order[:min(size, max(max_head, top_k + 1))]
 
 
 # Re-ranking avancé
 class AdvancedReranker:
     def __init__(self):
         # Modèle de re-ranking haute performance
-        self.reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-12-v2')
+        self.reranker, self.backend = load_cross_encoder('cross-encoder/ms-marco-MiniLM-L-12-v2')
         self.rerank_cache = {}
+        # Cascade: cosinus de la recherche dense puis cross-encoder léger optionnel
+        self.middle_model = (
+            load_cross_encoder(settings.RERANK_CASCADE_MIDDLE_MODEL)[0] if settings.RERANK_CASCADE_MIDDLE_MODEL else None
+        )
+        # Micro-batching des requêtes concurrentes sur un thread dédié (API asynchrone)
+        self.service = RerankService(
+            lambda pairs: self.reranker.predict(pairs, batch_size=settings.RERANK_BATCH_MAX_PAIRS)
+        )
+
+    def warmup(self):
+        """Passe à blanc des modèles, hors cache de scores (coût du démarrage à froid payé au lancement)"""
+        for model in (self.reranker, self.middle_model):
+            if model is not None:
+                model.predict([("test", "test content")])
+
+    @staticmethod
+    def _pair_keys(query: str, results: List) -> List[str]:
+        """Clés du cache de scores: (question normalisée, chunk id ou empreinte du contenu)"""
+        normalized = normalize_question(query)
+        return [
+            f"{normalized}\x1f{getattr(result, 'chunk_id', None) or hashlib.md5(result.content.encode()).hexdigest()}"
+            for result in results
+        ]
+
+    def _cached_scores(self, query: str, results: List) -> Tuple[List[str], List[Optional[float]], List[int]]:
+        """Scores déjà calculés et indices des paires à évaluer"""
+        keys = self._pair_keys(query, results)
+        if self.backend != "torch":
+            # Scores int8 distincts des scores fp32 (changement de backend sans purge du cache)
+            keys = [f"{self.backend}\x1f{key}" for key in keys]
+        scores = cache.get_many(keys, "rerank")
+        missing = [i for i, score in enumerate(scores) if score is None]
+        metrics_collector.increment_counter("rerank_pairs_cached", len(results) - len(missing))
+        metrics_collector.increment_counter("rerank_pairs_scored", len(missing))
+        return keys, scores, missing
+
+    @staticmethod
+    def _store_scores(keys: List[str], results: List, scores: List[Optional[float]],
+                      missing: List[int], new_scores):
+        """Mise en cache des nouveaux scores, liés au document du chunk (invalidés à sa ré-ingestion)"""
+        for i, score in zip(missing, new_scores):
+            scores[i] = float(score)
+        cache.set_many(
+            [keys[i] for i in missing], [scores[i] for i in missing],
+            ttl=settings.RERANK_SCORE_CACHE_TTL, cache_type="rerank",
+            tags=[document_tags([results[i].metadata]) for i in missing]
+        )
+
+    @staticmethod
+    def _dense_scores(results: List, top_k: int) -> Optional[np.ndarray]:
+        """Cosinus question/chunk déjà calculés par la recherche dense (aucun ré-encodage).
+
+        Les hits BM25 seuls n'ont pas de cosinus: placés à la frontière du top-k, ils
+        empêchent la sortie anticipée et sont départagés par l'étage suivant.
+        """
+        scores = np.array([np.nan if getattr(result, "dense_score", None) is None else result.dense_score
+                           for result in results], dtype=np.float64)
+        present = ~np.isnan(scores)
+        if not present.any():
+            return None
+        ranked = np.sort(scores[present])[::-1]
+        scores[~present] = ranked[min(top_k, len(ranked)) - 1]
+        return scores
+
+    def _cascade(self, query: str, results: List, top_k: int) -> Tuple[List, Optional[List[RankedResult]]]:
+        """Étages peu coûteux: candidats laissés au modèle L-12, ou classement final en cas de sortie anticipée"""
+        dense = self._dense_scores(results, top_k)
+        if dense is not None:
+            head = ambiguous_head(dense, top_k, settings.RERANK_CASCADE_MARGIN, settings.RERANK_CASCADE_MAX_HEAD)
+            if head is None:
+                metrics_collector.increment_counter("rerank_cascade_exits", labels={"stage": "dense"})
+                return results, self._combine(results, dense, "dense")[:top_k]
+            results = [results[i] for i in head]
 
-    def rerank(self, query: str, results: List, top_k: int = 5) -> List[RankedResult]:
-        """Re-ranking des résultats avec cross-encoder"""
+        if self.middle_model is not None:
+            middle = np.asarray(self.middle_model.predict([(query, result.content) for result in results]))
+            head = ambiguous_head(middle, top_k, settings.RERANK_CASCADE_MIDDLE_MARGIN, settings.RERANK_CASCADE_MAX_HEAD)
+            if head is None:
+                metrics_collector.increment_counter("rerank_cascade_exits", labels={"stage": "middle"})
+                return results, self._combine(results, middle, "middle")[:top_k]
+            results = [results[i] for i in head]
+        return results, None
+
+    @property
+    def _cascade_enabled(self) -> bool:
+        return settings.ENABLE_RERANK_CASCADE
+
+    @staticmethod
+    def _combine(results: List, cross_scores, stage: str = "cross_encoder") -> List[RankedResult]:
+        """Score final: pondération retrieval (30%) + cross-encoder (70%), trié"""
+        final_results = [
+            RankedResult(
+                content=result.content,
+                score=0.3 * result.score + 0.7 * cross_score,
+                metadata=result.metadata,
+                original_rank=i,
+                stage=stage
+            )
+            for i, (result, cross_score) in enumerate(zip(results, cross_scores))
+        ]
+        return sorted(final_results, key=lambda x: x.score, reverse=True)
+
+    @staticmethod
+    def _fallback(results: List, top_k: int) -> List[RankedResult]:
+        """Résultats originaux (scores de recherche) si le cross-encoder échoue"""
+        fallback_results = [
+            RankedResult(
+                content=result.content,
+                score=result.score,
+                metadata=result.metadata,
+                original_rank=i,
+                stage="retrieval"
+            )
+            for i, result in enumerate(results)
+        ]
+        return sorted(fallback_results, key=lambda x: x.score, reverse=True)[:top_k]
+
+    def rerank(self, query: str, results: List, top_k: int = 5, cascade: bool = True) -> List[RankedResult]:
+        """Re-ranking des résultats avec cross-encoder (seules les paires jamais évaluées passent par le modèle)"""
         if not results:
             return []
 
-        # Vérification du cache
-        cache_key = f"{query}_{len(results)}_{hash(tuple(r.content[:50] for r in results))}"
-        cached = cache.get(cache_key, "rerank")
-        if cached:
-            return cached[:top_k]
-
         try:
-            # Préparation des paires query-document
-            pairs = [(query, result.content) for result in results]
-
-            # Scoring avec cross-encoder
-            cross_scores = self.reranker.predict(pairs)
+            if cascade and self._cascade_enabled and len(results) > 1:
+                results, ranked_results = self._cascade(query, results, top_k)
+                if ranked_results is not None:
+                    return ranked_results
 
-            # Combinaison des scores (retrieval + reranking)
-            final_results = []
-            for i, (result, cross_score) in enumerate(zip(results, cross_scores)):
-                # Score final: pondération retrieval (30%) + cross-encoder (70%)
-                final_score = 0.3 * result.score + 0.7 * cross_score
+            keys, scores, missing = self._cached_scores(query, results)
+            if missing:
+                new_scores = self.reranker.predict([(query, results[i].content) for i in missing])
+                self._store_scores(keys, results, scores, missing, new_scores)
+            return self._combine(results, scores)[:top_k]
 
-                final_results.append(RankedResult(
-                    content=result.content,
-                    score=final_score,
-                    metadata=result.metadata,
-                    original_rank=i
-                ))
+        except Exception as e:
+            logger.error(f"Erreur re-ranking: {e}")
+            return self._fallback(results, top_k)
 
-            # Tri par score final
-            ranked_results = sorted(final_results, key=lambda x: x.score, reverse=True)
+    async def arerank(self, query: str, results: List, top_k: int = 5, cascade: bool = True) -> List[RankedResult]:
+        """Re-ranking asynchrone: paires évaluées dans un micro-batch partagé avec les autres requêtes"""
+        loop = asyncio.get_running_loop()
+        if not settings.ENABLE_RERANK_BATCHING:
+            return await loop.run_in_executor(None, self.rerank, query, results, top_k, cascade)
+        if not results:
+            return []
 
-            # Cache du résultat
-            cache.set(cache_key, ranked_results, ttl=1800, cache_type="rerank")
+        try:
+            if cascade and self._cascade_enabled and len(results) > 1:
+                results, ranked_results = await loop.run_in_executor(None, self._cascade, query, results, top_k)
+                if ranked_results is not None:
+                    return ranked_results
 
-            return ranked_results[:top_k]
+            # Lecture et écriture du cache de scores (Redis, bloquantes) hors de l'event loop
+            keys, scores, missing = await loop.run_in_executor(None, self._cached_scores, query, results)
+            if missing:
+                new_scores = await self.service.score([(query, results[i].content) for i in missing])
+                await loop.run_in_executor(None, self._store_scores, keys, results, scores, missing, new_scores)
+            return self._combine(results, scores)[:top_k]
 
         except Exception as e:
-            # Import local pour éviter les problèmes de portée
-            from app.utils.logging import logger
             logger.error(f"Erreur re-ranking: {e}")
-            # Fallback: retour des résultats originaux
-            fallback_results = [
-                RankedResult(
-                    content=result.content,
-                    score=result.score,
-                    metadata=result.metadata,
-                    original_rank=i
-                )
-                for i, result in enumerate(results)
-            ]
-            return sorted(fallback_results, key=lambda x: x.score, reverse=True)[:top_k]
+            return self._fallback(results, top_k)
@@ -1,9 +1,17 @@
-import numpy as np
-from rank_bm25 import BM25Okapi
 from typing import List, Optional
+import asyncio
 import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import metrics_collector
+from app.core.sparse_index import SparseIndex, chunks_checksum
+from app.core.text_analyzer import get_analyzer
 from app.utils.logging import logger
 
 
@@ -13,6 +21,8 @@ class SearchResult:
     score: float
     metadata: dict
     source_type: str  # "dense", "sparse", "hybrid"
+    chunk_id: Optional[str] = None
+    dense_score: Optional[float] = None  # Cosinus question/chunk de la branche dense (None: hit BM25 seul)
 
 
 # Recherche hybride Dense + Sparse
@@ -20,105 +30,315 @@ class HybridSearch:
     def __init__(self, chroma_db, embeddings_model):
         self.chroma_db = chroma_db
         self.embeddings = embeddings_model
-        self.bm25_index = None
-        self.documents = []
-        self.document_ids = []
-        self._build_bm25_index()
+        # Analyseur partagé entre reconstructions (son cache évite de re-tokeniser les chunks)
+        self.analyzer = get_analyzer()
+        self.sparse_index = SparseIndex(analyzer=self.analyzer)
+        self.index_path = settings.SPARSE_INDEX_PATH if settings.SPARSE_INDEX_PERSIST else None
+
+        # Chargement paresseux de l'index sparse (au premier usage ou au préchargement)
+        self._index_ready = threading.Event()
+        self._index_lock = threading.Lock()
+        self._persisted_version = None
+        self._persisted_compactions = 0
+
+        # Pool borné pour les branches dense/sparse (bloquantes) hors de l'event loop
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.SEARCH_MAX_WORKERS,
+            thread_name_prefix="hybrid-search"
+        )
+
+    def ensure_sparse_index(self):
+        """Charge l'index BM25 persisté s'il correspond à la collection, sinon le reconstruit"""
+        if self._index_ready.is_set():
+            return
+        with self._index_lock:
+            if self._index_ready.is_set():
+                return
+            try:
+                if not self._load_persisted_index():
+                    self._build_bm25_index()
+            finally:
+                self._index_ready.set()
+
+    def _collection_checksum(self) -> str:
+        """Empreinte de la collection ChromaDB (ids et textes des chunks, sans les embeddings)"""
+        results = self.chroma_db.get(include=["documents"])
+        return chunks_checksum(results["ids"], results["documents"])
+
+    def _load_persisted_index(self) -> bool:
+        if not self.index_path:
+            return False
+        try:
+            manifest = SparseIndex.read_manifest(self.index_path, self.analyzer)
+            if manifest is None:
+                return False
+            if manifest["checksum"] != self._collection_checksum():
+                logger.info("Index BM25 persisté obsolète (checksum différent), reconstruction")
+                return False
+            index = SparseIndex.load(self.index_path, manifest, self.analyzer)
+            if index is None:
+                return False
+            self.sparse_index = index
+            self._persisted_version = index.version
+            self._persisted_compactions = index.compactions
+            return True
+        except Exception as e:
+            logger.error(f"Erreur chargement index BM25 persisté: {e}")
+            return False
 
     def _build_bm25_index(self):
-        """Construction de l'index BM25"""
+        """Construction complète de l'index BM25 depuis ChromaDB"""
         try:
             # Récupération de tous les documents
-            results = self.chroma_db.get()
+            results = self.chroma_db.get(include=["documents", "metadatas"])
+            index = SparseIndex(analyzer=self.analyzer)
             if results and results.get("documents"):
-                self.documents = results["documents"]
-                self.document_ids = results["ids"]
+                index.add_many(
+                    results["ids"],
+                    results["documents"],
+                    results.get("metadatas") or None
+                )
 
-                # Tokenisation pour BM25
-                tokenized_docs = [doc.lower().split() for doc in self.documents]
-                self.bm25_index = BM25Okapi(tokenized_docs)
-
-                logger.info(f"Index BM25 construit avec {len(self.documents)} documents")
+                logger.info(f"Index BM25 construit avec {len(index)} documents")
+            self.sparse_index = index
+            self.persist_sparse_index(force=True)
         except Exception as e:
             logger.error(f"Erreur construction index BM25: {e}")
 
     def rebuild_index(self):
-        """Reconstruction de l'index BM25"""
-        self._build_bm25_index()
+        """Reconstruction complète de l'index BM25"""
+        with self._index_lock:
+            self._build_bm25_index()
+            self._index_ready.set()
+
+    def persist_sparse_index(self, force: bool = False):
+        """Persistance de l'index BM25 s'il a changé depuis la dernière écriture"""
+        if not self.index_path or (not self._index_ready.is_set() and not force):
+            return
+        index = self.sparse_index
+        if not force and index.version == self._persisted_version:
+            return
+        try:
+            index.save(self.index_path)
+            self._persisted_version = index.version
+            self._persisted_compactions = index.compactions
+        except Exception as e:
+            logger.error(f"Erreur persistance index BM25: {e}")
+
+    def _persist_after_compaction(self):
+        """Réécriture de l'index après compaction (le delta seul est rattrapé à l'arrêt)"""
+        if self.sparse_index.compactions != self._persisted_compactions:
+            self.persist_sparse_index(force=True)
+
+    def add_chunks(self, ids: List[str], documents: List[str], metadatas: Optional[List[dict]] = None):
+        """Ajout incrémental de chunks à l'index BM25"""
+        self.ensure_sparse_index()
+        self.sparse_index.add_many(ids, documents, metadatas)
+        logger.info(f"Index BM25 mis à jour: +{len(ids)} chunks ({len(self.sparse_index)} au total)")
+        self._persist_after_compaction()
+
+    def sparse_index_document_contents(self, document_id: str) -> List[str]:
+        """Contenus indexés d'un document (avant son remplacement ou sa suppression)"""
+        self.ensure_sparse_index()
+        return self.sparse_index.document_contents(document_id)
+
+    def remove_document(self, document_id: str) -> int:
+        """Suppression incrémentale des chunks d'un document de l'index BM25"""
+        self.ensure_sparse_index()
+        removed = self.sparse_index.remove_document(document_id)
+        if removed:
+            logger.info(f"Index BM25 mis à jour: -{removed} chunks du document {document_id}")
+            self._persist_after_compaction()
+        return removed
 
     async def search(self, query: str, n_results: int = None, alpha: float = None) -> List[SearchResult]:
+        """Recherche hybride avec pondération dense/sparse"""
+        return (await self.search_many([query], n_results=n_results, alpha=alpha))[0]
+
+    async def search_many(self, queries: List[str], n_results: int = None,
+                          alpha: float = None) -> List[List[SearchResult]]:
+        """Recherche hybride de plusieurs variantes en une passe.
+
+        Un seul batch d'embeddings, une seule requête ChromaDB multi-vecteurs et
+        un seul scoring BM25 vectorisé pour toutes les variantes. Les branches
+        dense et sparse (bloquantes) tournent en parallèle dans le pool de threads.
+        """
         # Utiliser les paramètres de configuration par défaut si non spécifiés
-        from app.core.config import settings
         if n_results is None:
             n_results = settings.SEARCH_TOP_K
         if alpha is None:
             alpha = settings.SEARCH_ALPHA
-        """Recherche hybride avec pondération dense/sparse"""
-        results = []
+        if not queries:
+            return []
+
+        start_time = time.time()
+        loop = asyncio.get_running_loop()
+        dense_results, sparse_results = await asyncio.gather(
+            loop.run_in_executor(self.executor, self._dense_search_many, queries, n_results),
+            loop.run_in_executor(self.executor, self._sparse_search_many, queries, n_results)
+        )
+
+        # 3. Fusion des deux branches (clé: chunk id)
+        final_results = [
+            self._fuse(dense, sparse, n_results, alpha)
+            for dense, sparse in zip(dense_results, sparse_results)
+        ]
+        metrics_collector.record_search_performance(
+            "hybrid", time.time() - start_time, sum(len(results) for results in final_results)
+        )
+        return final_results
+
+    def _dense_search_many(self, queries: List[str], n_results: int) -> List[List[SearchResult]]:
+        """Branche dense (embeddings + ChromaDB), exécutée dans le pool de threads.
+
+        Les scores retournés sont bruts (similarité 1/(1+distance)), la pondération
+        est appliquée par la fusion.
+        """
+        start_time = time.time()
+        results = [[] for _ in queries]
 
         # 1. Recherche dense (vectorielle) avec paramètres optimisés
         try:
             dense_top_k = min(settings.SEARCH_DENSE_TOP_K, n_results)
+            query_embeddings = self.embeddings.embed_queries(queries)
             dense_results = self.chroma_db.query(
-                query_texts=[query],
+                query_embeddings=[np.asarray(embedding).tolist() for embedding in query_embeddings],
                 n_results=min(dense_top_k * 2, 20)
             )
 
-            if dense_results and dense_results.get("documents") and dense_results["documents"][0]:
-                for i, (doc, distance) in enumerate(zip(
-                        dense_results["documents"][0],
-                        dense_results["distances"][0]
+            if dense_results and dense_results.get("documents"):
+                for q, (ids, docs, distances) in enumerate(zip(
+                        dense_results["ids"],
+                        dense_results["documents"],
+                        dense_results["distances"]
                 )):
-                    # Conversion distance en score
-                    dense_score = 1 / (1 + distance)
-
-                    metadata = dense_results["metadatas"][0][i] if dense_results.get("metadatas") else {}
-
-                    results.append(SearchResult(
-                        content=doc,
-                        score=dense_score * alpha,
-                        metadata=metadata,
-                        source_type="dense"
-                    ))
+                    metadatas = dense_results["metadatas"][q] if dense_results.get("metadatas") else None
+                    for i, (chunk_id, doc, distance) in enumerate(zip(ids, docs, distances)):
+                        results[q].append(SearchResult(
+                            content=doc,
+                            score=1 / (1 + distance),
+                            metadata=metadatas[i] if metadatas else {},
+                            source_type="dense",
+                            chunk_id=chunk_id,
+                            dense_score=1 - distance  # Collection en espace cosinus
+                        ))
         except Exception as e:
             logger.error(f"Erreur recherche dense: {e}")
 
+        metrics_collector.record_search_performance(
+            "dense", time.time() - start_time, sum(len(variant) for variant in results)
+        )
+        return results
+
+    def _sparse_search_many(self, queries: List[str], n_results: int) -> List[List[SearchResult]]:
+        """Branche sparse (BM25), exécutée dans le pool de threads (scores BM25 bruts)"""
+        start_time = time.time()
+        results = [[] for _ in queries]
+
         # 2. Recherche sparse (BM25)
-        if self.bm25_index and self.documents:
+        self.ensure_sparse_index()
+        if len(self.sparse_index):
             try:
-                query_tokens = query.lower().split()
-                bm25_scores = self.bm25_index.get_scores(query_tokens)
-
                 # Top résultats BM25 avec paramètres optimisés
                 sparse_top_k = min(settings.SEARCH_SPARSE_TOP_K, n_results)
-                top_indices = np.argsort(bm25_scores)[::-1][:sparse_top_k]
-
-                for idx in top_indices:
-                    if bm25_scores[idx] > 0:
-                        sparse_score = bm25_scores[idx] * (1 - alpha)
-
-                        results.append(SearchResult(
-                            content=self.documents[idx],
-                            score=sparse_score,
-                            metadata={"document_id": self.document_ids[idx] if idx < len(
-                                self.document_ids) else f"doc_{idx}"},
-                            source_type="sparse"
-                        ))
+                top_hits = self.sparse_index.search_many(queries, sparse_top_k)
+
+                for q, hits in enumerate(top_hits):
+                    for chunk_id, content, metadata, bm25_score in hits:
+                        if bm25_score > 0:
+                            results[q].append(SearchResult(
+                                content=content,
+                                score=bm25_score,
+                                metadata=metadata or {"document_id": chunk_id},
+                                source_type="sparse",
+                                chunk_id=chunk_id
+                            ))
             except Exception as e:
                 logger.error(f"Erreur recherche BM25: {e}")
 
-        # 3. Combinaison et déduplication
-        return self._combine_and_deduplicate(results, n_results)
+        metrics_collector.record_search_performance(
+            "sparse", time.time() - start_time, sum(len(variant) for variant in results)
+        )
+        return results
 
-    def _combine_and_deduplicate(self, results: List[SearchResult], n_results: int) -> List[SearchResult]:
-        """Combinaison et déduplication des résultats"""
-        # Groupement par contenu similaire
-        unique_results = {}
-        for result in results:
-            content_hash = hashlib.md5(result.content.encode()).hexdigest()[:16]
-            if content_hash not in unique_results or result.score > unique_results[content_hash].score:
-                unique_results[content_hash] = result
+    @staticmethod
+    def _result_key(result: SearchResult) -> str:
+        """Clé de déduplication: chunk id, ou empreinte du contenu à défaut"""
+        return result.chunk_id or hashlib.md5(result.content.encode()).hexdigest()[:16]
+
+    def _fuse(self, dense: List[SearchResult], sparse: List[SearchResult], n_results: int,
+              alpha: float, strategy: str = None) -> List[SearchResult]:
+        """Fusion des branches dense et sparse selon la stratégie configurée.
+
+        - "rrf": reciprocal rank fusion pondérée, alpha/(k+rang_dense) + (1-alpha)/(k+rang_sparse)
+        - "linear": scores normalisés min-max par branche, alpha*dense + (1-alpha)*sparse
+        - "legacy": scores bruts pondérés, meilleur score retenu (ancien comportement)
+        """
+        strategy = strategy or settings.SEARCH_FUSION
+        weights = {"dense": alpha, "sparse": 1 - alpha}
+        fused = {}
+
+        for source_type, branch in (("dense", dense), ("sparse", sparse)):
+            if strategy == "rrf":
+                branch_scores = [1 / (settings.SEARCH_RRF_K + rank) for rank in range(1, len(branch) + 1)]
+            elif strategy == "linear":
+                raw = [result.score for result in branch]
+                low, high = (min(raw), max(raw)) if raw else (0.0, 0.0)
+                branch_scores = [(score - low) / (high - low) if high > low else 1.0 for score in raw]
+            else:
+                branch_scores = [result.score for result in branch]
+
+            for result, branch_score in zip(branch, branch_scores):
+                weighted = weights[source_type] * branch_score
+                key = self._result_key(result)
+                current = fused.get(key)
+                if current is None:
+                    fused[key] = SearchResult(
+                        content=result.content,
+                        score=weighted,
+                        metadata=result.metadata,
+                        source_type=source_type,
+                        chunk_id=result.chunk_id,
+                        dense_score=result.dense_score
+                    )
+                    continue
+                if current.dense_score is None:
+                    current.dense_score = result.dense_score
+                if strategy == "legacy":
+                    if weighted > current.score:
+                        current.score = weighted
+                        current.source_type = source_type
+                else:
+                    if current.source_type != source_type:
+                        current.source_type = "hybrid"
+                    current.score += weighted
 
         # Tri par score et limitation
-        final_results = sorted(unique_results.values(), key=lambda x: x.score, reverse=True)
+        final_results = sorted(fused.values(), key=lambda x: x.score, reverse=True)
         return final_results[:n_results]
+
+    @staticmethod
+    def retrieval_confidence(results: List[SearchResult], top_n: int = 3) -> float:
+        """Confiance d'une recherche: part des premiers résultats trouvés par les deux branches"""
+        if not results:
+            return 0.0
+        if settings.SEARCH_FUSION == "legacy":
+            # La fusion legacy ne conserve pas l'accord dense/sparse: confiance inconnue, donc faible
+            return 0.0
+        top = results[:top_n]
+        return sum(result.source_type == "hybrid" for result in top) / len(top)
+
+    def merge_variant_results(self, variant_results: List[List[SearchResult]]) -> List[SearchResult]:
+        """Déduplication entre variantes: un chunk n'est re-classé qu'une fois (meilleur score gardé)"""
+        unique_results = {}
+        for results in variant_results:
+            for result in results:
+                key = self._result_key(result)
+                current = unique_results.get(key)
+                if current is None or result.score > current.score:
+                    unique_results[key] = result
+                # Meilleur cosinus obtenu par l'une des variantes
+                if current is not None and current.dense_score is not None:
+                    best = unique_results[key]
+                    best.dense_score = max(current.dense_score, best.dense_score or current.dense_score)
+        return sorted(unique_results.values(), key=lambda x: x.score, reverse=True)
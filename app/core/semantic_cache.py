@@ -0,0 +1,132 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import metrics_collector
+from app.utils.logging import logger
+
+
+# Partition du cache sémantique (un provider, un top_k)
+class _Partition:
+    """Tampon circulaire des embeddings de questions récentes (vecteurs normalisés).
+
+    La recherche est exacte (produit matrice-vecteur): sur quelques milliers de
+    questions récentes elle coûte moins d'une milliseconde, sans index ANN à maintenir.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.vectors: Optional[np.ndarray] = None
+        self.entries: List[Optional[dict]] = [None] * capacity
+        self.expires_at = np.zeros(capacity, dtype=np.float64)
+        self.next_slot = 0
+        self.count = 0
+
+    def add(self, vector: np.ndarray, entry: dict, expires_at: float):
+        if self.vectors is None:
+            self.vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+        slot = self.next_slot
+        self.vectors[slot] = vector
+        self.entries[slot] = entry
+        self.expires_at[slot] = expires_at
+        self.next_slot = (slot + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def drop_tagged(self, tags: frozenset) -> int:
+        dropped = 0
+        for slot in range(self.count):
+            entry = self.entries[slot]
+            if entry is not None and entry["tags"] & tags:
+                self.entries[slot] = None
+                self.expires_at[slot] = 0.0
+                dropped += 1
+        return dropped
+
+    def best_match(self, vector: np.ndarray, now: float):
+        if self.vectors is None or not self.count or vector.shape[0] != self.vectors.shape[1]:
+            return None, 0.0
+        similarities = self.vectors[:self.count] @ vector
+        similarities[self.expires_at[:self.count] <= now] = -1.0
+        slot = int(np.argmax(similarities))
+        return self.entries[slot], float(similarities[slot])
+
+
+# Cache sémantique des réponses complètes
+class SemanticAnswerCache:
+    """Réponses indexées par l'embedding de la question: une reformulation proche
+    (casse, ponctuation, paraphrase) réutilise la réponse au-delà du seuil de similarité."""
+
+    def __init__(self, threshold: float = None, ttl: int = None, max_entries: int = None):
+        self.threshold = settings.SEMANTIC_CACHE_THRESHOLD if threshold is None else threshold
+        self.ttl = ttl or settings.SEMANTIC_CACHE_TTL
+        self.max_entries = max_entries or settings.SEMANTIC_CACHE_MAX_ENTRIES
+        self._partitions: Dict[str, _Partition] = {}
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.saved_ms = 0.0
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding: np.ndarray, partition: str) -> Optional[Dict[str, Any]]:
+        """Réponse en cache la plus proche, ou None sous le seuil"""
+        vector = self._normalize(embedding)
+        with self._lock:
+            self.lookups += 1
+            store = self._partitions.get(partition)
+            if store is None:
+                return None
+            entry, similarity = store.best_match(vector, time.monotonic())
+            if entry is None or similarity < self.threshold:
+                return None
+            self.hits += 1
+            self.saved_ms += entry["response_time_ms"]
+
+        metrics_collector.increment_counter("semantic_cache_hits")
+        metrics_collector.record_histogram("semantic_cache_saved_ms", entry["response_time_ms"])
+        logger.info(f"Cache sémantique: '{entry['question'][:50]}' réutilisée (similarité {similarity:.3f})")
+        return {**entry, "similarity": similarity}
+
+    def store(self, embedding: np.ndarray, partition: str, question: str, response: Dict[str, Any],
+              tags: List[str] = None):
+        entry = {
+            "question": question,
+            "response": response,
+            "response_time_ms": response.get("response_time_ms", 0.0),
+            "tags": frozenset(tags or ()),
+        }
+        with self._lock:
+            store = self._partitions.get(partition)
+            if store is None:
+                store = self._partitions[partition] = _Partition(self.max_entries)
+            store.add(self._normalize(embedding), entry, time.monotonic() + self.ttl)
+
+    def invalidate(self, cache_types: Optional[List[str]] = None, tags: Optional[List[str]] = None):
+        """Invalidation ciblée (tags de documents) ou complète (réponses invalidées, nouvelle génération)"""
+        if tags:
+            with self._lock:
+                for store in self._partitions.values():
+                    store.drop_tagged(frozenset(tags))
+            return
+        if cache_types is not None and "full_response" not in cache_types:
+            return
+        with self._lock:
+            self._partitions.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": sum(store.count for store in self._partitions.values()),
+                "partitions": len(self._partitions),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "saved_latency_ms": round(self.saved_ms, 2),
+            }
@@ -0,0 +1,117 @@
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Tuple
+
+from app.core.metrics import metrics_collector
+
+
+# Regroupement des requêtes identiques en cours (single-flight)
+class SingleFlight:
+    """Les appels concurrents d'une même clé attendent le calcul du premier (leader)
+    au lieu de relancer enrichissement, recherche, reranking et génération."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Résultat du calcul de `key` et indicateur de partage (True pour un suiveur)"""
+        task = self._inflight.get(key)
+        shared = task is not None
+        if shared:
+            self.followers += 1
+            metrics_collector.increment_counter(f"{self.name}_single_flight_followers")
+        else:
+            self.leaders += 1
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        # shield: la déconnexion d'un client n'annule pas le calcul attendu par les autres
+        return await asyncio.shield(task), shared
+
+    def _forget(self, key: str, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._inflight), "leaders": self.leaders, "followers": self.followers}
+
+
+# Diffusion d'un flux d'événements à plusieurs abonnés
+class _Broadcast:
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self.error = None
+        self._changed = asyncio.Condition()
+
+    async def publish(self, event: Any):
+        async with self._changed:
+            self.events.append(event)
+            self._changed.notify_all()
+
+    async def close(self, error: Exception = None):
+        async with self._changed:
+            self.done = True
+            self.error = error
+            self._changed.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        """Rejoue les événements déjà publiés puis suit le flux jusqu'à sa fin"""
+        index = 0
+        while True:
+            async with self._changed:
+                while index >= len(self.events) and not self.done:
+                    await self._changed.wait()
+                pending = self.events[index:]
+                index += len(pending)
+                finished = self.done and index >= len(self.events)
+            for event in pending:
+                yield event
+            if finished:
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+# Single-flight pour les réponses en streaming
+class StreamFlight:
+    """Le premier appel d'une clé pompe le flux source dans une tâche dédiée; les
+    appels concurrents s'y attachent et reçoivent les mêmes tokens."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._active: Dict[str, _Broadcast] = {}
+        self._tasks = set()
+        self.leaders = 0
+        self.followers = 0
+
+    async def stream(self, key: str, factory: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        broadcast = self._active.get(key)
+        if broadcast is None:
+            self.leaders += 1
+            broadcast = self._active[key] = _Broadcast()
+            task = asyncio.ensure_future(self._pump(key, broadcast, factory))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            self.followers += 1
+            metrics_collector.increment_counter(f"{self.name}_stream_followers")
+
+        async for event in broadcast.subscribe():
+            yield event
+
+    async def _pump(self, key: str, broadcast: _Broadcast, factory: Callable[[], AsyncIterator[Any]]):
+        try:
+            async for event in factory():
+                await broadcast.publish(event)
+            await broadcast.close()
+        except Exception as e:
+            await broadcast.close(e)
+        finally:
+            if self._active.get(key) is broadcast:
+                del self._active[key]
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._active), "leaders": self.leaders, "followers": self.followers}
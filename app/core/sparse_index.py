@@ -0,0 +1,620 @@
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.text_analyzer import TextAnalyzer, get_analyzer
+from app.utils.logging import logger
+
+# Version du format sur disque (à incrémenter à chaque changement de structure)
+INDEX_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = "save.lock"
+
+
+def _grow(array: np.ndarray, size: int) -> np.ndarray:
+    """Agrandit un tableau numpy (capacité doublée) pour contenir `size` éléments"""
+    if size <= len(array):
+        return array
+    grown = np.zeros(max(size, 2 * len(array), 16), dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+def chunks_checksum(ids: Iterable[str], contents: Iterable[str]) -> str:
+    """Empreinte d'une collection: ids de chunks triés et empreinte du texte de chacun"""
+    chunks = sorted(zip(ids, contents))
+    digest = hashlib.md5(str(len(chunks)).encode())
+    for chunk_id, content in chunks:
+        digest.update(b"\0")
+        digest.update(chunk_id.encode())
+        # Ids déterministes: un document renvoyé avec autant de chunks ne diffère que par son texte
+        digest.update(hashlib.md5((content or "").encode()).digest())
+    return digest.hexdigest()
+
+
+# Colonne de chaînes sérialisée (blob UTF-8 + offsets), décodée à la demande
+class _StringColumn:
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray, decode: Callable[[str], Any] = None):
+        self.blob = blob
+        self.offsets = offsets
+        self.decode = decode
+        self._base_len = len(offsets) - 1
+        self._overrides: Dict[int, Any] = {}
+        self._appended: List[Any] = []
+
+    @property
+    def pristine(self) -> bool:
+        return not self._overrides and not self._appended
+
+    def __len__(self) -> int:
+        return self._base_len + len(self._appended)
+
+    def __getitem__(self, i: int) -> Any:
+        if i >= self._base_len:
+            return self._appended[i - self._base_len]
+        if i in self._overrides:
+            return self._overrides[i]
+        value = bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+        return self.decode(value) if self.decode else value
+
+    def __setitem__(self, i: int, value: Any):
+        if i >= self._base_len:
+            self._appended[i - self._base_len] = value
+        else:
+            self._overrides[i] = value
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def append(self, value: Any):
+        self._appended.append(value)
+
+
+def _encode_column(values, encode: Callable[[Any], str] = None) -> Tuple[np.ndarray, np.ndarray]:
+    if isinstance(values, _StringColumn) and values.pristine:
+        return values.blob, values.offsets
+    encoded = [(encode(value) if encode else value).encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(item) for item in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _encode_metadata(metadata: Optional[dict]) -> str:
+    return json.dumps(metadata or {}, ensure_ascii=False)
+
+
+# Index BM25 incrémental et vectorisé
+class SparseIndex:
+    """Index BM25 mis à jour par ajout/suppression de chunks.
+
+    Les postings sont stockés dans une matrice terme-document au format CSR
+    (segment de base, immuable) complétée par un petit segment delta pour
+    les ajouts récents. Les suppressions sont des tombstones, purgées lors
+    de la compaction qui fusionne le delta dans la base.
+
+    Le scoring reproduit exactement celui de ``rank_bm25.BM25Okapi``
+    (k1, b, plancher epsilon sur les idf négatifs) mais ne parcourt que les
+    postings des termes de la requête et sélectionne le top-k par
+    ``argpartition``.
+    """
+
+    # Compaction dès que le delta dépasse ce ratio du segment de base
+    COMPACT_DELTA_RATIO = 0.25
+    COMPACT_MIN_DELTA = 50_000
+    COMPACT_DEAD_RATIO = 0.25
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25,
+                 analyzer: Optional[TextAnalyzer] = None):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        # Analyseur partagé par l'indexation et les requêtes (sa version est persistée)
+        self.analyzer = analyzer or get_analyzer()
+
+        # Emplacements (slots) des chunks
+        self.chunk_ids: List[Optional[str]] = []
+        self.contents: List[Optional[str]] = []
+        self.metadatas: List[Optional[dict]] = []
+        self.slot_of: Dict[str, int] = {}
+        self.document_slots: Dict[str, set] = {}
+        self._doc_len = np.zeros(0, dtype=np.float64)
+        self._alive = np.zeros(0, dtype=bool)
+        self._n_alive = 0
+        self.total_len = 0
+
+        # Vocabulaire et fréquences documentaires (documents vivants)
+        self.vocab: Dict[str, int] = {}
+        self._df = np.zeros(0, dtype=np.int64)
+
+        # Segment de base CSR: terme -> (slots, tf) et son transposé slot -> (termes, tf)
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._post_slots = np.zeros(0, dtype=np.int32)
+        self._post_tfs = np.zeros(0, dtype=np.float32)
+        self._fwd_indptr = np.zeros(1, dtype=np.int64)
+        self._fwd_terms = np.zeros(0, dtype=np.int32)
+        self._fwd_tfs = np.zeros(0, dtype=np.float32)
+        self._n_base_slots = 0
+
+        # Segment delta: terme -> ([slots], [tf]) et slot -> {terme: tf}
+        self._delta_postings: Dict[int, Tuple[List[int], List[int]]] = {}
+        self._delta_slot_terms: Dict[int, Dict[int, int]] = {}
+        self._delta_nnz = 0
+        # Compteurs de modifications (servent à savoir quand persister)
+        self.compactions = 0
+        self.version = 0
+
+        # idf recalculés paresseusement après chaque mutation
+        self._idf = np.zeros(0, dtype=np.float64)
+        self._idf_dirty = True
+
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return self._n_alive
+
+    @property
+    def n_slots(self) -> int:
+        return len(self.chunk_ids)
+
+    def tokenize(self, text: str) -> List[str]:
+        return self.analyzer.analyze(text)
+
+    def _term_id(self, term: str) -> int:
+        term_id = self.vocab.get(term)
+        if term_id is None:
+            term_id = len(self.vocab)
+            self.vocab[term] = term_id
+            self._df = _grow(self._df, term_id + 1)
+        return term_id
+
+    def add(self, chunk_id: str, content: str, metadata: Optional[dict] = None):
+        """Ajoute (ou remplace) un chunk en O(tokens du chunk)"""
+        with self._lock:
+            self._add(chunk_id, content, metadata)
+            self._maybe_compact()
+
+    def add_many(self, chunk_ids: List[str], contents: List[str], metadatas: Optional[List[dict]] = None):
+        """Ajout par lot dans le delta; la compaction suit les seuils habituels"""
+        metadatas = metadatas or [{} for _ in chunk_ids]
+        # Un chunk_id répété dans le lot n'occupe qu'un slot (dernière occurrence)
+        batch = {chunk_id: (content, metadata) for chunk_id, content, metadata in zip(chunk_ids, contents, metadatas)}
+        with self._lock:
+            for chunk_id, (content, metadata) in batch.items():
+                self._add(chunk_id, content, metadata)
+            self._maybe_compact()
+
+    def _add(self, chunk_id: str, content: str, metadata: Optional[dict]):
+        if chunk_id in self.slot_of:
+            self._remove(chunk_id)
+
+        metadata = metadata or {}
+        slot = len(self.chunk_ids)
+        self.chunk_ids.append(chunk_id)
+        self.contents.append(content)
+        self.metadatas.append(metadata)
+        self.slot_of[chunk_id] = slot
+
+        document_id = metadata.get("document_id")
+        if document_id is not None:
+            self.document_slots.setdefault(document_id, set()).add(slot)
+
+        term_counts, n_tokens = self.analyzer.term_frequencies(content)
+        term_freqs = {}
+        for term, tf in term_counts.items():
+            term_id = self._term_id(term)
+            term_freqs[term_id] = tf
+            slots, tfs = self._delta_postings.setdefault(term_id, ([], []))
+            slots.append(slot)
+            tfs.append(tf)
+            self._df[term_id] += 1
+        self._delta_slot_terms[slot] = term_freqs
+        self._delta_nnz += len(term_freqs)
+
+        self._doc_len = _grow(self._doc_len, slot + 1)
+        self._alive = _grow(self._alive, slot + 1)
+        self._doc_len[slot] = n_tokens
+        self._alive[slot] = True
+        self._n_alive += 1
+        self.total_len += n_tokens
+        self._idf_dirty = True
+        self.version += 1
+
+    def remove(self, chunk_id: str) -> bool:
+        """Supprime un chunk en O(tokens du chunk)"""
+        with self._lock:
+            removed = self._remove(chunk_id)
+            self._maybe_compact()
+            return removed
+
+    def document_contents(self, document_id: str) -> List[str]:
+        """Contenus des chunks indexés d'un document"""
+        with self._lock:
+            return [self.contents[slot] for slot in self.document_slots.get(document_id, ())]
+
+    def remove_document(self, document_id: str) -> int:
+        """Supprime tous les chunks d'un document, retourne le nombre supprimé"""
+        with self._lock:
+            slots = list(self.document_slots.get(document_id, ()))
+            for slot in slots:
+                self._remove(self.chunk_ids[slot])
+            self._maybe_compact()
+            return len(slots)
+
+    def _remove(self, chunk_id: str) -> bool:
+        slot = self.slot_of.pop(chunk_id, None)
+        if slot is None:
+            return False
+
+        # Les postings restent en place (tombstone); seules les df sont corrigées
+        if slot < self._n_base_slots:
+            start, end = self._fwd_indptr[slot], self._fwd_indptr[slot + 1]
+            self._df[self._fwd_terms[start:end]] -= 1
+        else:
+            for term_id in self._delta_slot_terms[slot]:
+                self._df[term_id] -= 1
+
+        document_id = (self.metadatas[slot] or {}).get("document_id")
+        if document_id in self.document_slots:
+            self.document_slots[document_id].discard(slot)
+            if not self.document_slots[document_id]:
+                del self.document_slots[document_id]
+
+        self._alive[slot] = False
+        self._n_alive -= 1
+        self.total_len -= int(self._doc_len[slot])
+        self.contents[slot] = None
+        self.metadatas[slot] = None
+        self._idf_dirty = True
+        self.version += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            self.__init__(self.k1, self.b, self.epsilon, self.analyzer)
+
+    def checksum(self) -> str:
+        """Empreinte des chunks indexés, comparable à celle de la collection ChromaDB"""
+        with self._lock:
+            return self._checksum()
+
+    def _checksum(self) -> str:
+        return chunks_checksum(self.slot_of.keys(), (self.contents[slot] for slot in self.slot_of.values()))
+
+    def _maybe_compact(self):
+        base_nnz = len(self._post_slots)
+        dead = self.n_slots - self._n_alive
+        if (self._delta_nnz > max(self.COMPACT_MIN_DELTA, self.COMPACT_DELTA_RATIO * base_nnz)
+                or dead > self.COMPACT_DEAD_RATIO * max(self.n_slots, 1)):
+            self.compact()
+
+    def compact(self):
+        """Fusionne le delta dans le segment CSR et purge les tombstones"""
+        with self._lock:
+            if not self._delta_slot_terms and self._n_alive == self.n_slots:
+                return
+
+            # 1. Postings vivants du segment de base (triplets terme, slot, tf)
+            base_terms = np.repeat(np.arange(len(self._indptr) - 1, dtype=np.int64), np.diff(self._indptr))
+            keep = self._alive[self._post_slots]
+            terms = [base_terms[keep]]
+            slots = [self._post_slots[keep].astype(np.int64)]
+            tfs = [self._post_tfs[keep]]
+
+            # 2. Postings du delta
+            for slot, term_freqs in self._delta_slot_terms.items():
+                if self._alive[slot] and term_freqs:
+                    terms.append(np.fromiter(term_freqs.keys(), dtype=np.int64, count=len(term_freqs)))
+                    slots.append(np.full(len(term_freqs), slot, dtype=np.int64))
+                    tfs.append(np.fromiter(term_freqs.values(), dtype=np.float32, count=len(term_freqs)))
+            terms = np.concatenate(terms)
+            slots = np.concatenate(slots)
+            tfs = np.concatenate(tfs)
+
+            # 3. Renumérotation dense des slots et des termes vivants
+            n_slots = self.n_slots
+            alive = self._alive[:n_slots]
+            slot_map = np.cumsum(alive) - 1
+            live_terms = self._df[:len(self.vocab)] > 0
+            term_map = np.cumsum(live_terms) - 1
+            slots = slot_map[slots]
+            terms = term_map[terms]
+            n_terms = int(live_terms.sum())
+            n_live = int(alive.sum())
+
+            alive_idx = np.flatnonzero(alive)
+            self.chunk_ids = [self.chunk_ids[i] for i in alive_idx]
+            self.contents = [self.contents[i] for i in alive_idx]
+            self.metadatas = [self.metadatas[i] for i in alive_idx]
+            self.slot_of = {chunk_id: i for i, chunk_id in enumerate(self.chunk_ids)}
+            self.document_slots = {}
+            for i, metadata in enumerate(self.metadatas):
+                document_id = (metadata or {}).get("document_id")
+                if document_id is not None:
+                    self.document_slots.setdefault(document_id, set()).add(i)
+            self._doc_len = self._doc_len[alive_idx].copy()
+            self._alive = np.ones(n_live, dtype=bool)
+
+            old_terms = sorted(self.vocab.items(), key=lambda item: item[1])
+            self.vocab = {term: int(term_map[term_id]) for term, term_id in old_terms if live_terms[term_id]}
+            self._df = self._df[:len(live_terms)][live_terms].copy()
+
+            # 4. Construction des matrices CSR (terme-major et slot-major)
+            order = np.lexsort((slots, terms))
+            self._post_slots = slots[order].astype(np.int32)
+            self._post_tfs = tfs[order].astype(np.float32)
+            self._indptr = np.concatenate(([0], np.cumsum(np.bincount(terms, minlength=n_terms)))).astype(np.int64)
+
+            order = np.lexsort((terms, slots))
+            self._fwd_terms = terms[order].astype(np.int32)
+            self._fwd_tfs = tfs[order].astype(np.float32)
+            self._fwd_indptr = np.concatenate(([0], np.cumsum(np.bincount(slots, minlength=n_live)))).astype(np.int64)
+            self._n_base_slots = n_live
+
+            self._delta_postings = {}
+            self._delta_slot_terms = {}
+            self._delta_nnz = 0
+            self._idf_dirty = True
+            self.compactions += 1
+
+    def _compute_idf(self):
+        """Même formule que BM25Okapi._calc_idf, vectorisée sur le vocabulaire"""
+        df = self._df[:len(self.vocab)].astype(np.float64)
+        present = df > 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            idf = np.log(self._n_alive - df + 0.5) - np.log(df + 0.5)
+        if present.any():
+            eps = self.epsilon * idf[present].mean()
+            idf[present & (idf < 0)] = eps
+        idf[~present] = 0.0
+        self._idf = idf
+        self._idf_dirty = False
+
+    def _postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Postings (slots, tf) d'un terme, segment de base et delta confondus"""
+        parts_slots, parts_tfs = [], []
+        if term_id < len(self._indptr) - 1:
+            start, end = self._indptr[term_id], self._indptr[term_id + 1]
+            parts_slots.append(self._post_slots[start:end])
+            parts_tfs.append(self._post_tfs[start:end])
+        delta = self._delta_postings.get(term_id)
+        if delta:
+            parts_slots.append(np.asarray(delta[0], dtype=np.int32))
+            parts_tfs.append(np.asarray(delta[1], dtype=np.float32))
+        if not parts_slots:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        if len(parts_slots) == 1:
+            return parts_slots[0], parts_tfs[0]
+        return np.concatenate(parts_slots), np.concatenate(parts_tfs)
+
+    def _term_scores(self, term_id: int, avgdl: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Contribution BM25 d'un terme (poids 1) sur ses postings vivants"""
+        slots, tfs = self._postings(term_id)
+        if not len(slots):
+            return slots.astype(np.int64), tfs.astype(np.float64)
+        live = self._alive[slots]
+        slots, tfs = slots[live].astype(np.int64), tfs[live].astype(np.float64)
+        norm = self.k1 * (1 - self.b + self.b * self._doc_len[slots] / avgdl)
+        return slots, self._idf[term_id] * (tfs * (self.k1 + 1) / (tfs + norm))
+
+    def _score_queries(self, queries_terms: List[Dict[int, int]]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Scores BM25 de plusieurs requêtes en une passe: chaque posting n'est lu qu'une fois.
+
+        Les scores sont agrégés sur la clé (requête, slot), puis redécoupés par requête.
+        """
+        if self._idf_dirty:
+            self._compute_idf()
+        # Chunks sans aucun token indexé (mots vides, légendes vides): longueur moyenne nulle
+        avgdl = self.total_len / self._n_alive if self.total_len else 1.0
+        n_slots = self.n_slots
+
+        usage: Dict[int, List[Tuple[int, int]]] = {}
+        for query_idx, query_terms in enumerate(queries_terms):
+            for term_id, query_tf in query_terms.items():
+                usage.setdefault(term_id, []).append((query_idx, query_tf))
+
+        parts_keys, parts_scores = [], []
+        for term_id, users in usage.items():
+            slots, scores = self._term_scores(term_id, avgdl)
+            if not len(slots):
+                continue
+            for query_idx, query_tf in users:
+                parts_keys.append(slots + query_idx * n_slots)
+                parts_scores.append(scores * query_tf)
+
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64))
+        if not parts_keys:
+            return [empty for _ in queries_terms]
+        keys, inverse = np.unique(np.concatenate(parts_keys), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(parts_scores))
+
+        # Clés triées: les résultats de chaque requête sont contigus
+        bounds = np.searchsorted(keys, np.arange(len(queries_terms) + 1) * n_slots)
+        return [
+            (keys[bounds[i]:bounds[i + 1]] - i * n_slots, scores[bounds[i]:bounds[i + 1]])
+            for i in range(len(queries_terms))
+        ]
+
+    def _query_terms(self, query: str) -> Dict[int, int]:
+        return Counter(self.vocab[token] for token in self.tokenize(query) if token in self.vocab)
+
+    @staticmethod
+    def _select_top_k(slots: np.ndarray, scores: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        if not len(slots) or k <= 0:
+            return []
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(slots[i]), float(scores[i])) for i in top]
+
+    def top_k(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Top-k (slot, score) en ne parcourant que les postings des termes de la requête"""
+        return self.top_k_many([query], k)[0]
+
+    def top_k_many(self, queries: List[str], k: int) -> List[List[Tuple[int, float]]]:
+        """Top-k (slot, score) de chaque requête, calculés en une seule passe vectorisée"""
+        with self._lock:
+            if not self._n_alive:
+                return [[] for _ in queries]
+            scored = self._score_queries([self._query_terms(query) for query in queries])
+            return [self._select_top_k(slots, scores, k) for slots, scores in scored]
+
+    def search(self, query: str, k: int) -> List[Tuple[str, str, dict, float]]:
+        """Top-k résolu en (chunk_id, contenu, métadonnées, score), sous verrou"""
+        return self.search_many([query], k)[0]
+
+    def search_many(self, queries: List[str], k: int) -> List[List[Tuple[str, str, dict, float]]]:
+        """search() pour plusieurs requêtes en une passe"""
+        with self._lock:
+            return [
+                [(self.chunk_ids[slot], self.contents[slot], self.metadatas[slot], score) for slot, score in hits]
+                for hits in self.top_k_many(queries, k)
+            ]
+
+    def _document_ids(self) -> List[str]:
+        document_ids = [""] * self.n_slots
+        for document_id, slots in self.document_slots.items():
+            for slot in slots:
+                document_ids[slot] = document_id
+        return document_ids
+
+    def save(self, path: str, checksum: Optional[str] = None):
+        """Persistance du segment CSR (fichiers .npy mappables en mémoire + manifeste versionné)"""
+        with self._lock:
+            self.compact()
+            checksum = checksum or self._checksum()
+            vocab_terms = [term for term, _ in sorted(self.vocab.items(), key=lambda item: item[1])]
+            n_slots = self.n_slots
+            arrays = {
+                "indptr": self._indptr,
+                "post_slots": self._post_slots,
+                "post_tfs": self._post_tfs,
+                "fwd_indptr": self._fwd_indptr,
+                "fwd_terms": self._fwd_terms,
+                "fwd_tfs": self._fwd_tfs,
+                "doc_len": self._doc_len[:n_slots],
+                "df": self._df[:len(vocab_terms)],
+            }
+            columns = {
+                "vocab": (vocab_terms, None),
+                "chunk_ids": (list(self.chunk_ids), None),
+                "document_ids": (self._document_ids(), None),
+                "contents": (self.contents if isinstance(self.contents, _StringColumn) else list(self.contents), None),
+                "metadatas": (self.metadatas if isinstance(self.metadatas, _StringColumn) else list(self.metadatas),
+                              _encode_metadata),
+            }
+            manifest = {
+                "format_version": INDEX_FORMAT_VERSION,
+                "tokenizer": self.analyzer.version,
+                "k1": self.k1,
+                "b": self.b,
+                "epsilon": self.epsilon,
+                "checksum": checksum,
+                "n_chunks": n_slots,
+                "n_terms": len(vocab_terms),
+                "total_len": self.total_len,
+            }
+
+        # Écriture hors verrou: les tableaux du segment de base ne sont jamais modifiés sur place
+        os.makedirs(path, exist_ok=True)
+        # Sauvegardes de plusieurs workers sérialisées: le nettoyage d'une génération ne doit
+        # pas supprimer les fichiers qu'un autre worker est en train d'écrire ou de publier
+        with open(os.path.join(path, LOCK_FILE), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._write_generation(path, arrays, columns, manifest)
+
+        logger.info(f"Index sparse persisté: {n_slots} chunks, {len(vocab_terms)} termes ({path})")
+
+    @staticmethod
+    def _write_generation(path: str, arrays: dict, columns: dict, manifest: dict):
+        generation = uuid.uuid4().hex[:8]
+        files = {}
+        for name, array in arrays.items():
+            files[name] = f"{name}.{generation}.npy"
+            np.save(os.path.join(path, files[name]), np.ascontiguousarray(array))
+        for name, (values, encode) in columns.items():
+            blob, offsets = _encode_column(values, encode)
+            files[f"{name}_blob"] = f"{name}_blob.{generation}.npy"
+            files[f"{name}_offsets"] = f"{name}_offsets.{generation}.npy"
+            np.save(os.path.join(path, files[f"{name}_blob"]), np.ascontiguousarray(blob))
+            np.save(os.path.join(path, files[f"{name}_offsets"]), offsets)
+        manifest["files"] = files
+
+        # Remplacement atomique du manifeste, puis nettoyage des anciennes générations
+        tmp_manifest = os.path.join(path, f"{MANIFEST_FILE}.{generation}.tmp")
+        with open(tmp_manifest, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_manifest, os.path.join(path, MANIFEST_FILE))
+        current = set(files.values()) | {MANIFEST_FILE, LOCK_FILE}
+        for filename in os.listdir(path):
+            if filename not in current:
+                try:
+                    os.remove(os.path.join(path, filename))
+                except OSError:
+                    pass
+
+    @classmethod
+    def read_manifest(cls, path: str, analyzer: Optional[TextAnalyzer] = None) -> Optional[dict]:
+        """Manifeste de l'index persisté, ou None s'il est absent, d'une autre version ou d'un autre analyseur"""
+        try:
+            with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        analyzer = analyzer or get_analyzer()
+        if manifest.get("format_version") != INDEX_FORMAT_VERSION or manifest.get("tokenizer") != analyzer.version:
+            return None
+        return manifest
+
+    @classmethod
+    def load(cls, path: str, manifest: Optional[dict] = None,
+             analyzer: Optional[TextAnalyzer] = None) -> Optional["SparseIndex"]:
+        """Chargement de l'index persisté (postings et textes mappés en mémoire, sans re-tokenisation)"""
+        analyzer = analyzer or get_analyzer()
+        manifest = manifest or cls.read_manifest(path, analyzer)
+        if manifest is None:
+            return None
+
+        files = manifest["files"]
+
+        def mmap(name):
+            return np.load(os.path.join(path, files[name]), mmap_mode="r")
+
+        index = cls(manifest["k1"], manifest["b"], manifest["epsilon"], analyzer)
+        index._indptr = mmap("indptr")
+        index._post_slots = mmap("post_slots")
+        index._post_tfs = mmap("post_tfs")
+        index._fwd_indptr = mmap("fwd_indptr")
+        index._fwd_terms = mmap("fwd_terms")
+        index._fwd_tfs = mmap("fwd_tfs")
+        # Tableaux modifiés sur place par les suppressions: copies en mémoire
+        index._doc_len = np.array(mmap("doc_len"), dtype=np.float64)
+        index._df = np.array(mmap("df"), dtype=np.int64)
+
+        n_chunks = manifest["n_chunks"]
+        index._alive = np.ones(n_chunks, dtype=bool)
+        index._n_alive = n_chunks
+        index._n_base_slots = n_chunks
+        index.total_len = manifest["total_len"]
+
+        vocab = _StringColumn(mmap("vocab_blob"), mmap("vocab_offsets"))
+        index.vocab = {term: i for i, term in enumerate(vocab)}
+        index.chunk_ids = list(_StringColumn(mmap("chunk_ids_blob"), mmap("chunk_ids_offsets")))
+        index.slot_of = {chunk_id: i for i, chunk_id in enumerate(index.chunk_ids)}
+        index.contents = _StringColumn(mmap("contents_blob"), mmap("contents_offsets"))
+        index.metadatas = _StringColumn(mmap("metadatas_blob"), mmap("metadatas_offsets"), json.loads)
+        document_ids = _StringColumn(mmap("document_ids_blob"), mmap("document_ids_offsets"))
+        for i, document_id in enumerate(document_ids):
+            if document_id:
+                index.document_slots.setdefault(document_id, set()).add(i)
+
+        logger.info(f"Index sparse chargé depuis le disque: {n_chunks} chunks ({path})")
+        return index
@@ -0,0 +1,170 @@
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+
+# Mots vides français (forme sans accents, après pliage)
+FRENCH_STOPWORDS = frozenset("""
+a ai aie aient aies ait alors as au aucun aussi autre aux avaient avais avait avant avec avez aviez avions avoir
+avons ayant c ca car ce ceci cela celle celles celui ces cet cette ceux chaque chez ci comme comment d dans de des
+deja donc dont du elle elles en encore entre es est et etaient etais etait etant ete etes etiez etions etre eu eux
+fait faut hors ici il ils j je jusqu l la le les leur leurs lors lui m ma mais me meme memes mes moi mon n ne ni
+nos notre nous on ont ou par pas peu peut plus pour pourquoi qu quand que quel quelle quelles quels qui quoi s sa
+sans se sera ses si sien sienne son sont sous suis sur t ta te tes toi ton tous tout toute toutes tres tu un une
+unes uns vers voici voila vos votre vous y
+""".split())
+
+# Pliage des accents latins courants (chemin rapide, sans unicodedata)
+_ACCENT_TABLE = str.maketrans(
+    "àâäáãåçéèêëíìîïñóòôöõúùûüýÿÀÂÄÁÃÅÇÉÈÊËÍÌÎÏÑÓÒÔÖÕÚÙÛÜÝ’",
+    "aaaaaaceeeeiiiinooooouuuuyyAAAAAACEEEEIIIINOOOOOUUUUY'"
+)
+_LIGATURES = {"œ": "oe", "Œ": "OE", "æ": "ae", "Æ": "AE"}
+
+# Acronymes pointés (C.S.S.), mots simples ou composés à trait d'union
+_TOKEN_RE = re.compile(r"\b(?:[A-Z]\.){2,}|[^\W_]+(?:-[^\W_]+)*")
+
+
+def fold_accents(text: str) -> str:
+    """Suppression des accents (table de traduction, repli sur unicodedata)"""
+    text = text.translate(_ACCENT_TABLE)
+    if text.isascii():
+        return text
+    for ligature, replacement in _LIGATURES.items():
+        text = text.replace(ligature, replacement)
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def french_light_stem(word: str) -> str:
+    """Racinisation légère du français (pluriels, féminins), sur un mot sans accents"""
+    if len(word) < 6 or not word.isalpha():
+        return word
+    if word.endswith("x"):
+        if word.endswith("aux"):
+            return word[:-2] + "l"
+        return word[:-1]
+    if word.endswith("s"):
+        word = word[:-1]
+    if word.endswith("r"):
+        word = word[:-1]
+    if word.endswith("e"):
+        word = word[:-1]
+    if len(word) > 1 and word[-1] == word[-2] and word[-1].isalpha():
+        word = word[:-1]
+    return word
+
+
+# Cache LRU des chunks déjà analysés (clé: empreinte du texte)
+class _AnalysisCache:
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._items: "OrderedDict[bytes, Tuple[Dict[str, int], int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: bytes) -> Optional[Tuple[Dict[str, int], int]]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def set(self, key: bytes, value: Tuple[Dict[str, int], int]):
+        if self.max_items <= 0:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+
+# Analyseur de texte partagé par l'indexation et les requêtes BM25
+class TextAnalyzer:
+    """Analyseur configurable: pliage des accents, tokenisation par regex compilée,
+    acronymes, mots vides et racinisation légère.
+
+    `version` identifie le pipeline: il est persisté avec l'index sparse pour
+    forcer une reconstruction si l'analyse change.
+    """
+
+    def __init__(self, name: str, fold: bool = True, stopwords: frozenset = frozenset(),
+                 stem: bool = False, acronyms: bool = False, cache_size: int = 0):
+        self.name = name
+        self.fold = fold
+        self.stopwords = stopwords
+        self.stem = stem
+        self.acronyms = acronyms
+        self._cache = _AnalysisCache(cache_size)
+        self.version = f"{name}-v1"
+
+    def _token(self, raw: str) -> Optional[str]:
+        """Normalisation d'un mot; None s'il doit être ignoré"""
+        is_acronym = self.acronyms and raw.isupper() and 2 <= len(raw) <= 6
+        token = raw.lower()
+        # Les acronymes (CE, ET...) ne sont pas confondus avec des mots vides
+        if not is_acronym and token in self.stopwords:
+            return None
+        return french_light_stem(token) if self.stem else token
+
+    def analyze(self, text: str) -> List[str]:
+        """Liste des termes d'un texte (requête ou chunk)"""
+        if self.fold:
+            text = fold_accents(text)
+
+        tokens = []
+        for match in _TOKEN_RE.finditer(text):
+            raw = match.group()
+            if "." in raw:
+                # Acronyme pointé: C.S.S. -> css
+                tokens.append(raw.replace(".", "").lower())
+            elif "-" in raw:
+                parts = [part for part in raw.split("-") if part]
+                terms = [self._token(part) for part in parts]
+                tokens.extend(term for term in terms if term)
+                # Bigramme pour les composés d'acronymes (CSS-IPRES -> css_ipre)
+                if self.acronyms and any(part.isupper() and len(part) >= 2 for part in parts):
+                    tokens.append("_".join(term for term in terms if term))
+            else:
+                term = self._token(raw)
+                if term:
+                    tokens.append(term)
+        return tokens
+
+    def term_frequencies(self, text: str) -> Tuple[Dict[str, int], int]:
+        """Fréquences des termes et nombre de tokens d'un chunk, mises en cache"""
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        tokens = self.analyze(text)
+        result = (dict(Counter(tokens)), len(tokens))
+        self._cache.set(key, result)
+        return result
+
+
+class SimpleAnalyzer(TextAnalyzer):
+    """Ancien comportement: minuscules et découpage sur les espaces"""
+
+    def __init__(self, cache_size: int = 0):
+        super().__init__("lower-split", fold=False, cache_size=cache_size)
+
+    def analyze(self, text: str) -> List[str]:
+        return text.lower().split()
+
+
+def get_analyzer(name: str = None) -> TextAnalyzer:
+    """Analyseur par nom ("french" ou "simple")"""
+    name = name or settings.SPARSE_ANALYZER
+    cache_size = settings.SPARSE_ANALYZER_CACHE_SIZE
+    if name == "simple":
+        return SimpleAnalyzer(cache_size=cache_size)
+    if name == "french":
+        return TextAnalyzer("french", fold=True, stopwords=FRENCH_STOPWORDS, stem=True, acronyms=True,
+                            cache_size=cache_size)
+    raise ValueError(f"Analyseur inconnu: {name}")
@@ -7,10 +7,12 @@ from app.api.monitoring_dashboard import router as dashboard_router
 from app.core.config import settings
 from app.utils.logging import setup_logging
 from app.services.rag_service import multimodal_rag_system
-from app.core.search import SearchResult
 from app.middleware.metrics_middleware import MetricsMiddleware, RAGMetricsMiddleware, CacheMetricsMiddleware
 from app.core.metrics import metrics_collector
 from app.core.business_metrics import business_metrics_collector
+from app.core.cache import cache
+from app.core.http_pool import http_pool
+from app.core.llm_provider import PROVIDER_CONFIGS
 
 setup_logging()
 
@@ -56,13 +58,20 @@ async def startup_event():
 
     def preload_reranker():
         try:
-            multimodal_rag_system.reranker.rerank("test", [
-                SearchResult("test content", 0.5, {}, "test")
-            ], top_k=1)
+            multimodal_rag_system.reranker.warmup()
             logger.info("Reranker pré-chargé")
         except Exception as e:
             logger.warning(f"Erreur pré-chargement reranker: {e}")
 
+    def preload_sparse_index():
+        try:
+            multimodal_rag_system.hybrid_search.ensure_sparse_index()
+            logger.info("Index BM25 pré-chargé")
+            if multimodal_rag_system.local_expansion_enabled():
+                multimodal_rag_system.build_expansion_vocabulary()
+        except Exception as e:
+            logger.warning(f"Erreur pré-chargement index BM25: {e}")
+
     def start_telegram_bot():
         """Démarre le bot Telegram automatiquement"""
         global telegram_bot_process
@@ -110,8 +119,15 @@ async def startup_event():
         except Exception as e:
             logger.error(f"Erreur lors du démarrage automatique du bot Telegram: {e}")
 
+    # Cohérence des caches locaux entre workers
+    cache.start_invalidation_listener()
+
+    # Clients HTTP partagés des providers LLM
+    http_pool.start(config["base_url"] for config in PROVIDER_CONFIGS.values())
+
     # Démarrage des tâches en arrière-plan
     threading.Thread(target=preload_reranker, daemon=True).start()
+    threading.Thread(target=preload_sparse_index, daemon=True).start()
     threading.Thread(target=start_telegram_bot, daemon=True).start()
 
 
@@ -143,6 +159,16 @@ async def shutdown_event():
         except Exception as e:
             logger.error(f"Erreur lors de l'arrêt du bot Telegram: {e}")
     
+    # Persistance de l'index BM25 (évite une reconstruction au prochain démarrage)
+    try:
+        multimodal_rag_system.hybrid_search.persist_sparse_index()
+    except Exception as e:
+        logger.error(f"Erreur persistance index BM25: {e}")
+
+    cache.stop_invalidation_listener()
+    multimodal_rag_system.reranker.service.stop()
+    await http_pool.close()
+
     logger.info("Serveur arrêté proprement")
 
 
@@ -2,8 +2,9 @@ import chromadb
 import uuid
 import time
 import asyncio
+import threading
 from datetime import datetime
-from typing import Dict, Any, List, Optional, Union
+from typing import Dict, Any, List, Optional, Tuple, Union
 from concurrent.futures import ThreadPoolExecutor
 
 from fastapi import HTTPException
@@ -13,7 +14,9 @@ from app.core.chunker import AdvancedChunker
 from app.core.search import HybridSearch, SearchResult
 from app.core.reranker import AdvancedReranker, RankedResult
 from app.core.query_enhancer import QueryEnhancer
-from app.core.llm_provider import OptimizedLLMProvider, PROVIDER_CONFIGS
+from app.core.query_expander import LocalQueryExpander
+from app.core.llm_provider import PROVIDER_CONFIGS
+from app.core.llm_router import get_llm_provider
 from app.core.multimodal_models import MultimodalModels
 from app.core.multimodal_embeddings import MultimodalEmbeddings
 from app.core.multimodal_processor import MultimodalProcessor
@@ -22,7 +25,10 @@ from app.core.direct_response_generator import DirectResponseGenerator
 from app.core.predefined_qa import PredefinedQASystem
 from app.models.enums import Provider, ContentType, ModalityType
 from app.utils.logging import logger
-from app.core.cache import cache
+from app.core.cache import cache, document_tags, normalize_question
+from app.core.metrics import metrics_collector
+from app.core.semantic_cache import SemanticAnswerCache
+from app.core.single_flight import SingleFlight, StreamFlight
 from app.core.config import settings
 from app.core.prompt_templates import build_rag_prompt
 
@@ -47,7 +53,23 @@ class UltraPerformantRAG:
             logger.info("Système de Q&A prédéfinies activé")
         else:
             logger.info("Système de Q&A prédéfinies désactivé")
+
+        # Expansion locale des requêtes (synonymes du domaine + voisins dans le vocabulaire indexé)
+        self.query_expander = LocalQueryExpander((self.predefined_qa or PredefinedQASystem()).synonyms)
+        self._vocabulary_lock = threading.Lock()
+        # Chunks ajoutés/retirés en attente, appliqués au vocabulaire par lots (fenêtre de regroupement)
+        self._vocabulary_pending: List[Tuple[List[str], List[str]]] = []
+        self._vocabulary_scheduled = False
         
+        # Cache sémantique des réponses (reformulations d'une même question)
+        self.semantic_cache = SemanticAnswerCache() if settings.ENABLE_SEMANTIC_CACHE else None
+        if self.semantic_cache:
+            cache.add_invalidation_hook(self.semantic_cache.invalidate)
+
+        # Regroupement des questions identiques en cours (réponses complètes et streaming)
+        self.query_flight = SingleFlight("query")
+        self.stream_flight = StreamFlight("query")
+
         # Composants multimodaux (chargement différé)
         self.multimodal_embeddings = None
         self.multimodal_processor = None
@@ -122,12 +144,21 @@ class UltraPerformantRAG:
                     ids=ids[i:end_idx]
                 )
 
-            # Reconstruction de l'index BM25
-            await asyncio.get_event_loop().run_in_executor(
+            # Mise à jour incrémentale de l'index BM25 (O(tokens du document))
+            replaced = await asyncio.get_event_loop().run_in_executor(
                 self.executor,
-                self.hybrid_search.rebuild_index
+                self._update_sparse_index,
+                document_id, ids, documents, metadatas
             )
 
+            # Invalidation des entrées dépendant de ce document et nouvelle génération de la collection
+            await asyncio.get_event_loop().run_in_executor(
+                self.executor, cache.document_changed, document_id
+            )
+
+            # Vocabulaire d'expansion: seuls les chunks de ce document sont comptés, en différé
+            self.schedule_vocabulary_update(documents, replaced)
+
             processing_time = time.time() - start_time
 
             return {
@@ -141,6 +172,62 @@ class UltraPerformantRAG:
             logger.error(f"Erreur ajout document: {e}")
             raise HTTPException(status_code=500, detail=f"Erreur traitement document: {str(e)}")
 
+    @staticmethod
+    def local_expansion_enabled() -> bool:
+        return settings.ENABLE_QUERY_ENHANCEMENT and settings.QUERY_ENHANCEMENT_MODE != "llm"
+
+    def build_expansion_vocabulary(self):
+        """Embeddings des mots fréquents du corpus indexé (construction complète, au démarrage)"""
+        try:
+            self.hybrid_search.ensure_sparse_index()
+            self.query_expander.build_vocabulary(
+                list(self.hybrid_search.sparse_index.contents), self.embeddings.embed_documents
+            )
+        except Exception as e:
+            logger.error(f"Erreur construction du vocabulaire d'expansion: {e}")
+
+    def schedule_vocabulary_update(self, added: List[str], removed: List[str] = ()):
+        """Mise à jour différée du vocabulaire: les uploads d'une même fenêtre sont appliqués ensemble"""
+        if not self.local_expansion_enabled():
+            return
+        with self._vocabulary_lock:
+            self._vocabulary_pending.append((list(added), list(removed)))
+            if self._vocabulary_scheduled:
+                return
+            self._vocabulary_scheduled = True
+        timer = threading.Timer(settings.QUERY_EXPANSION_VOCAB_DEBOUNCE,
+                                lambda: self.executor.submit(self._apply_vocabulary_updates))
+        timer.daemon = True
+        timer.start()
+
+    def _apply_vocabulary_updates(self):
+        with self._vocabulary_lock:
+            pending, self._vocabulary_pending = self._vocabulary_pending, []
+            self._vocabulary_scheduled = False
+        try:
+            self.query_expander.update_vocabulary(
+                [content for added, _ in pending for content in added],
+                [content for _, removed in pending for content in removed],
+                self.embeddings.embed_documents
+            )
+        except Exception as e:
+            logger.error(f"Erreur mise à jour du vocabulaire d'expansion: {e}")
+
+    def remove_document_chunks(self, document_id: str) -> int:
+        """Retire un document de l'index BM25 et de ses comptes dans le vocabulaire d'expansion"""
+        removed = self.hybrid_search.sparse_index_document_contents(document_id)
+        count = self.hybrid_search.remove_document(document_id)
+        self.schedule_vocabulary_update([], removed)
+        return count
+
+    def _update_sparse_index(self, document_id: str, ids: List[str], documents: List[str],
+                             metadatas: List[dict]) -> List[str]:
+        """Remplace les chunks d'un document dans l'index BM25; retourne les contenus remplacés"""
+        replaced = self.hybrid_search.sparse_index_document_contents(document_id)
+        self.hybrid_search.remove_document(document_id)
+        self.hybrid_search.add_chunks(ids, documents, metadatas)
+        return replaced
+
     async def add_multimodal_document(self, file_content: bytes, filename: str, 
                                     extract_text: bool = True, 
                                     generate_captions: bool = True) -> Dict[str, Any]:
@@ -294,7 +381,7 @@ class UltraPerformantRAG:
             # Application du reranking si demandé
             if rerank and len(search_results_formatted) > 1:
                 logger.info(f"Application du reranking sur {len(search_results_formatted)} résultats")
-                ranked_results = await self.reranker.rerank(
+                ranked_results = await self.reranker.arerank(
                     query=query,
                     results=search_results_formatted,
                     top_k=k
@@ -319,7 +406,177 @@ class UltraPerformantRAG:
             logger.error(f"Erreur lors de la requête multimodale: {e}")
             raise
 
+    async def search_variants(self, queries: List[str], n_results: int = None) -> List[SearchResult]:
+        """Recherche hybride groupée de toutes les variantes d'une question, dédupliquée par chunk"""
+        variant_results = await self.hybrid_search.search_many(queries, n_results=n_results)
+        return self.hybrid_search.merge_variant_results(variant_results)
+
+    async def _question_embedding(self, question: str):
+        """Embedding de la question hors de l'event loop (mis en cache, réutilisé par la recherche dense)"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self.hybrid_search.executor, self.embeddings.embed_query, question
+        )
+
+    async def retrieve(self, question: str, llm_provider,
+                       embedding=None) -> Tuple[List[str], List[SearchResult]]:
+        """Variantes de la question et résultats de recherche fusionnés.
+
+        En mode "adaptive", les variantes locales sont cherchées d'abord; l'enrichissement
+        LLM n'est demandé que si l'accord dense/sparse des premiers résultats est faible.
+        `embedding` évite de recalculer l'embedding de la question déjà obtenu par l'appelant.
+        """
+        mode = settings.QUERY_ENHANCEMENT_MODE
+        if not settings.ENABLE_QUERY_ENHANCEMENT:
+            queries = [question]
+        elif mode == "llm":
+            queries = await self.query_enhancer.enhance_query(question, llm_provider)
+        else:
+            if embedding is None:
+                embedding = await self._question_embedding(question)
+            queries = self.query_expander.expand(question, embedding)
+        results = await self.search_variants(queries)
+
+        if settings.ENABLE_QUERY_ENHANCEMENT and mode == "adaptive":
+            confidence = self.hybrid_search.retrieval_confidence(results)
+            if confidence < settings.QUERY_EXPANSION_MIN_CONFIDENCE:
+                metrics_collector.increment_counter("query_expansion_escalations")
+                logger.info(f"Confiance de recherche faible ({confidence:.2f}), enrichissement LLM")
+                extra = [query for query in await self.query_enhancer.enhance_query(question, llm_provider)
+                         if query not in queries]
+                if extra:
+                    extra_results = await self.hybrid_search.search_many(extra)
+                    results = self.hybrid_search.merge_variant_results([results] + extra_results)
+                    queries = queries + extra
+        return queries, results
+
+    async def retrieve_and_rank(self, question: str, llm_provider, top_k: int,
+                                embedding=None) -> Tuple[List[str], List[SearchResult], List[RankedResult]]:
+        """Variantes, résultats de recherche et contexte re-classé (pipeliné en mode "speculative")"""
+        if settings.ENABLE_QUERY_ENHANCEMENT and settings.QUERY_ENHANCEMENT_MODE == "speculative":
+            return await self._speculative_retrieve(question, llm_provider, top_k, embedding)
+        queries, results = await self.retrieve(question, llm_provider, embedding)
+        return queries, results, await self.reranker.arerank(question, results, top_k=top_k)
+
+    async def _speculative_retrieve(self, question: str, llm_provider, top_k: int,
+                                    embedding=None) -> Tuple[List[str], List[SearchResult], List[RankedResult]]:
+        """Recherche et re-ranking de la question pendant l'enrichissement LLM.
+
+        L'enrichissement est annulé si la première recherche est assez sûre; sinon ses
+        variantes ne sont ajoutées que si elles arrivent dans QUERY_ENHANCEMENT_BUDGET_MS.
+        """
+        start = time.monotonic()
+        enhancement = asyncio.ensure_future(self.query_enhancer.enhance_query(question, llm_provider))
+        try:
+            if embedding is None:
+                embedding = await self._question_embedding(question)
+            queries = self.query_expander.expand(question, embedding)
+            results = await self.search_variants(queries)
+            ranked_results = await self.reranker.arerank(question, results, top_k)
+
+            confidence = self.hybrid_search.retrieval_confidence(results)
+            if confidence >= settings.QUERY_EXPANSION_MIN_CONFIDENCE:
+                metrics_collector.increment_counter("speculative_enhancement_cancelled")
+                return queries, results, ranked_results
+
+            remaining = settings.QUERY_ENHANCEMENT_BUDGET_MS / 1000 - (time.monotonic() - start)
+            done, _ = await asyncio.wait({enhancement}, timeout=max(0.0, remaining))
+            if not done:
+                metrics_collector.increment_counter("speculative_enhancement_late")
+                logger.info("Enrichissement hors budget: contexte de la question originale conservé")
+                return queries, results, ranked_results
+
+            extra = [query for query in enhancement.result() if query not in queries]
+            if not extra:
+                return queries, results, ranked_results
+
+            # Seuls les nouveaux candidats passent par le cross-encoder
+            extra_results = self.hybrid_search.merge_variant_results(await self.hybrid_search.search_many(extra))
+            seen = {self.hybrid_search._result_key(result) for result in results}
+            new_candidates = [result for result in extra_results if self.hybrid_search._result_key(result) not in seen]
+            if new_candidates:
+                new_ranked = await self.reranker.arerank(question, new_candidates, top_k)
+                if len({result.stage for result in ranked_results + new_ranked}) == 1:
+                    ranked_results = sorted(ranked_results + new_ranked, key=lambda x: x.score, reverse=True)[:top_k]
+                else:
+                    # Scores d'étages différents (sortie anticipée de la cascade, repli): échelles
+                    # incomparables, l'ensemble est re-classé par le cross-encoder complet
+                    metrics_collector.increment_counter("speculative_mixed_stage_rerank")
+                    ranked_results = await self.reranker.arerank(
+                        question, results + new_candidates, top_k, cascade=False
+                    )
+            results = self.hybrid_search.merge_variant_results([results, extra_results])
+            return queries + extra, results, ranked_results
+        finally:
+            # Sans effet si l'enrichissement est terminé
+            enhancement.cancel()
+
+    def _semantic_cache_response(self, match: Dict[str, Any], query_id: str, start_time: float) -> Dict[str, Any]:
+        """Réponse servie depuis le cache sémantique (métadonnées de la requête courante)"""
+        response = dict(match["response"])
+        response.update({
+            "id": query_id,
+            "response_time_ms": round((time.time() - start_time) * 1000, 2),
+            "timestamp": datetime.now().isoformat(),
+        })
+        response["performance_metrics"] = {
+            **response.get("performance_metrics", {}),
+            "cache_hits": "semantic_cache",
+            "llm_calls_saved": True,
+            "matched_question": match["question"],
+            "similarity": round(match["similarity"], 4),
+            "saved_latency_ms": match["response_time_ms"],
+        }
+        return response
+
+    @staticmethod
+    def _flight_key(question: str, provider: Provider, top_k: int, **kwargs) -> str:
+        """Clé de regroupement: question normalisée et paramètres influant sur la réponse"""
+        return "|".join([normalize_question(question), provider.value, str(top_k),
+                         str(kwargs.get('temperature')), str(kwargs.get('max_tokens'))])
+
     async def query(self, question: str, provider: Provider, top_k: int = 3, **kwargs) -> Dict[str, Any]:
+        """Query ultra optimisé; les questions identiques concurrentes partagent un seul calcul"""
+        if not settings.ENABLE_SINGLE_FLIGHT:
+            return await self._query(question, provider, top_k, **kwargs)
+
+        key = self._flight_key(question, provider, top_k, **kwargs)
+        response, shared = await self.query_flight.do(
+            key, lambda: self._query(question, provider, top_k, **kwargs)
+        )
+        if shared:
+            response = {
+                **response,
+                "id": str(uuid.uuid4()),
+                "performance_metrics": {**response.get("performance_metrics", {}), "coalesced": True},
+            }
+        return response
+
+    async def _stream_events(self, question: str, provider: Provider, top_k: int):
+        """Événements du streaming: variantes, contexte retenu puis tokens générés"""
+        llm_provider = get_llm_provider(provider)
+        # Variantes, recherche hybride de toutes les variantes en une passe et re-ranking
+        enhanced_queries, all_results, ranked_results = await self.retrieve_and_rank(question, llm_provider, top_k)
+        yield "init", enhanced_queries
+
+        if not all_results:
+            yield "empty", None
+            return
+        yield "context", (all_results, ranked_results)
+
+        # Prompt optimisé (aligné New Deal si activé) et génération en streaming
+        context = "\n\n".join(result.content for result in ranked_results)
+        async for chunk in llm_provider.generate_stream(build_rag_prompt(context, question)):
+            if chunk:
+                yield "chunk", chunk
+
+    def stream_query_events(self, question: str, provider: Provider, top_k: int = 3):
+        """Flux d'événements d'une question; les suiveurs s'attachent au flux du leader"""
+        if not settings.ENABLE_SINGLE_FLIGHT:
+            return self._stream_events(question, provider, top_k)
+        key = self._flight_key(question, provider, top_k)
+        return self.stream_flight.stream(key, lambda: self._stream_events(question, provider, top_k))
+
+    async def _query(self, question: str, provider: Provider, top_k: int = 3, **kwargs) -> Dict[str, Any]:
         """Query ultra optimisé avec toutes les améliorations"""
         start_time = time.time()
         query_id = str(uuid.uuid4())
@@ -363,25 +620,23 @@ class UltraPerformantRAG:
                 cache.set(cache_key, response, ttl=3600, cache_type="full_response")
                 return response
 
-            # 1. Provider LLM
-            llm_provider = OptimizedLLMProvider(provider)
-
-            # 2. Enhancement de la requête (conditionnel)
-            if settings.ENABLE_QUERY_ENHANCEMENT:
-                enhanced_queries = await self.query_enhancer.enhance_query(question, llm_provider)
-                logger.info(f"Requêtes générées: {enhanced_queries}")
-            else:
-                enhanced_queries = [question]  # Utiliser seulement la requête originale
-                logger.info("Query enhancement désactivé - utilisation de la requête originale uniquement")
-
-            # 3. Recherche hybride pour toutes les variantes
-            all_results = []
-            for query_variant in enhanced_queries:
-                variant_results = await self.hybrid_search.search(
-                    query_variant,
-                    n_results=15
-                )
-                all_results.extend(variant_results)
+            # 0bis. Cache sémantique: une question proche déjà traitée réutilise sa réponse
+            question_embedding = None
+            semantic_partition = f"{provider.value}:{top_k}"
+            if self.semantic_cache:
+                question_embedding = await self._question_embedding(question)
+                match = self.semantic_cache.lookup(question_embedding, semantic_partition)
+                if match:
+                    return self._semantic_cache_response(match, query_id, start_time)
+
+            # 1. Provider LLM (routé selon la latence si LLM_ROUTING_MODE=latency)
+            llm_provider = get_llm_provider(provider)
+
+            # 2-4. Enhancement de la requête, recherche hybride des variantes et re-ranking cross-encoder
+            enhanced_queries, all_results, ranked_results = await self.retrieve_and_rank(
+                question, llm_provider, top_k, question_embedding
+            )
+            logger.info(f"Requêtes utilisées: {enhanced_queries}")
 
             if not all_results:
                 no_context_response = {
@@ -404,9 +659,6 @@ class UltraPerformantRAG:
                 }
                 return no_context_response
 
-            # 4. Re-ranking avec cross-encoder
-            ranked_results = self.reranker.rerank(question, all_results, top_k=top_k)
-
             # 5. Préparation du contexte optimisé
             context_parts = []
             sources = []
@@ -440,8 +692,8 @@ class UltraPerformantRAG:
                 "id": query_id,
                 "answer": response_text,
                 "context_found": True,
-                "provider_used": provider.value,
-                "model_used": PROVIDER_CONFIGS[provider]["model"],
+                "provider_used": llm_provider.provider.value,
+                "model_used": PROVIDER_CONFIGS[llm_provider.provider]["model"],
                 "response_time_ms": response_time_ms,
                 "timestamp": datetime.now().isoformat(),
                 "search_results": len(all_results),
@@ -455,8 +707,11 @@ class UltraPerformantRAG:
                 }
             }
 
-            # 9. Cache de la réponse complète
-            cache.set(cache_key, final_response, ttl=1800, cache_type="full_response")
+            # 9. Cache de la réponse complète (exacte et sémantique), liée aux documents cités
+            tags = document_tags([result.metadata for result in ranked_results])
+            cache.set(cache_key, final_response, ttl=1800, cache_type="full_response", tags=tags)
+            if self.semantic_cache:
+                self.semantic_cache.store(question_embedding, semantic_partition, question, final_response, tags)
 
             return final_response
 
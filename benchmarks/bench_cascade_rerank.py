@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Benchmark du re-ranking en cascade: qualité et latence face au cross-encoder L-12 seul
+
+Les questions viennent de qa.json (liste de chaînes, liste d'objets {"question": ...}
+ou dictionnaire question -> réponse); à défaut, des questions du système de Q&A
+prédéfinies. Le corpus est formé des réponses prédéfinies (ou de --corpus, un
+fichier texte avec un passage par ligne). Le classement du L-12 sur tous les
+candidats sert de référence: la cascade est mesurée par son rappel@k et la
+position de la référence top-1.
+
+Usage:
+    python benchmarks/bench_cascade_rerank.py --margins 0.02 0.05 0.08 0.12
+    python benchmarks/bench_cascade_rerank.py --middle-model cross-encoder/ms-marco-MiniLM-L-6-v2
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from sentence_transformers import CrossEncoder, SentenceTransformer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.predefined_qa import PredefinedQASystem
+from app.core.reranker import ambiguous_head
+
+
+def load_questions(path: str, limit: int):
+    questions = []
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            content = f.read().strip()
+        if content:
+            data = json.loads(content)
+            if isinstance(data, dict):
+                questions = list(data)
+            else:
+                questions = [item if isinstance(item, str) else item.get("question", "") for item in data]
+    if not questions:
+        print(f"{path} vide ou absent: questions du système de Q&A prédéfinies")
+        questions = PredefinedQASystem().get_all_questions()
+    return [question for question in questions if question][:limit]
+
+
+def load_corpus(path: str):
+    if path:
+        with open(path, encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    passages = []
+    for entry in PredefinedQASystem().qa_database.values():
+        passages.extend(entry.get("answers", [entry.get("answer", "")]))
+    return [passage for passage in passages if passage]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def cascade(query, passages, dense, k, margin, max_head, full_model, middle_model, middle_margin):
+    """Classement de la cascade et nombre de paires évaluées par le L-12"""
+    head = ambiguous_head(dense, k, margin, max_head)
+    if head is None:
+        return list(np.argsort(-dense)[:k]), 0
+    if middle_model is not None:
+        middle = middle_model.predict([(query, passages[i]) for i in head])
+        narrowed = ambiguous_head(np.asarray(middle), k, middle_margin, max_head)
+        if narrowed is None:
+            return [head[i] for i in np.argsort(-middle)[:k]], 0
+        head = head[narrowed]
+    scores = full_model.predict([(query, passages[i]) for i in head])
+    return [head[i] for i in np.argsort(-scores)[:k]], len(head)
+
+
+def report(name, latencies, recalls, top1, pairs, exits):
+    latencies = np.array(latencies)
+    print(f"{name:<28} | lat. moy {latencies.mean():7.1f} ms | p95 {np.percentile(latencies, 95):7.1f} ms"
+          f" | rappel@k {np.mean(recalls):.3f} | top-1 conservé {np.mean(top1):.3f}"
+          f" | paires L-12 {np.mean(pairs):5.1f} | sorties anticipées {np.mean(exits):.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--qa", default="qa.json")
+    parser.add_argument("--corpus", default="")
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--candidates", type=int, default=30, help="Candidats par question (3 variantes x 10)")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--margins", type=float, nargs="+", default=[0.02, 0.05, 0.08, 0.12])
+    parser.add_argument("--max-head", type=int, default=8)
+    parser.add_argument("--embedding-model", default="all-mpnet-base-v2")
+    parser.add_argument("--full-model", default="cross-encoder/ms-marco-MiniLM-L-12-v2")
+    parser.add_argument("--middle-model", default="")
+    parser.add_argument("--middle-margin", type=float, default=2.0)
+    args = parser.parse_args()
+
+    questions = load_questions(args.qa, args.questions)
+    passages = load_corpus(args.corpus)
+    print(f"{len(questions)} questions, {len(passages)} passages, {args.candidates} candidats, top-{args.top_k}")
+
+    embedder = SentenceTransformer(args.embedding_model, device="cpu")
+    full_model = CrossEncoder(args.full_model)
+    middle_model = CrossEncoder(args.middle_model) if args.middle_model else None
+
+    passage_vectors = embedder.encode(passages, normalize_embeddings=True, batch_size=64)
+    k = args.top_k
+    reference_latencies, references, runs = [], [], []
+    for question in questions:
+        query_vector = embedder.encode([question], normalize_embeddings=True)[0]
+        similarities = passage_vectors @ query_vector
+        candidates = np.argsort(-similarities)[:args.candidates]
+        candidate_passages = [passages[i] for i in candidates]
+        dense = similarities[candidates]
+
+        scores, latency = timed(lambda: full_model.predict([(question, p) for p in candidate_passages]))
+        reference_latencies.append(latency)
+        references.append(list(np.argsort(-scores)[:k]))
+        runs.append((question, candidate_passages, dense))
+
+    print(f"\n{'L-12 seul (référence)':<28} | lat. moy {np.mean(reference_latencies):7.1f} ms"
+          f" | p95 {np.percentile(reference_latencies, 95):7.1f} ms | paires L-12 {args.candidates:5.1f}")
+
+    for margin in args.margins:
+        latencies, recalls, top1, pairs, exits = [], [], [], [], []
+        for (question, candidate_passages, dense), reference in zip(runs, references):
+            (ranking, n_pairs), latency = timed(lambda: cascade(
+                question, candidate_passages, dense, k, margin, args.max_head,
+                full_model, middle_model, args.middle_margin
+            ))
+            latencies.append(latency)
+            recalls.append(len(set(ranking) & set(reference)) / k)
+            top1.append(reference[0] in ranking)
+            pairs.append(n_pairs)
+            exits.append(n_pairs == 0)
+        name = f"cascade marge {margin:g}" + (" + L-6" if middle_model else "")
+        report(name, latencies, recalls, top1, pairs, exits)
+
+
+if __name__ == "__main__":
+    main()
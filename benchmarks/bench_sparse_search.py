@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark de la recherche sparse: SparseIndex (CSR + argpartition) vs rank_bm25
+
+Usage:
+    python benchmarks/bench_sparse_search.py --sizes 10000 100000 1000000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from rank_bm25 import BM25Okapi
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.sparse_index import SparseIndex
+from app.core.text_analyzer import get_analyzer
+
+
+def generate_corpus(n_docs: int, vocab_size: int, doc_len: int, rng: np.random.Generator):
+    """Corpus synthétique avec distribution de Zipf (proche d'un corpus réel)"""
+    vocab = np.array([f"t{i}" for i in range(vocab_size)])
+    ranks = rng.zipf(1.2, size=n_docs * doc_len) % vocab_size
+    words = vocab[ranks].reshape(n_docs, doc_len)
+    return [" ".join(row) for row in words], vocab
+
+
+def generate_queries(vocab: np.ndarray, n_queries: int, rng: np.random.Generator):
+    """Requêtes de 3 à 6 termes, mélange de termes fréquents et rares"""
+    queries = []
+    for _ in range(n_queries):
+        n_terms = rng.integers(3, 7)
+        ranks = rng.zipf(1.1, size=n_terms) % len(vocab)
+        queries.append(" ".join(vocab[ranks]))
+    return queries
+
+
+def time_queries(search, queries):
+    durations = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        durations.append((time.perf_counter() - start) * 1000)
+    durations = np.array(durations)
+    return durations.mean(), np.percentile(durations, 95)
+
+
+def run(n_docs: int, args, rng: np.random.Generator):
+    docs, vocab = generate_corpus(n_docs, args.vocab_size, args.doc_len, rng)
+    queries = generate_queries(vocab, args.queries, rng)
+    ids = [f"chunk_{i}" for i in range(n_docs)]
+    k = args.top_k
+
+    start = time.perf_counter()
+    index = SparseIndex(analyzer=get_analyzer(args.analyzer))
+    index.add_many(ids, docs, [{"document_id": f"doc_{i // 20}"} for i in range(n_docs)])
+    index.compact()
+    build_sparse = time.perf_counter() - start
+    mean_sparse, p95_sparse = time_queries(lambda q: index.top_k(q, k), queries)
+
+    print(f"\n=== {n_docs:,} chunks ({args.doc_len} tokens/chunk, vocab {args.vocab_size:,}) ===")
+    print(f"SparseIndex : build {build_sparse:8.2f}s | requête moy {mean_sparse:8.2f} ms | p95 {p95_sparse:8.2f} ms")
+
+    if n_docs > args.max_rank_bm25:
+        print(f"rank_bm25   : ignoré (> --max-rank-bm25 {args.max_rank_bm25:,})")
+        return
+
+    start = time.perf_counter()
+    bm25 = BM25Okapi([index.tokenize(doc) for doc in docs])
+    build_bm25 = time.perf_counter() - start
+
+    def bm25_top_k(query):
+        scores = bm25.get_scores(index.tokenize(query))
+        return np.argsort(scores)[::-1][:k]
+
+    mean_bm25, p95_bm25 = time_queries(bm25_top_k, queries)
+    print(f"rank_bm25   : build {build_bm25:8.2f}s | requête moy {mean_bm25:8.2f} ms | p95 {p95_bm25:8.2f} ms")
+    print(f"Accélération requête: x{mean_bm25 / max(mean_sparse, 1e-9):.1f}")
+
+    # Vérification de l'équivalence des scores sur quelques requêtes
+    for query in queries[:5]:
+        expected = bm25.get_scores(index.tokenize(query))
+        for slot, score in index.top_k(query, k):
+            assert np.isclose(expected[slot], score), f"Écart de score pour '{query}'"
+    print("Scores identiques à rank_bm25 ✅")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--doc-len", type=int, default=80)
+    parser.add_argument("--vocab-size", type=int, default=50_000)
+    parser.add_argument("--max-rank-bm25", type=int, default=1_000_000,
+                        help="Taille maximale de corpus pour laquelle rank_bm25 est mesuré")
+    parser.add_argument("--analyzer", default="simple", choices=["simple", "french"])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    for n_docs in args.sizes:
+        run(n_docs, args, rng)
+
+
+if __name__ == "__main__":
+    main()
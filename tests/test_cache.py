@@ -0,0 +1,139 @@
+import json
+
+import numpy as np
+
+from app.core import cache as cache_module
+from app.core.cache import MultiLayerCache
+
+
+class FakeRedis:
+    """Sous-ensemble de Redis utilisé par le cache, avec une horloge manipulable"""
+
+    def __init__(self):
+        self.now = 0
+        self.data = {}
+        self.expiry = {}
+
+    def _alive(self, key):
+        if key in self.expiry and self.expiry[key] <= self.now:
+            self.data.pop(key, None)
+            self.expiry.pop(key, None)
+        return key in self.data
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+        self.expiry[key] = self.now + ttl
+
+    def sadd(self, key, *members):
+        if not self._alive(key):
+            self.data[key] = set()
+        self.data[key].update(members)
+
+    def expire(self, key, ttl, nx=False, gt=False):
+        current = self.expiry.get(key) if self._alive(key) else None
+        if (nx and current is not None) or (gt and (current is None or current >= self.now + ttl)):
+            return False
+        self.expiry[key] = self.now + ttl
+        return True
+
+    def smembers(self, key):
+        return set(self.data[key]) if self._alive(key) else set()
+
+    def mget(self, keys):
+        return [self.data[key] if self._alive(key) else None for key in keys]
+
+    def unlink(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+            self.expiry.pop(key, None)
+
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+    def publish(self, channel, message):
+        pass
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+def test_get_many_and_set_many_preserve_order():
+    cache = MultiLayerCache()
+    cache.set_many(["a", "c"], [{"v": 1}, [3]], cache_type="general")
+    assert cache.get_many(["a", "b", "c"], "general") == [{"v": 1}, None, [3]]
+    assert cache.get("a", "general") == {"v": 1}
+    assert cache.get("a", "autre") is None
+
+
+def test_vector_batches():
+    cache = MultiLayerCache()
+    vectors = list(np.eye(3, dtype=np.float32))
+    cache.set_vectors(["x", "y", "z"], vectors)
+    hits = cache.get_vectors(["z", "w", "x"])
+    assert hits[1] is None
+    assert np.array_equal(hits[0], vectors[2]) and np.array_equal(hits[2], vectors[0])
+
+
+def test_invalidation_messages_from_other_workers_clear_local_tier():
+    cache = MultiLayerCache()
+    cache.set_many(["q"], ["réponse"], cache_type="full_response", tags=[["doc:doc1"]])
+    cache.set_many(["t"], ["variantes"], cache_type="query_enhancement")
+
+    own = {"data": json.dumps({"action": "clear", "origin": cache.instance_id})}
+    cache._on_invalidation(own)
+    assert cache.get("q", "full_response") == "réponse"
+
+    other = {"data": json.dumps({"action": "tags", "tags": ["doc:doc1"], "origin": "autre"})}
+    cache._on_invalidation(other)
+    assert cache.get("q", "full_response") is None
+    assert cache.get("t", "query_enhancement") == "variantes"
+
+
+def test_document_change_invalidates_only_dependent_entries():
+    cache = MultiLayerCache()
+    cache.set("q1", "réponse doc1", cache_type="full_response", tags=["doc:doc1"])
+    cache.set("q2", "réponse doc2", cache_type="full_response", tags=["doc:doc2"])
+    cache.set("r1", ["classement"], cache_type="rerank", tags=["doc:doc1", "doc:doc3"])
+    cache.set_vectors(["chunk"], [np.ones(4, dtype=np.float32)])
+
+    cache.document_changed("doc1", added=False)
+    assert cache.get("q1", "full_response") is None
+    assert cache.get("r1", "rerank") is None
+    assert cache.get("q2", "full_response") == "réponse doc2"
+    assert cache.get_vectors(["chunk"])[0] is not None
+
+    # Un nouveau document change la génération: les réponses complètes ne sont plus servies
+    cache.document_changed("doc4", added=True)
+    assert cache.get("q2", "full_response") is None
+    assert cache.get_vectors(["chunk"])[0] is not None
+
+
+def test_tag_outlives_its_longest_entry(monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(cache_module, "REDIS_AVAILABLE", True)
+    monkeypatch.setattr(cache_module, "redis_client", redis)
+    cache = MultiLayerCache()
+    cache.set("paire", 0.8, ttl=86400, cache_type="rerank_pair", tags=["doc:doc1"])
+    # Écrite après les scores, la réponse (TTL court) ne doit pas raccourcir le tag
+    cache.set("q", "réponse", ttl=1800, cache_type="full_response", tags=["doc:doc1"])
+
+    redis.now = 3600
+    cache.memory_cache.clear()
+    assert cache.get("paire", "rerank_pair") == 0.8
+
+    cache.document_changed("doc1", added=False)
+    cache.memory_cache.clear()
+    assert cache.get("paire", "rerank_pair") is None
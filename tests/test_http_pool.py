@@ -0,0 +1,19 @@
+import asyncio
+
+from app.core.http_pool import HTTPClientPool
+
+
+def test_one_shared_client_per_origin():
+    pool = HTTPClientPool()
+    mistral = pool.get("https://api.mistral.ai/v1/chat/completions")
+    assert pool.get("https://api.mistral.ai/v1/other") is mistral
+    assert pool.get("https://api.openai.com/v1/chat/completions") is not mistral
+
+    pool.extensions("https://api.mistral.ai/v1/chat/completions")
+    stats = pool.stats()
+    assert stats["open_clients"] == 2
+    assert stats["origins"]["https://api.mistral.ai"]["requests"] == 1
+
+    asyncio.run(pool.close())
+    assert mistral.is_closed
+    assert pool.get("https://api.mistral.ai/v1/chat/completions") is not mistral
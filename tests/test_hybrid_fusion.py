@@ -0,0 +1,56 @@
+from app.core.search import HybridSearch, SearchResult
+
+
+def _results(source_type, scored_ids):
+    return [
+        SearchResult(content=f"contenu {chunk_id}", score=score, metadata={}, source_type=source_type,
+                     chunk_id=chunk_id)
+        for chunk_id, score in scored_ids
+    ]
+
+
+DENSE = _results("dense", [("a", 0.9), ("b", 0.8), ("c", 0.7)])
+# Scores BM25 bruts bien plus grands que les similarités denses
+SPARSE = _results("sparse", [("c", 14.0), ("d", 9.0)])
+
+
+def test_rrf_is_scale_independent_and_keyed_by_chunk_id():
+    search = HybridSearch(None, None)
+    fused = search._fuse(DENSE, SPARSE, n_results=10, alpha=0.5, strategy="rrf")
+
+    assert [r.chunk_id for r in fused][0] == "c"  # présent dans les deux branches
+    assert fused[0].source_type == "hybrid"
+    assert len(fused) == 4
+    assert len({r.chunk_id for r in fused}) == 4
+
+
+def test_linear_fusion_normalizes_each_branch():
+    search = HybridSearch(None, None)
+    fused = search._fuse(DENSE, SPARSE, n_results=10, alpha=0.75, strategy="linear")
+    scores = {r.chunk_id: r.score for r in fused}
+
+    assert scores["a"] == 0.75  # meilleur dense, absent du sparse
+    assert scores["d"] == 0.0  # pire sparse après normalisation
+    assert max(scores.values()) <= 1.0
+
+
+def test_merge_variant_results_keeps_best_score_per_chunk():
+    search = HybridSearch(None, None)
+    merged = search.merge_variant_results([
+        _results("hybrid", [("a", 0.2), ("b", 0.1)]),
+        _results("hybrid", [("b", 0.5)]),
+    ])
+    assert [(r.chunk_id, r.score) for r in merged] == [("b", 0.5), ("a", 0.2)]
+
+
+def test_dense_cosine_is_carried_through_fusion_and_variant_merge():
+    search = HybridSearch(None, None)
+    dense = _results("dense", [("c", 0.7)])
+    dense[0].dense_score = 0.4
+    fused = {r.chunk_id: r for r in search._fuse(dense, SPARSE, n_results=10, alpha=0.5, strategy="rrf")}
+    assert fused["c"].dense_score == 0.4
+    assert fused["d"].dense_score is None
+
+    other = _results("sparse", [("c", 5.0)])
+    merged = search.merge_variant_results([[fused["c"]], other])
+    assert merged[0].score == 5.0 and merged[0].dense_score == 0.4
@@ -0,0 +1,116 @@
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.core import inference_server
+from app.core.inference_server import InferenceClient, InferenceServer, RemoteModel, remote_model
+
+
+class FakeEncoder:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts):
+        self.calls.append(len(texts))
+        return np.array([[float(len(text)), 1.0] for text in texts])
+
+
+def start_server(monkeypatch, model):
+    monkeypatch.setattr(settings, "INFERENCE_BATCH_MAX_WAIT_MS", 100)
+    address = os.path.join(tempfile.mkdtemp(), "inference.sock")
+    server = InferenceServer(address, loader=lambda kind, name, **kwargs: (model, "torch"))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = InferenceClient(address, timeout=5)
+    assert client.wait_ready(5)
+    return server, client
+
+
+def test_requests_from_several_clients_share_one_batch(monkeypatch):
+    model = FakeEncoder()
+    server, client = start_server(monkeypatch, model)
+    remote = RemoteModel(client, "sentence_transformer", "encoder", {})
+    assert client.request("load", "sentence_transformer", "encoder", {}) == "torch"
+
+    results = {}
+
+    def encode(text):
+        results[text] = remote.encode([text, text + "!"], batch_size=8)
+
+    threads = [threading.Thread(target=encode, args=(text,)) for text in ("a", "bb", "ccc")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    server.close()
+
+    assert model.calls == [6]
+    assert results["bb"][:, 0].tolist() == [2.0, 3.0]
+    assert server.stats()["connections"] == 4
+
+
+class SlowEncoder(FakeEncoder):
+    def encode(self, texts):
+        time.sleep(0.5)
+        return super().encode(texts)
+
+
+def test_slow_request_fails_without_loading_a_local_model(monkeypatch):
+    server, client = start_server(monkeypatch, SlowEncoder())
+    client.timeout = 0.1
+    remote = RemoteModel(client, "sentence_transformer", "encoder", {})
+
+    with pytest.raises(TimeoutError):
+        remote.encode(["texte"])
+    server.close()
+    assert client.timeouts == 1
+
+
+def test_unreachable_server_raises_after_one_retry(monkeypatch):
+    monkeypatch.setattr(settings, "INFERENCE_SERVER_TIMEOUT", 0.1)
+    monkeypatch.setattr(settings, "INFERENCE_SERVER_AUTOSTART", False)
+    client = InferenceClient(os.path.join(tempfile.mkdtemp(), "absent.sock"))
+    remote = RemoteModel(client, "sentence_transformer", "encoder", {})
+
+    with pytest.raises(ConnectionError):
+        remote.encode(["texte"])
+    # Attente vaine mémorisée: les requêtes suivantes échouent sans nouvelle attente
+    assert not client.wait_ready(5)
+
+
+def test_slow_model_load_fails_startup_instead_of_loading_locally(monkeypatch):
+    monkeypatch.setattr(settings, "INFERENCE_BATCH_MAX_WAIT_MS", 100)
+    monkeypatch.setattr(settings, "INFERENCE_SERVER_LOAD_TIMEOUT", 0.1)
+    monkeypatch.setattr(settings, "INFERENCE_SERVER_AUTOSTART", False)
+    address = os.path.join(tempfile.mkdtemp(), "inference.sock")
+
+    def slow_loader(kind, name, **kwargs):
+        time.sleep(0.5)
+        return FakeEncoder(), "torch"
+
+    server = InferenceServer(address, loader=slow_loader)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(inference_server, "_client", InferenceClient(address, timeout=5))
+
+    with pytest.raises(RuntimeError, match="échec du chargement"):
+        remote_model("sentence_transformer", "encoder", {})
+    server.close()
+
+
+def test_server_stops_once_no_worker_is_connected(monkeypatch):
+    server, client = start_server(monkeypatch, FakeEncoder())
+    waiter = threading.Thread(target=server.wait_idle, args=(0.2,), daemon=True)
+    waiter.start()
+
+    # Un worker vivant garde sa connexion: le serveur reste en service
+    waiter.join(0.6)
+    assert waiter.is_alive() and server.stats()["active_connections"] == 1
+
+    client._close()
+    waiter.join(5)
+    assert not waiter.is_alive()
+    server.close()
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from app.core import llm_router as router_module
+from app.core.config import settings
+from app.core.llm_router import LLMRouter, RoutedLLMProvider
+from app.models.enums import Provider
+
+
+class FakeProvider:
+    def __init__(self, behaviours, calls, provider):
+        self.behaviour = behaviours[provider]
+        self.calls = calls
+        self.provider = provider
+
+    async def generate_response(self, prompt, **kwargs):
+        self.calls.append(self.provider)
+        delay, error = self.behaviour
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.calls.append(f"cancelled:{self.provider.value}")
+            raise
+        if error:
+            raise RuntimeError(f"{self.provider.value} indisponible")
+        return f"réponse {self.provider.value}"
+
+    async def generate_stream(self, prompt):
+        delay, error = self.behaviour
+        if error:
+            raise RuntimeError(f"{self.provider.value} indisponible")
+        yield f"token {self.provider.value}"
+
+
+@pytest.fixture
+def two_providers(monkeypatch):
+    for provider in Provider:
+        monkeypatch.setitem(router_module.API_KEYS, provider, None)
+    monkeypatch.setitem(router_module.API_KEYS, Provider.OPENAI, "key")
+    monkeypatch.setitem(router_module.API_KEYS, Provider.MISTRAL, "key")
+
+
+def routed(behaviours, calls, router=None):
+    return RoutedLLMProvider(
+        Provider.OPENAI, router=router or LLMRouter(),
+        provider_factory=lambda provider: FakeProvider(behaviours, calls, provider),
+    )
+
+
+def test_failover_to_next_provider_on_error(two_providers):
+    calls = []
+    llm = routed({Provider.OPENAI: (0, True), Provider.MISTRAL: (0, False)}, calls)
+
+    assert asyncio.run(llm.generate_response("prompt")) == "réponse mistral"
+    assert llm.provider == Provider.MISTRAL
+    assert llm.router.failovers == 1
+    assert llm.router.health[Provider.OPENAI].error_rate == 1.0
+
+
+def test_hedged_request_wins_and_cancels_slow_primary(two_providers, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGING", True)
+    monkeypatch.setattr(settings, "LLM_HEDGE_DEFAULT_DELAY", 0.05)
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_DELAY", 0.0)
+    calls = []
+    llm = routed({Provider.OPENAI: (1.0, False), Provider.MISTRAL: (0, False)}, calls)
+
+    assert asyncio.run(llm.generate_response("prompt")) == "réponse mistral"
+    assert llm.router.hedges == 1 and llm.router.hedge_wins == 1
+    assert "cancelled:openai" in calls
+
+
+def test_unhealthy_provider_is_tried_last(two_providers, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_ROUTER_FAILURE_THRESHOLD", 2)
+    router = LLMRouter()
+    router.health[Provider.OPENAI].record_failure()
+    router.health[Provider.OPENAI].record_failure()
+
+    assert router.candidates(Provider.OPENAI) == [Provider.MISTRAL, Provider.OPENAI]
+
+
+def test_stream_fails_over_before_first_token(two_providers):
+    calls = []
+    llm = routed({Provider.OPENAI: (0, True), Provider.MISTRAL: (0, False)}, calls)
+
+    async def collect():
+        return [token async for token in llm.generate_stream("prompt")]
+
+    assert asyncio.run(collect()) == ["token mistral"]
+    assert llm.provider == Provider.MISTRAL
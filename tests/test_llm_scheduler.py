@@ -0,0 +1,41 @@
+import asyncio
+
+import httpx
+
+from app.core.llm_scheduler import ProviderScheduler, SchedulerQueueFull, parse_retry_after
+
+
+def test_retries_after_429_honoring_retry_after():
+    responses = [httpx.Response(429, headers={"retry-after": "0"}), httpx.Response(200, json={"ok": True})]
+
+    async def send():
+        return responses.pop(0)
+
+    scheduler = ProviderScheduler("test", max_concurrency=2, max_retries=2)
+    response = asyncio.run(scheduler.run(send))
+    assert response.status_code == 200
+    assert scheduler.retries == 1
+
+
+def test_concurrency_is_bounded_and_queue_overflow_is_rejected():
+    scheduler = ProviderScheduler("test", max_concurrency=2, max_queue=3)
+    peak = []
+
+    async def call():
+        async with scheduler.slot():
+            peak.append(scheduler.active)
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        return await asyncio.gather(*[call() for _ in range(6)], return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert max(peak) <= 2
+    assert any(isinstance(result, SchedulerQueueFull) for result in results)
+    assert scheduler.rejected == sum(isinstance(result, SchedulerQueueFull) for result in results)
+
+
+def test_parse_retry_after_formats():
+    assert parse_retry_after(httpx.Headers({"retry-after": "2"})) == 2.0
+    assert parse_retry_after(httpx.Headers({"retry-after-ms": "1500"})) == 1.5
+    assert parse_retry_after(httpx.Headers({})) is None
@@ -0,0 +1,32 @@
+import time
+
+import numpy as np
+
+from app.core.memory_tier import SegmentedMemoryTier
+
+
+def test_ttl_is_honored_on_read():
+    tier = SegmentedMemoryTier(max_bytes=1 << 20, quotas={"full_response": 1.0})
+    tier.set_many(["k"], ["réponse"], ttl=0, cache_type="full_response")
+    time.sleep(0.01)
+    assert tier.get_many(["k"], "full_response") == [None]
+    assert tier.stats()["full_response"]["expirations"] == 1
+
+
+def test_embedding_flood_does_not_evict_answers():
+    tier = SegmentedMemoryTier(max_bytes=100_000, quotas={"full_response": 0.5, "embeddings": 0.5})
+    tier.set_many(["answer"], [{"response": "texte"}], ttl=60, cache_type="full_response")
+    vectors = [np.zeros(768, dtype=np.float32) for _ in range(100)]
+    tier.set_many([f"e{i}" for i in range(100)], vectors, ttl=60, cache_type="embeddings")
+
+    assert tier.get_many(["answer"], "full_response") == [{"response": "texte"}]
+    stats = tier.stats()["embeddings"]
+    assert stats["evictions"] > 0 and stats["bytes"] <= stats["max_bytes"]
+
+
+def test_reused_entry_survives_one_off_scan():
+    tier = SegmentedMemoryTier(max_bytes=10_000, quotas={"rerank": 1.0}, max_items=10)
+    tier.set_many(["hot"], ["x"], ttl=60, cache_type="rerank")
+    tier.get_many(["hot"], "rerank")  # promotion en zone protégée
+    tier.set_many([f"scan{i}" for i in range(50)], ["y"] * 50, ttl=60, cache_type="rerank")
+    assert tier.get_many(["hot"], "rerank") == ["x"]
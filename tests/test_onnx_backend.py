@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+from app.core import onnx_backend  # noqa: E402
+from app.core.config import settings  # noqa: E402
+
+
+class FakeEncoder:
+    def __init__(self, noise=0.0):
+        self.noise = noise
+
+    def encode(self, texts, normalize_embeddings=True):
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(size=(len(texts), 16))
+        vectors += self.noise * np.random.default_rng(1).normal(size=vectors.shape)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class FakeCrossEncoder:
+    def __init__(self, shift=0.0):
+        self.shift = shift
+
+    def predict(self, pairs):
+        return [len(query) - len(passage) + self.shift * (i % 2) for i, (query, passage) in enumerate(pairs)]
+
+
+def test_embedding_drift_threshold():
+    assert onnx_backend.drift_passed(onnx_backend.embedding_drift(FakeEncoder(), FakeEncoder(noise=0.01)))
+    assert not onnx_backend.drift_passed(onnx_backend.embedding_drift(FakeEncoder(), FakeEncoder(noise=1.0)))
+
+
+def test_score_drift_reports_correlation_and_max_diff():
+    report = onnx_backend.score_drift(FakeCrossEncoder(), FakeCrossEncoder(shift=0.1))
+    assert onnx_backend.drift_passed(report) and report["max_abs_diff"] == pytest.approx(0.1)
+    assert not onnx_backend.drift_passed(onnx_backend.score_drift(FakeCrossEncoder(), FakeCrossEncoder(shift=100.0)))
+
+
+def test_cached_drift_report_is_checked_against_current_thresholds(monkeypatch):
+    class Model:
+        def __init__(self, name, **kwargs):
+            pass
+
+    # Mesures en cache d'un chargement précédent, seuil resserré depuis
+    monkeypatch.setattr(onnx_backend, "_load_quantized", lambda *args, **kwargs: (Model("onnx"), {"correlation": 0.985}))
+    monkeypatch.setattr(settings, "INFERENCE_BACKEND", "onnx")
+    monkeypatch.setattr(onnx_backend, "ONNX_AVAILABLE", True)
+    monkeypatch.setattr(settings, "ONNX_MIN_CORRELATION", 0.98)
+    assert onnx_backend._load(Model, "modele", onnx_backend.score_drift)[1] == "onnx-int8"
+    monkeypatch.setattr(settings, "ONNX_MIN_CORRELATION", 0.99)
+    assert onnx_backend._load(Model, "modele", onnx_backend.score_drift)[1] == "torch"
+
+
+def test_falls_back_to_torch_when_export_fails(monkeypatch):
+    loaded = []
+
+    class Model:
+        def __init__(self, name, **kwargs):
+            if kwargs.get("backend") == "onnx":
+                raise RuntimeError("export impossible")
+            loaded.append(name)
+
+    monkeypatch.setattr(settings, "INFERENCE_BACKEND", "onnx")
+    monkeypatch.setattr(onnx_backend, "ONNX_AVAILABLE", True)
+    model, backend = onnx_backend._load(Model, "modele", onnx_backend.score_drift)
+    assert backend == "torch" and loaded == ["modele"]
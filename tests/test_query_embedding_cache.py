@@ -0,0 +1,38 @@
+import numpy as np
+
+from app.core.cache import QueryEmbeddingCache, pack_vector, unpack_vector
+
+
+def test_normalized_queries_share_an_entry():
+    cache = QueryEmbeddingCache(max_items=10, dtype="float16")
+    vector = np.random.default_rng(0).standard_normal(768).astype(np.float32)
+    cache.set_many(["Qu'est-ce que le  New Deal ?"], [vector], "mpnet")
+
+    hit, miss = cache.get_many(["qu'est-ce que le new deal ?", "autre question"], "mpnet")
+    assert miss is None
+    assert hit.dtype == np.float32
+    assert np.allclose(hit, vector, atol=1e-2)
+    assert cache.get_many(["qu'est-ce que le new deal ?"], "minilm") == [None]
+
+
+def test_int8_storage_and_lru_eviction():
+    cache = QueryEmbeddingCache(max_items=2, dtype="int8")
+    vectors = np.random.default_rng(1).standard_normal((3, 384)).astype(np.float32)
+    cache.set_many(["a", "b", "c"], list(vectors), "mpnet")
+
+    assert cache.get_many(["a"], "mpnet") == [None]
+    restored = cache.get_many(["c"], "mpnet")[0]
+    cosine = restored @ vectors[2] / (np.linalg.norm(restored) * np.linalg.norm(vectors[2]))
+    assert cosine > 0.999
+    assert cache.stats()["items"] == 2
+
+
+def test_vector_codec_roundtrip_and_legacy_payloads():
+    vector = np.random.default_rng(2).standard_normal(768).astype(np.float32)
+    assert np.array_equal(unpack_vector(pack_vector(vector, "float32")), vector)
+    assert len(pack_vector(vector, "float16")) < 768 * 2 + 16
+    assert np.allclose(unpack_vector(pack_vector(vector, "float16")), vector, atol=1e-2)
+    # Anciennes entrées pickle/latin1: ignorées (traitées comme un miss)
+    assert unpack_vector(b"\x80\x04\x95legacy pickle payload") is None
+    # Payload tronqué: miss
+    assert unpack_vector(pack_vector(vector, "float32")[:-4]) is None
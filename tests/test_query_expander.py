@@ -0,0 +1,67 @@
+import numpy as np
+
+from app.core.config import settings
+from app.core.query_expander import LocalQueryExpander
+from app.core.search import HybridSearch, SearchResult
+
+SYNONYMS = {
+    "startup": ["jeune pousse", "start-up"],
+    "numérique": ["digital", "tech"],
+}
+
+
+def test_synonym_substitution_and_expansion_variants():
+    expander = LocalQueryExpander(SYNONYMS, neighbours=0)
+    variants = expander.expand("Comment aider une jeune pousse du numerique ?")
+
+    assert variants[0] == "Comment aider une jeune pousse du numerique ?"
+    assert variants[1] == "comment aider une startup du digital ?"
+    assert "startup" in variants[2] and "digital" in variants[2]
+    assert len(variants) <= 3
+
+
+def test_no_match_keeps_only_the_original_query():
+    expander = LocalQueryExpander(SYNONYMS, neighbours=0)
+    assert expander.expand("Quel est le calendrier ?") == ["Quel est le calendrier ?"]
+
+
+def test_neighbour_terms_come_from_indexed_vocabulary():
+    vectors = {"financement": [1.0, 0.0], "subvention": [0.9, 0.1], "calendrier": [0.0, 1.0]}
+    expander = LocalQueryExpander({}, neighbours=2, min_similarity=0.5)
+    expander.build_vocabulary(
+        ["Le financement et la subvention", "financement du calendrier"],
+        lambda words: [vectors[word] for word in words],
+    )
+
+    terms = expander.neighbour_terms(np.array([1.0, 0.05]), exclude=["financement"])
+    assert terms == ["subvention"]
+
+
+def test_retrieval_confidence_counts_dense_sparse_agreement(monkeypatch):
+    results = [SearchResult("a", 1.0, {}, "hybrid"), SearchResult("b", 0.5, {}, "dense"),
+               SearchResult("c", 0.2, {}, "sparse")]
+    assert HybridSearch.retrieval_confidence(results) == 1 / 3
+    assert HybridSearch.retrieval_confidence([]) == 0.0
+    # Fusion legacy: pas d'accord mesurable, le mode adaptive escalade vers le LLM
+    monkeypatch.setattr(settings, "SEARCH_FUSION", "legacy")
+    assert HybridSearch.retrieval_confidence(results) == 0.0
+
+
+def test_vocabulary_update_counts_only_the_new_chunks_and_embeds_new_words():
+    embedded = []
+
+    def embed(words):
+        embedded.append(list(words))
+        return [[1.0, float(len(word))] for word in words]
+
+    expander = LocalQueryExpander({}, neighbours=2)
+    expander.build_vocabulary(["financement financement subvention"], embed, size=2)
+    expander.update_vocabulary(["calendrier calendrier calendrier"], [], embed, size=2)
+    assert embedded == [["financement", "subvention"], ["calendrier"]]
+    assert expander.vocabulary == ["calendrier", "financement"]
+
+    # Document remplacé: ses mots sortent du top-N, les vecteurs déjà connus sont réutilisés
+    expander.update_vocabulary([], ["calendrier calendrier calendrier"], embed, size=2)
+    assert expander.vocabulary == ["financement", "subvention"]
+    assert embedded[-1] == ["subvention"]
+    assert expander.vocabulary_vectors.shape == (2, 2)
@@ -0,0 +1,53 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.core.rerank_service import RerankService
+
+
+def test_concurrent_requests_share_one_forward_pass():
+    calls = []
+
+    def predict(pairs):
+        calls.append((threading.current_thread().name, len(pairs)))
+        return [float(len(passage)) for _, passage in pairs]
+
+    service = RerankService(predict, max_batch_pairs=64, max_wait_ms=50)
+
+    async def scenario():
+        return await asyncio.gather(
+            service.score([("q1", "a"), ("q1", "bb")]),
+            service.score([("q2", "ccc")]),
+            service.score([("q3", "dddd"), ("q3", "e")]),
+        )
+
+    results = asyncio.run(scenario())
+    service.stop()
+
+    assert [list(scores) for scores in results] == [[1.0, 2.0], [3.0], [4.0, 1.0]]
+    assert calls == [("rerank-batcher", 5)]
+    assert service.stats()["avg_requests_per_batch"] == 3
+
+
+def test_batch_closes_when_full():
+    sizes = []
+    service = RerankService(lambda pairs: sizes.append(len(pairs)) or [0.0] * len(pairs),
+                            max_batch_pairs=2, max_wait_ms=50)
+
+    async def scenario():
+        await asyncio.gather(*[service.score([("q", str(i)), ("q", "x")]) for i in range(3)])
+
+    asyncio.run(scenario())
+    service.stop()
+    assert sizes == [2, 2, 2]
+
+
+def test_predict_errors_reach_every_caller():
+    def predict(pairs):
+        raise RuntimeError("modèle indisponible")
+
+    service = RerankService(predict, max_wait_ms=1)
+    with pytest.raises(RuntimeError):
+        asyncio.run(service.score([("q", "p")]))
+    service.stop()
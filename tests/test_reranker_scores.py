@@ -0,0 +1,115 @@
+import asyncio
+import threading
+import uuid
+
+import numpy as np
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+from app.core.cache import cache  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.core.rerank_service import RerankService  # noqa: E402
+from app.core.reranker import AdvancedReranker, ambiguous_head  # noqa: E402
+from app.core.search import SearchResult  # noqa: E402
+
+
+class CountingModel:
+    def __init__(self):
+        self.pairs = []
+
+    def predict(self, pairs, batch_size=32):
+        self.pairs.extend(pairs)
+        return [float(len(passage)) for _, passage in pairs]
+
+
+def make_reranker():
+    reranker = object.__new__(AdvancedReranker)
+    reranker.reranker = CountingModel()
+    reranker.backend = "torch"
+    reranker.middle_model = None
+    return reranker
+
+
+def result(chunk_id, content, document_id="doc-a"):
+    return SearchResult(content, 0.5, {"document_id": document_id}, "hybrid", chunk_id=chunk_id)
+
+
+def test_only_unscored_pairs_reach_the_model():
+    reranker = make_reranker()
+    question = f"Quelle stratégie {uuid.uuid4().hex} ?"
+
+    reranker.rerank(question, [result("c1", "aaa"), result("c2", "bb")], top_k=2)
+    # Même question (casse et espaces près), candidat supplémentaire
+    ranked = reranker.rerank(f"  {question.upper()} ", [result("c2", "bb"), result("c1", "aaa"), result("c3", "c")], top_k=3)
+
+    assert [passage for _, passage in reranker.reranker.pairs] == ["aaa", "bb", "c"]
+    assert [r.content for r in ranked] == ["aaa", "bb", "c"]
+
+
+def test_scores_are_invalidated_when_the_document_is_reingested():
+    reranker = make_reranker()
+    question = f"Quel financement {uuid.uuid4().hex} ?"
+    document_id = uuid.uuid4().hex
+
+    reranker.rerank(question, [result("c1", "aaa", document_id)], top_k=1)
+    cache.document_changed(document_id)
+    reranker.rerank(question, [result("c1", "aaaa", document_id)], top_k=1)
+
+    assert [passage for _, passage in reranker.reranker.pairs] == ["aaa", "aaaa"]
+
+
+def test_warmup_runs_the_model_even_when_scores_are_cached():
+    reranker = make_reranker()
+    reranker.rerank("test", [SearchResult("test content", 0.5, {}, "test")], top_k=1)
+    reranker.warmup()
+    reranker.warmup()
+    assert len(reranker.reranker.pairs) == 3
+
+
+def test_async_rerank_reads_and_writes_scores_off_the_event_loop(monkeypatch):
+    monkeypatch.setattr(settings, "ENABLE_RERANK_BATCHING", True)
+    reranker = make_reranker()
+    reranker.service = RerankService(reranker.reranker.predict, 32, 1)
+    cache_threads = []
+    for name in ("get_many", "set_many"):
+        method = getattr(cache, name)
+        monkeypatch.setattr(cache, name, lambda *args, _method=method, **kwargs: (
+            cache_threads.append(threading.get_ident()), _method(*args, **kwargs))[1])
+
+    async def run():
+        ranked = await reranker.arerank(f"Quel budget {uuid.uuid4().hex} ?", [result("c1", "aaa")], top_k=1)
+        return ranked, threading.get_ident()
+
+    ranked, loop_thread = asyncio.run(run())
+    reranker.service.stop()
+    assert [r.content for r in ranked] == ["aaa"]
+    assert len(cache_threads) == 2 and loop_thread not in cache_threads
+
+
+def test_ambiguous_head_early_exit_and_band():
+    assert ambiguous_head(np.array([0.9, 0.85, 0.8, 0.5, 0.4]), 3, 0.1, 8) is None
+    assert list(ambiguous_head(np.array([0.9, 0.85, 0.8, 0.75, 0.4]), 3, 0.1, 8)) == [0, 1, 2, 3]
+    assert len(ambiguous_head(np.linspace(1.0, 0.99, 20), 3, 0.1, 8)) == 8
+
+
+def test_cascade_skips_the_full_model_when_dense_separates_top_k(monkeypatch):
+    monkeypatch.setattr(settings, "ENABLE_RERANK_CASCADE", True)
+    reranker = make_reranker()
+    far, near = result("c1", "loin"), result("c2", "proche")
+    far.dense_score, near.dense_score = 0.1, 0.9
+
+    ranked = reranker.rerank("question", [far, near], top_k=1)
+    assert [r.content for r in ranked] == ["proche"]
+    assert reranker.reranker.pairs == []
+
+
+def test_bm25_only_hits_are_never_dropped_by_the_dense_stage(monkeypatch):
+    monkeypatch.setattr(settings, "ENABLE_RERANK_CASCADE", True)
+    reranker = make_reranker()
+    far, near, sparse_only = result("c1", "l"), result("c2", "pr"), result("c3", "bm25 seul")
+    far.dense_score, near.dense_score = 0.1, 0.9
+
+    ranked = reranker.rerank("question", [far, near, sparse_only], top_k=1)
+    assert [r.content for r in ranked] == ["bm25 seul"]
+    assert "bm25 seul" in [passage for _, passage in reranker.reranker.pairs]
@@ -0,0 +1,30 @@
+import numpy as np
+
+from app.core.semantic_cache import SemanticAnswerCache
+
+
+def _vector(seed, noise=0.0):
+    rng = np.random.default_rng(seed)
+    base = np.random.default_rng(0).standard_normal(384)
+    return base + noise * rng.standard_normal(384) if noise else rng.standard_normal(384)
+
+
+def test_close_question_reuses_answer_within_partition():
+    cache = SemanticAnswerCache(threshold=0.9, ttl=60, max_entries=8)
+    response = {"answer": "Le New Deal...", "response_time_ms": 1500.0}
+    cache.store(_vector(0, noise=0.0001), "mistral:3", "Qu'est-ce que le New Deal ?", response)
+
+    match = cache.lookup(_vector(1, noise=0.05), "mistral:3")
+    assert match["response"] is response and match["similarity"] > 0.9
+    assert cache.lookup(_vector(1, noise=0.05), "openai:3") is None
+    assert cache.lookup(_vector(42), "mistral:3") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["saved_latency_ms"] == 1500.0
+
+
+def test_document_changes_invalidate_answers():
+    cache = SemanticAnswerCache(threshold=0.9, ttl=60, max_entries=8)
+    cache.store(_vector(0, noise=0.0001), "mistral:3", "question", {"response_time_ms": 10.0})
+    cache.invalidate(["rerank"])
+    assert cache.lookup(_vector(0, noise=0.0001), "mistral:3") is not None
+    cache.invalidate(["full_response", "rerank"])
+    assert cache.lookup(_vector(0, noise=0.0001), "mistral:3") is None
@@ -0,0 +1,61 @@
+import asyncio
+
+from app.core.single_flight import SingleFlight, StreamFlight
+
+
+def test_concurrent_calls_share_one_computation():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"answer": "42"}
+
+    async def scenario():
+        flight = SingleFlight("test")
+        results = await asyncio.gather(*[flight.do("q", compute) for _ in range(5)])
+        return flight, results
+
+    flight, results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert [shared for _, shared in results].count(False) == 1
+    assert all(result == {"answer": "42"} for result, _ in results)
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_stream_followers_receive_leader_tokens():
+    starts = []
+
+    async def tokens():
+        starts.append(1)
+        for token in ["Le", " New", " Deal"]:
+            await asyncio.sleep(0.005)
+            yield token
+
+    async def consume(flight, delay):
+        await asyncio.sleep(delay)
+        return [token async for token in flight.stream("q", tokens)]
+
+    async def scenario():
+        flight = StreamFlight("test")
+        return await asyncio.gather(consume(flight, 0), consume(flight, 0.007), consume(flight, 0.012))
+
+    streams = asyncio.run(scenario())
+    assert len(starts) == 1
+    assert all(stream == ["Le", " New", " Deal"] for stream in streams)
+
+
+def test_stream_errors_reach_every_subscriber():
+    async def failing():
+        yield "début"
+        raise RuntimeError("provider indisponible")
+
+    async def consume(flight):
+        return [token async for token in flight.stream("q", failing)]
+
+    async def scenario():
+        flight = StreamFlight("test")
+        return await asyncio.gather(consume(flight), consume(flight), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
@@ -0,0 +1,180 @@
+import numpy as np
+from rank_bm25 import BM25Okapi
+
+from app.core.sparse_index import SparseIndex, chunks_checksum
+from app.core.text_analyzer import get_analyzer
+
+
+CORPUS = {
+    "doc1_chunk_0": "le new deal technologique vise la transformation numerique du senegal",
+    "doc1_chunk_1": "la caisse de securite sociale gere les prestations familiales",
+    "doc2_chunk_0": "les pensions de retraite sont versees par la caisse",
+    "doc2_chunk_1": "le programme new deal finance les startups et le numerique",
+    "doc3_chunk_0": "les accidents du travail sont declares a la caisse de securite sociale",
+}
+
+ANALYZER = get_analyzer("french")
+
+
+def _build_index(corpus):
+    index = SparseIndex(analyzer=ANALYZER)
+    for chunk_id, content in corpus.items():
+        index.add(chunk_id, content, {"document_id": chunk_id.split("_")[0]})
+    return index
+
+
+def _reference_scores(corpus, query):
+    ids = list(corpus)
+    bm25 = BM25Okapi([ANALYZER.analyze(corpus[i]) for i in ids])
+    scores = bm25.get_scores(ANALYZER.analyze(query))
+    return {chunk_id: score for chunk_id, score in zip(ids, scores) if score != 0}
+
+
+def _index_scores(index, query):
+    return {index.chunk_ids[slot]: score for slot, score in index.top_k(query, 100)}
+
+
+def test_scores_match_rank_bm25():
+    index = _build_index(CORPUS)
+    for query in ["caisse de securite sociale", "new deal numerique", "retraite pensions"]:
+        expected = _reference_scores(CORPUS, query)
+        actual = _index_scores(index, query)
+        assert expected.keys() == actual.keys()
+        for chunk_id, score in expected.items():
+            assert np.isclose(actual[chunk_id], score)
+
+
+def test_short_chunks_match_rank_bm25():
+    # Longueur moyenne entre 0 et 1 (chunks de mots vides): pas de plancher sur avgdl
+    corpus = {"doc1_chunk_0": "caisse", "doc1_chunk_1": "le la les", "doc2_chunk_0": "de", "doc2_chunk_1": "du"}
+    index = _build_index(corpus)
+    assert 0 < index.total_len / len(index) < 1
+    expected = _reference_scores(corpus, "caisse")
+    actual = _index_scores(index, "caisse")
+    assert expected.keys() == actual.keys()
+    for chunk_id, score in expected.items():
+        assert np.isclose(actual[chunk_id], score)
+
+
+def test_remove_document_matches_rebuild():
+    index = _build_index(CORPUS)
+    assert index.remove_document("doc2") == 2
+
+    remaining = {k: v for k, v in CORPUS.items() if not k.startswith("doc2")}
+    query = "la caisse new deal"
+    expected = _reference_scores(remaining, query)
+    actual = _index_scores(index, query)
+    assert expected.keys() == actual.keys()
+    for chunk_id, score in expected.items():
+        assert np.isclose(actual[chunk_id], score)
+
+
+def test_readd_replaces_chunk():
+    index = _build_index(CORPUS)
+    index.add("doc1_chunk_0", "contenu entierement nouveau", {"document_id": "doc1"})
+    assert len(index) == len(CORPUS)
+    assert index.top_k("transformation", 5) == []
+    assert index.top_k("nouveau", 5)[0][0] == index.slot_of["doc1_chunk_0"]
+
+
+def test_compaction_preserves_scores():
+    index = _build_index(CORPUS)
+    index.remove_document("doc3")
+    index.add("doc4_chunk_0", "nouvelle caisse de retraite numerique", {"document_id": "doc4"})
+    before = _index_scores(index, "caisse retraite numerique")
+
+    index.compact()
+    after = _index_scores(index, "caisse retraite numerique")
+
+    assert before.keys() == after.keys()
+    for chunk_id, score in before.items():
+        assert np.isclose(after[chunk_id], score)
+    assert index.remove_document("doc4") == 1
+    assert "doc4_chunk_0" not in _index_scores(index, "nouvelle")
+
+
+def test_save_and_load_roundtrip(tmp_path):
+    index = _build_index(CORPUS)
+    index.add("doc4_chunk_0", "nouvelle caisse de retraite numerique", {"document_id": "doc4"})
+    query = "caisse retraite numerique"
+    expected = _index_scores(index, query)
+
+    index.save(str(tmp_path))
+    manifest = SparseIndex.read_manifest(str(tmp_path), ANALYZER)
+    corpus = {**CORPUS, "doc4_chunk_0": "nouvelle caisse de retraite numerique"}
+    assert manifest["checksum"] == chunks_checksum(corpus.keys(), corpus.values())
+
+    assert SparseIndex.read_manifest(str(tmp_path), get_analyzer("simple")) is None
+    loaded = SparseIndex.load(str(tmp_path), analyzer=ANALYZER)
+    assert len(loaded) == len(CORPUS) + 1
+    actual = _index_scores(loaded, query)
+    assert expected.keys() == actual.keys()
+    for chunk_id, score in expected.items():
+        assert np.isclose(actual[chunk_id], score)
+
+    # L'index chargé reste modifiable
+    assert loaded.remove_document("doc1") == 2
+    assert loaded.metadatas[loaded.slot_of["doc4_chunk_0"]] == {"document_id": "doc4"}
+    assert "doc1_chunk_1" not in _index_scores(loaded, "caisse")
+
+
+def test_checksum_detects_reuploaded_document_with_same_chunk_ids():
+    index = _build_index(CORPUS)
+    before = index.checksum()
+    # Même nombre de chunks, donc mêmes ids: seul le texte change
+    index.add("doc1_chunk_0", "version corrigee du document", {"document_id": "doc1"})
+    assert index.checksum() != before
+    assert index.checksum() == chunks_checksum(
+        CORPUS.keys(), ["version corrigee du document"] + list(CORPUS.values())[1:]
+    )
+
+
+def test_top_k_many_matches_rank_bm25():
+    index = _build_index(CORPUS)
+    queries = ["caisse de securite sociale", "new deal new deal", "inconnu", "retraite caisse"]
+    batched = index.top_k_many(queries, 100)
+    assert len(batched) == len(queries)
+    for query, hits in zip(queries, batched):
+        expected = _reference_scores(CORPUS, query)
+        actual = {index.chunk_ids[slot]: score for slot, score in hits}
+        assert expected.keys() == actual.keys()
+        for chunk_id, score in expected.items():
+            assert np.isclose(actual[chunk_id], score)
+
+
+def test_add_many_keeps_last_duplicate_and_defers_compaction():
+    index = _build_index(CORPUS)
+    index.compact()
+    compactions = index.compactions
+
+    ids = [f"doc9_chunk_{i}" for i in range(300)] + ["doc9_chunk_0"]
+    contents = ["caisse de retraite"] * 300 + ["chunk remplace par le dernier"]
+    index.add_many(ids, contents, [{"document_id": "doc9"}] * len(ids))
+
+    assert index.compactions == compactions
+    assert len(index) == len(CORPUS) + 300
+    assert index.n_slots == len(CORPUS) + 300
+    assert [slot for slot, _ in index.top_k("remplace", 5)] == [index.slot_of["doc9_chunk_0"]]
+
+
+def test_index_of_empty_chunks_scores_without_nan():
+    index = SparseIndex(analyzer=ANALYZER)
+    index.add("vide_0", "le la les de", {"document_id": "vide"})
+    index.add("vide_1", "caisse", {"document_id": "vide"})
+    index.remove("vide_1")
+    assert index.total_len == 0
+    with np.errstate(divide="raise", invalid="raise"):
+        assert index.top_k("caisse", 5) == []
+
+
+def test_concurrent_saves_leave_a_loadable_index(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    indexes = [_build_index(CORPUS), _build_index({**CORPUS, "doc4_chunk_0": "nouvelle caisse"})]
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(lambda i: indexes[i % 2].save(str(tmp_path)), range(12)))
+
+    manifest = SparseIndex.read_manifest(str(tmp_path), ANALYZER)
+    assert manifest["checksum"] in {index.checksum() for index in indexes}
+    loaded = SparseIndex.load(str(tmp_path), manifest, ANALYZER)
+    assert loaded.checksum() == manifest["checksum"]
@@ -0,0 +1,112 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+pytest.importorskip("chromadb")
+
+from app.core.config import settings  # noqa: E402
+from app.core.query_expander import LocalQueryExpander  # noqa: E402
+from app.core.reranker import RankedResult  # noqa: E402
+from app.core.search import HybridSearch, SearchResult  # noqa: E402
+from app.services.rag_service import UltraPerformantRAG  # noqa: E402
+
+
+class FakeSearch:
+    executor = ThreadPoolExecutor(max_workers=1)
+    retrieval_confidence = staticmethod(HybridSearch.retrieval_confidence)
+    _result_key = staticmethod(HybridSearch._result_key)
+    merge_variant_results = HybridSearch.merge_variant_results
+
+    def __init__(self, source_type):
+        self.source_type = source_type
+
+    async def search_many(self, queries, n_results=None):
+        return [[SearchResult(f"chunk {query}", 1.0, {}, self.source_type, chunk_id=query)] for query in queries]
+
+
+class FakeReranker:
+    def __init__(self, stages=()):
+        # Étage des classements successifs (sortie anticipée de la cascade simulée)
+        self.stages = list(stages)
+        self.calls = []
+
+    def rerank(self, query, results, top_k=5, cascade=True):
+        self.calls.append(([result.chunk_id for result in results], cascade))
+        stage = self.stages.pop(0) if self.stages else "cross_encoder"
+        return [RankedResult(result.content, result.score, result.metadata, i, stage)
+                for i, result in enumerate(results)][:top_k]
+
+    async def arerank(self, query, results, top_k=5, cascade=True):
+        return self.rerank(query, results, top_k, cascade)
+
+
+class SlowEnhancer:
+    def __init__(self, delay):
+        self.delay = delay
+        self.cancelled = False
+
+    async def enhance_query(self, query, provider):
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return [query, "variante llm"]
+
+
+class FakeEmbeddings:
+    def embed_query(self, text):
+        return np.ones(4, dtype=np.float32)
+
+
+def make_rag(source_type, enhancer):
+    rag = object.__new__(UltraPerformantRAG)
+    rag.hybrid_search = FakeSearch(source_type)
+    rag.reranker = FakeReranker()
+    rag.query_enhancer = enhancer
+    rag.embeddings = FakeEmbeddings()
+    rag.query_expander = LocalQueryExpander({}, neighbours=0)
+    rag.executor = ThreadPoolExecutor(max_workers=1)
+    return rag
+
+
+def test_confident_first_pass_cancels_enhancement():
+    enhancer = SlowEnhancer(delay=5)
+    rag = make_rag("hybrid", enhancer)
+
+    queries, results, ranked = asyncio.run(rag._speculative_retrieve("question", None, top_k=3))
+    assert queries == ["question"]
+    assert len(ranked) == 1
+    assert enhancer.cancelled
+
+
+def test_variants_merged_when_enhancement_arrives_within_budget(monkeypatch):
+    monkeypatch.setattr(settings, "QUERY_ENHANCEMENT_BUDGET_MS", 1000)
+    rag = make_rag("dense", SlowEnhancer(delay=0.01))
+
+    queries, results, ranked = asyncio.run(rag._speculative_retrieve("question", None, top_k=3))
+    assert queries == ["question", "variante llm"]
+    assert {result.chunk_id for result in results} == {"question", "variante llm"}
+    assert len(ranked) == 2
+
+
+def test_late_enhancement_is_dropped(monkeypatch):
+    monkeypatch.setattr(settings, "QUERY_ENHANCEMENT_BUDGET_MS", 10)
+    enhancer = SlowEnhancer(delay=5)
+    rag = make_rag("dense", enhancer)
+
+    queries, _, _ = asyncio.run(rag._speculative_retrieve("question", None, top_k=3))
+    assert queries == ["question"]
+    assert enhancer.cancelled
+
+
+def test_mixed_stage_rankings_are_reranked_together(monkeypatch):
+    monkeypatch.setattr(settings, "QUERY_ENHANCEMENT_BUDGET_MS", 1000)
+    rag = make_rag("dense", SlowEnhancer(delay=0.01))
+    rag.reranker = FakeReranker(stages=["dense", "cross_encoder"])
+
+    _, _, ranked = asyncio.run(rag._speculative_retrieve("question", None, top_k=3))
+    assert rag.reranker.calls[-1] == (["question", "variante llm"], False)
+    assert {result.stage for result in ranked} == {"cross_encoder"}
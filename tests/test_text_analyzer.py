@@ -0,0 +1,25 @@
+from app.core.sparse_index import SparseIndex
+from app.core.text_analyzer import get_analyzer
+
+
+def test_french_analyzer_normalizes_punctuation_accents_and_plurals():
+    analyzer = get_analyzer("french")
+    assert analyzer.analyze("retraite?") == analyzer.analyze("Retraite,") == analyzer.analyze("retraites")
+    assert analyzer.analyze("Sécurité") == analyzer.analyze("securite")
+    assert analyzer.analyze("la caisse de la sécurité") == analyzer.analyze("caisse sécurité")
+
+
+def test_french_analyzer_handles_acronyms():
+    analyzer = get_analyzer("french")
+    assert analyzer.analyze("C.S.S.") == ["css"]
+    assert analyzer.analyze("CE") == ["ce"]  # acronyme, pas un mot vide
+    terms = analyzer.analyze("CSS-IPRES")
+    assert "css" in terms and len(terms) == 3  # parties + bigramme du composé
+
+
+def test_sparse_index_matches_punctuated_query():
+    index = SparseIndex(analyzer=get_analyzer("french"))
+    index.add("doc1_chunk_0", "Les pensions de retraite sont versées par la CSS.", {"document_id": "doc1"})
+    index.add("doc2_chunk_0", "Le programme finance les startups.", {"document_id": "doc2"})
+    hits = index.top_k("Quelles retraites ?", 5)
+    assert [index.chunk_ids[slot] for slot, _ in hits] == ["doc1_chunk_0"]